@@ -0,0 +1,144 @@
+"""
+Benchmark the dataset layout options of save_arbor.
+
+An arbor is saved with different chunking, compression, and
+precision options. For each, this reports the size on disk, the
+time to save, the time to read tree fields for all trees in order,
+and the time to read them one tree at a time for a random sample
+of trees.
+
+Usage:
+
+    python benchmarks/save_layout.py <arbor filename> \\
+        [--max-file-size N] [--ntrees N] [--output-dir DIR]
+
+Reads are timed with a freshly loaded arbor, but the files are likely
+to be in the operating system's file cache, so read times mostly
+reflect decompression and i/o overhead rather than disk speed.
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) ytree development team. All rights reserved.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import argparse
+import glob
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
+
+from yt.utilities.logger import ytLogger
+import ytree
+from ytree.utilities.logger import ytreeLogger
+
+LAYOUTS = {
+    "contiguous": {},
+    "chunked": {"chunk_size": "auto"},
+    "gzip": {"compression": "gzip"},
+    "gzip-float32": {"compression": "gzip", "float_precision": "float32"},
+    "lzf": {"compression": "lzf"},
+}
+
+def read_sequential(filename, fields):
+    """
+    Read tree fields for all trees in order and return the time taken.
+
+    This is the bulk loop over data files used when saving arbors.
+    """
+
+    a = ytree.load(filename)
+    trees = np.array(list(a[:]))
+
+    start = time.perf_counter()
+    a._node_io_loop(a._node_io.get_fields, pbar=None, root_nodes=trees,
+                    fields=fields, root_only=False)
+    return time.perf_counter() - start
+
+def read_random(filename, fields, indices):
+    """
+    Read tree fields one tree at a time and return the time taken.
+    """
+
+    a = ytree.load(filename)
+
+    start = time.perf_counter()
+    for i in indices:
+        tree = a[int(i)]
+        for field in fields:
+            tree["tree", field]
+    return time.perf_counter() - start
+
+def run_benchmark(filename, layouts, max_file_size, ntrees, output_dir,
+                  seed=4143):
+    a = ytree.load(filename)
+    fields = [field for field in a.field_list
+              if a.field_info[field].get("type") not in ["derived", "alias"]]
+
+    gen = np.random.default_rng(seed)
+    indices = gen.integers(0, a.size, size=min(ntrees, a.size))
+
+    results = {}
+    for name, options in layouts.items():
+        path = os.path.join(output_dir, name, "arbor")
+        start = time.perf_counter()
+        fn = a.save_arbor(filename=path, max_file_size=max_file_size,
+                          **options)
+        save_time = time.perf_counter() - start
+
+        size = sum(os.path.getsize(f) for f in
+                   glob.glob(os.path.join(os.path.dirname(fn), "*.h5")))
+        results[name] = {
+            "size": size,
+            "save": save_time,
+            "sequential": read_sequential(fn, fields),
+            "random": read_random(fn, fields, indices),
+        }
+
+    return results
+
+def print_results(results, ntrees):
+    header = (f"{'layout':<16} {'size [MB]':>10} {'save [s]':>10} "
+              f"{'sequential [s]':>15} {f'random {ntrees} [s]':>15}")
+    print(header)
+    print("-" * len(header))
+    for name, res in results.items():
+        print(f"{name:<16} {res['size'] / 2**20:>10.2f} {res['save']:>10.2f} "
+              f"{res['sequential']:>15.2f} {res['random']:>15.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark save_arbor dataset layouts.")
+    parser.add_argument("filename", help="arbor to load and save")
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS),
+                        choices=list(LAYOUTS),
+                        help="layouts to benchmark")
+    parser.add_argument("--max-file-size", type=int, default=524288,
+                        help="max_file_size keyword for save_arbor")
+    parser.add_argument("--ntrees", type=int, default=1000,
+                        help="number of trees to read randomly")
+    parser.add_argument("--output-dir", default=None,
+                        help="where to save arbors (default: temporary)")
+    args = parser.parse_args()
+
+    ytLogger.setLevel(30)
+    ytreeLogger.setLevel(30)
+    output_dir = args.output_dir
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp()
+
+    try:
+        results = run_benchmark(
+            args.filename, dict((name, LAYOUTS[name]) for name in args.layouts),
+            args.max_file_size, args.ntrees, output_dir)
+    finally:
+        if args.output_dir is None:
+            shutil.rmtree(output_dir)
+
+    print_results(results, args.ntrees)
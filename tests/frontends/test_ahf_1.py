@@ -1,3 +1,7 @@
+import numpy as np
+
+from ytree.data_structures.load import \
+    load as ytree_load
 from ytree.frontends.ahf import \
     AHFArbor
 from ytree.utilities.testing import \
@@ -9,3 +13,39 @@ class AHFArborTest(TempDirTest, ArborTest):
     test_filename = "ahf_halos/snap_N64L16_000.parameter"
     num_data_files = 136
     tree_skip = 100
+
+class AHFMtreeLinksTest(TempDirTest):
+    def test_mtree_links(self):
+        """
+        Check descendents are chosen by the highest merit.
+        """
+
+        halo_ids = [[1, 2, 3, 4], [5, 6]]
+        for i, (z, ids) in enumerate(zip(["1.000", "0.000"], halo_ids)):
+            with open(f"snap_{i:03d}.parameter", mode="w") as f:
+                f.write(f"z {z}\n")
+            with open(f"snap_{i:03d}.z{z}.AHF_halos", mode="w") as f:
+                f.write("#ID(1) hostHalo(2) Mvir(3)\n")
+                for hid in ids:
+                    f.write(f"{hid} -1 {hid}e10\n")
+
+        # halo 2 has equal merit for both, so the first is taken
+        mtree = """\
+#   HaloID(1)   HaloPart(2)  NumProgenitors(3)
+#      SharedPart(1)    HaloID(2)   HaloPart(3)
+5  10  3
+  5  1  10
+  2  2  10
+  1  3  10
+6  10  2
+  8  3  10
+  2  2  10
+"""
+        with open("snap_001.z0.000.AHF_mtree", mode="w") as f:
+            f.write(mtree)
+
+        a = ytree_load("snap_001.parameter")
+        ids = np.concatenate([t["tree", "ID"] for t in a])
+        desc_ids = np.concatenate([t["tree", "desc_id"] for t in a])
+        links = dict(zip(ids.astype(int), desc_ids.astype(int)))
+        assert links == {1: 5, 2: 5, 3: 6, 4: -1, 5: -1, 6: -1}
@@ -1,10 +1,40 @@
+from numpy.testing import assert_array_equal
+
+from ytree.config import ytreecfg
+from ytree.data_structures.load import load
 from ytree.frontends.consistent_trees import \
     ConsistentTreesArbor
+from ytree.utilities.loading import get_path
 from ytree.utilities.testing import \
     ArborTest, \
+    IndexCacheTest, \
+    RootFieldCacheTest, \
     TempDirTest
 
-class ConsistentTreesArborTest(TempDirTest, ArborTest):
+class ConsistentTreesArborTest(TempDirTest, ArborTest, IndexCacheTest,
+                               RootFieldCacheTest):
     arbor_type = ConsistentTreesArbor
     test_filename = "consistent_trees/tree_0_0_0.dat"
     num_data_files = 1
+
+    def test_plant_trees_chunked(self):
+        try:
+            filename = get_path(self.test_filename)
+        except IOError:
+            self.skipTest("test file missing")
+
+        ytreecfg["ytree"]["index_cache"] = "False"
+        try:
+            a1 = load(filename)
+            a1._plant_trees()
+
+            # scan the file in many small pieces
+            a2 = load(filename)
+            a2._plant_chunk_size = 1000
+            a2._plant_trees()
+        finally:
+            ytreecfg.remove_option("ytree", "index_cache")
+
+        assert a1.size == a2.size
+        for attr in ("uid", "_si", "_ei"):
+            assert_array_equal(a1._node_info[attr], a2._node_info[attr])
@@ -1,10 +1,18 @@
+import os
+import shutil
+
+from ytree.data_structures.load import \
+    load
 from ytree.frontends.consistent_trees import \
     ConsistentTreesGroupArbor
+from ytree.utilities.loading import \
+    get_path
 from ytree.utilities.testing import \
     ArborTest, \
+    IndexCacheTest, \
     TempDirTest
 
-class ConsistentTreesGroupArborTest(TempDirTest, ArborTest):
+class ConsistentTreesGroupArborTest(TempDirTest, ArborTest, IndexCacheTest):
     arbor_type = ConsistentTreesGroupArbor
     test_filename = "tiny_ctrees/locations.dat"
     num_data_files = 8
@@ -16,3 +24,24 @@ class ConsistentTreesGroupArborTest(TempDirTest, ArborTest):
     def test_data_files(self):
         self.arbor._plant_trees()
         ArborTest.test_data_files(self)
+
+    def test_index_cache_tree_files(self):
+        try:
+            filename = get_path(self.test_filename)
+        except IOError:
+            self.skipTest("test file missing")
+
+        shutil.copytree(os.path.dirname(filename), "tiny_ctrees")
+        a1 = load("tiny_ctrees/locations.dat")
+        a1._plant_trees()
+        key_files = a1._get_cache_key_files()
+        assert len(key_files) == self.num_data_files + 1
+
+        a2 = load("tiny_ctrees/locations.dat")
+        assert a2._load_node_info_cache(key_files) is not None
+
+        # changing a tree file invalidates the cache
+        with open("tiny_ctrees/tree_0_0_3.dat", mode="a") as f:
+            f.write("\n")
+        a3 = load("tiny_ctrees/locations.dat")
+        assert a3._load_node_info_cache(a3._get_cache_key_files()) is None
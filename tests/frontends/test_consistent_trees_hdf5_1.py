@@ -1,5 +1,10 @@
+from numpy.testing import assert_array_equal
+
+from ytree.config import ytreecfg
+from ytree.data_structures.load import load
 from ytree.frontends.consistent_trees_hdf5 import \
     ConsistentTreesHDF5Arbor
+from ytree.utilities.loading import get_path
 from ytree.utilities.testing import \
     ArborTest, \
     TempDirTest
@@ -9,3 +14,20 @@ class ConsistentTreesHDF5ArborTest1(TempDirTest, ArborTest):
     test_filename = "consistent_trees_hdf5/soa/forest.h5"
     num_data_files = 1
     tree_skip = 10000
+
+    def test_read_root_fields_blocks(self):
+        try:
+            filename = get_path(self.test_filename)
+        except IOError:
+            self.skipTest("test file missing")
+
+        ytreecfg["ytree"]["index_cache"] = "False"
+        try:
+            a1 = load(filename)
+            a2 = load(filename)
+            # read roots in many small pieces
+            a2._root_io._block_size = 1000
+            for field in ["uid", "desc_uid", "mass"]:
+                assert_array_equal(a1[field], a2[field])
+        finally:
+            ytreecfg.remove_option("ytree", "index_cache")
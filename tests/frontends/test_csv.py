@@ -1,3 +1,6 @@
+from numpy.testing import assert_array_equal
+
+from ytree import load as ytree_load
 from ytree.frontends.csv import \
     CSVArbor
 from ytree.utilities.testing import \
@@ -10,3 +13,52 @@ class CSVArborTest(TempDirTest, ArborTest):
 
     def load_callback(self, a):
         a.set_selector("max_field_value", "charisma")
+
+class CSVPlantingTest(TempDirTest):
+    def test_plant_trees(self):
+        # ancestors listed before their descendents and
+        # a halo whose descendent is missing
+        lines = [
+            "#uid,desc_uid,mass,name",
+            "#INT,INT,FLOAT,STR",
+            "#None,None,Msun,None",
+            "5,2,1.0,a",
+            "4,1,2.0,b",
+            "2,1,3.0,c#2",
+            "1,-1,4.0,d",
+            "7,99,5.0,e",
+            "3,2,6.0,f",
+        ]
+        with open("trees.csv", mode="w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        a = ytree_load("trees.csv")
+        assert_array_equal(a["uid"], [1, 7])
+        assert_array_equal(a["desc_uid"], [-1, -1])
+
+        tree = a[0]
+        assert_array_equal(tree["tree", "uid"], [1, 4, 2, 5, 3])
+        assert_array_equal(tree["tree", "desc_uid"], [-1, 1, 1, 2, 2])
+        assert_array_equal(tree["tree", "mass"], [4, 2, 3, 1, 6])
+        assert_array_equal(tree["tree", "name"], ["d", "b", "c#2", "a", "f"])
+        assert_array_equal(tree["prog", "uid"], [1, 2, 3])
+
+    def test_data_lines_starting_with_comment(self):
+        # data lines starting with "#" are not comments
+        lines = [
+            "#name,uid,desc_uid,mass",
+            "#STR,INT,INT,FLOAT",
+            "#None,None,None,Msun",
+            "#a,2,1,1.0",
+            "b,1,-1,2.0",
+            "#c,3,1,3.0",
+        ]
+        with open("trees.csv", mode="w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        a = ytree_load("trees.csv")
+        assert a.size == 1
+        tree = a[0]
+        assert_array_equal(tree["tree", "uid"], [1, 2, 3])
+        assert_array_equal(tree["tree", "name"], ["b", "#a", "#c"])
+        assert_array_equal(tree["prog", "mass"], [2, 3])
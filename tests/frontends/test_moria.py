@@ -45,3 +45,20 @@ class MoriaArborTest(TempDirTest, ArborTest):
             t = a[ai]
             inode = t["forest", "uid"] == my_id
             assert_array_equal(t["forest", "desc_uid"][inode], ids[my_dindex])
+
+    def test_tree_status(self):
+        a = self.arbor
+        a._plant_trees()
+
+        fh = h5py.File(self.arbor.parameter_filename, mode="r")
+        status = fh["status_sparta"][()]
+        fh.close()
+
+        for i in range(0, a.size, self.tree_skip):
+            si = a._node_info["_si"][i]
+            ei = a._node_info["_ei"][i]
+            tree_status = np.flip(status[:, si:ei], axis=0).flatten()
+            assert a._node_info["_tree_size"][i] == (tree_status != 0).sum()
+            t = a[i]
+            t["tree", "uid"]
+            assert_array_equal(t._status, np.where(tree_status != 0)[0])
@@ -2,9 +2,10 @@ from ytree.frontends.rockstar import \
     RockstarArbor
 from ytree.utilities.testing import \
     ArborTest, \
+    RootFieldCacheTest, \
     TempDirTest
 
-class RockstarArborTest(TempDirTest, ArborTest):
+class RockstarArborTest(TempDirTest, ArborTest, RootFieldCacheTest):
     arbor_type = RockstarArbor
     test_filename = "rockstar/rockstar_halos/out_0.list"
     num_data_files = 65
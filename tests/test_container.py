@@ -43,3 +43,57 @@ def test_containers():
     a_slice = a.container(a[::8])
     assert int(np.ceil(a.size / 8)) == a_slice.size
     assert_array_equal(a_slice["mass"], a["mass"][::8])
+
+@requires_file(TCL)
+def test_container_bulk_fields():
+    a = ytree.load(TCL)
+    nodes = []
+    for tree in a[::4]:
+        nodes.extend(list(tree["tree"])[::5])
+    container = a.container(nodes)
+    assert_array_equal(
+        container["mass"], a.arr([node["mass"] for node in nodes]))
+
+    for selector in ["tree", "prog"]:
+        values = container[selector, "redshift"]
+        assert len(values) == container.size
+        for node, value in zip(nodes, values):
+            assert_array_equal(value, node[selector, "redshift"])
+
+    # nodes are stored as arbor indices and tree_ids
+    assert_array_equal(
+        container.arbor_index,
+        [node.find_root()._arbor_index for node in nodes])
+    assert_array_equal(container.tree_id, [node.tree_id for node in nodes])
+    for i in range(0, container.size, 7):
+        assert container[i].uid == nodes[i].uid
+
+    halos = a.select_halos('tree["tree", "redshift"] > 1', bulk=True)
+    masses = halos["mass"]
+    assert masses.size == halos.size
+    for i in range(0, halos.size, 50):
+        assert masses[i] == halos[i]["mass"]
+
+    for selector in ["tree", "prog"]:
+        values = halos[selector, "redshift"]
+        assert len(values) == halos.size
+        for i in range(0, halos.size, 50):
+            assert_array_equal(values[i], halos[i][selector, "redshift"])
+
+@requires_file(TCL)
+def test_container_root_fields():
+    a = ytree.load(TCL)
+    roots = list(a[::6])
+    container = a.container(roots)
+    masses = a.arr([root["mass"] for root in roots])
+
+    # only the selected roots are read
+    a2 = ytree.load(TCL)
+    container = a2.container(a2[::6])
+    assert_array_equal(container["mass"], masses)
+    assert "mass" not in a2.field_data
+
+    # root fields already loaded are used
+    a2["virial_radius"]
+    assert_array_equal(
+        container["virial_radius"], a2["virial_radius"][::6])
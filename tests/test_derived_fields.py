@@ -32,6 +32,9 @@ def _potential(field, data):
 def _uid_mod7(field, data):
     return data['uid'] % 7
 
+def _double_potential(field, data):
+    return 2 * data['potential']
+
 class DerivedFieldTest(TempDirTest):
     @requires_file(CT)
     def test_derived_fields(self):
@@ -69,3 +72,30 @@ class DerivedFieldTest(TempDirTest):
         um7 = my_tree['tree', 'uid'] % 7
         assert_array_equal(my_tree['tree', 'uid_mod7'], um7)
         assert_equal(my_tree['tree', 'uid_mod7'].dtype, my_dtype)
+
+    @requires_file(CT)
+    def test_derived_field_plan(self):
+        a = ytree.load(CT)
+        fi = a.field_info
+
+        a.add_derived_field('potential', _potential,
+                             units='Msun/kpc')
+        plan = fi.get_field_plan(['potential'])
+        assert fi.get_field_plan(['potential']) is plan
+        pfields = [field for field, ftype in plan]
+        assert_equal(pfields[-1], 'potential')
+        assert 'mass' in pfields
+        assert 'virial_radius' in pfields
+
+        # adding a field invalidates the plan
+        a.add_derived_field('double_potential', _double_potential,
+                            units='Msun/kpc')
+        assert fi.get_field_plan(['potential']) is not plan
+        pfields = [field for field, ftype in
+                   fi.get_field_plan(['double_potential'])]
+        assert pfields.index('potential') < \
+          pfields.index('double_potential')
+
+        my_tree = a[0]
+        assert_array_equal(my_tree['tree', 'double_potential'],
+                           2 * my_tree['tree', 'potential'])
@@ -13,11 +13,32 @@ miscellaneous utility tests
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import h5py
+import numpy as np
+from numpy.testing import assert_array_equal
 import os
+import types
+from ytree.config import ytreecfg
+from ytree.data_structures.io import \
+    ChunkStore
 from ytree.data_structures.load import \
     load as ytree_load
+from ytree.data_structures.node_link import \
+    TreeLinks, \
+    get_descendent_indices, \
+    get_pointer_indices
+from ytree.frontends.ahf.io import \
+    AHFDataFile
+from ytree.frontends.consistent_trees.io import \
+    ConsistentTreesDataFile
+from ytree.frontends.treefarm.arbor import \
+    TreeFarmArbor
+from ytree.frontends.treefarm.io import \
+    TreeFarmColumnCache
 from ytree.utilities.io import \
-    f_text_block
+    f_text_block, \
+    get_index_cache_filename, \
+    parse_text_columns
 from ytree.utilities.loading import \
     test_data_dir
 from ytree.utilities.testing import \
@@ -46,6 +67,89 @@ def test_f_text_block():
         for l1, l2 in zip(lines, lines2):
             assert l1 == l2
 
+@requires_file(R63)
+def test_parse_text_columns():
+    columns = [0, 1, 2, 0]
+    dtypes = [np.int64, np.int64, np.float32, np.float64]
+    with open(R63, "rb") as f:
+        buff = f.read()
+
+    data = parse_text_columns(buff, columns, dtypes)
+
+    lines = [line.split() for line in buff.decode().split("\n")
+             if line and not line.startswith("#")]
+    for column, dtype, values in zip(columns, dtypes, data):
+        assert values.dtype == dtype
+        assert_array_equal(
+            values, np.array([line[column] for line in lines], dtype=dtype))
+
+    data = parse_text_columns(b"", columns, dtypes)
+    assert all(values.size == 0 for values in data)
+
+def test_tree_links():
+    """
+    Compare array-based tree links with a recursive walk.
+    """
+
+    gen = np.random.default_rng(5412)
+    for size in [1, 2, 17, 250]:
+        # shuffled tree with node 0 as the root
+        desc = np.array([-1] + [gen.integers(0, i) for i in range(1, size)])
+        order = np.concatenate([[0], gen.permutation(np.arange(1, size))])
+        uids = gen.choice(10 * size, size=size, replace=False)
+        my_uids = np.empty(size, dtype=np.int64)
+        my_desc_uids = np.empty(size, dtype=np.int64)
+        my_uids[order] = uids
+        my_desc_uids[order] = np.where(desc >= 0, uids[desc], -1)
+
+        desc_index = get_descendent_indices(my_uids, my_desc_uids)
+        assert_array_equal(desc_index[order[1:]], order[desc[1:]])
+
+        links = TreeLinks(desc_index)
+        ancestors = [[] for i in range(size)]
+        for i in np.argsort(desc_index, kind="stable"):
+            if desc_index[i] >= 0:
+                ancestors[desc_index[i]].append(i)
+
+        def walk(i):
+            yield i
+            for anc in links[i].ancestors:
+                yield from walk(anc.tree_id)
+
+        values = gen.integers(0, 5, size=size)
+        max_progs = links.select_ancestors(values, np.maximum)
+        min_progs = links.select_ancestors(values, np.minimum)
+
+        for i in range(size):
+            assert sorted(links.ancestor_indices(i)) == ancestors[i]
+            assert_array_equal(links.tree_indices(i), list(walk(i)))
+
+            my_ancs = links.ancestor_indices(i)
+            if my_ancs.size == 0:
+                assert max_progs[i] == min_progs[i] == -1
+                continue
+            assert max_progs[i] == my_ancs[np.argmax(values[my_ancs])]
+            assert min_progs[i] == my_ancs[np.argmin(values[my_ancs])]
+
+def test_pointer_indices():
+    """
+    Test descendent indices from pointers match uid matching.
+    """
+
+    gen = np.random.default_rng(2931)
+    root_uid = (7 << 32) + 1000
+    for size in [1, 2, 17, 250]:
+        desc = np.array([-1] + [gen.integers(0, i) for i in range(1, size)])
+        uids = root_uid + np.arange(size)
+        desc_uids = np.where(desc >= 0, desc + root_uid, -1)
+        # a pointer out of the tree is treated as no descendent
+        if size > 1:
+            desc_uids[-1] = root_uid + size
+
+        assert_array_equal(
+            get_pointer_indices(desc_uids, root_uid),
+            get_descendent_indices(uids, desc_uids))
+
 class MiscTest(TempDirTest):
     """
     Some miscellaneous tests in temporary directories
@@ -63,6 +167,137 @@ class MiscTest(TempDirTest):
         t['prog', 'redshift']
         t.save_tree()
 
+    @requires_file(R0)
+    def test_text_catalog_select(self):
+        """
+        Test reading selected lines from a text halo catalog
+        with line offsets from the index cache.
+        """
+        ytreecfg["ytree"]["index_cache_dir"] = self.tmpdir
+        try:
+            a = ytree_load(R0)
+            dtypes = {"ID": np.int64, "DescID": np.int64,
+                      "Mvir": np.float64}
+            fields = list(dtypes)
+            data_file = a.data_files[0]
+            # make sure line offsets are cached for this small file
+            data_file._scan_block_size = 1024
+            all_data = data_file._read_fields(fields, dtypes=dtypes)
+
+            gen = np.random.default_rng(1845)
+            nrows = all_data["ID"].size
+            rows = np.concatenate(
+                [gen.integers(0, nrows, 20), np.arange(5, 15)[::-1]])
+            for i in range(2):
+                # the second time uses cached line offsets
+                data_file.offsets = None
+                data = data_file._read_fields(
+                    fields, rows=rows, dtypes=dtypes)
+                assert os.path.exists(get_index_cache_filename(
+                    data_file.filename, kind="lines"))
+                for field in fields:
+                    assert_array_equal(data[field], all_data[field][rows])
+        finally:
+            ytreecfg.remove_option("ytree", "index_cache_dir")
+
+    def test_treefarm_column_cache(self):
+        data_files = []
+        for i in range(3):
+            filename = f"catalog_{i}.h5"
+            with h5py.File(filename, mode="w") as f:
+                f.create_dataset("mass", data=np.arange(10.) + i)
+                f.create_dataset("id", data=np.arange(10) + 10 * i)
+            data_files.append(types.SimpleNamespace(filename=filename))
+
+        # room for two columns and one open file
+        cache = TreeFarmColumnCache(160, 1)
+        for i, data_file in enumerate(data_files):
+            assert_array_equal(cache.get(data_file, "mass"), np.arange(10.) + i)
+            assert cache.nbytes <= 160
+            assert len(cache._handles) == 1
+        assert list(cache._columns) == \
+          [("catalog_1.h5", "mass"), ("catalog_2.h5", "mass")]
+
+        # using a column makes it the most recent
+        cache.get(data_files[1], "mass")
+        assert_array_equal(cache.get(data_files[0], "id"), np.arange(10))
+        assert list(cache._columns) == \
+          [("catalog_1.h5", "mass"), ("catalog_0.h5", "id")]
+
+        cache.clear()
+        assert cache.nbytes == 0
+        assert len(cache._handles) == 0
+
+    @requires_file(R0)
+    def test_node_io_loop_error(self):
+        """
+        Test that the treefarm column cache is cleared if the
+        function called in the node io loop raises an exception.
+        """
+        a = ytree_load(R0)
+        for attr in ["_node_io_loop_start", "_node_io_loop_finish"]:
+            setattr(a, attr,
+                    types.MethodType(getattr(TreeFarmArbor, attr), a))
+        for attr in ["_column_cache_limit", "_max_open_files",
+                     "_column_cache", "_column_cache_depth"]:
+            setattr(a, attr, getattr(TreeFarmArbor, attr))
+
+        def _fail(node):
+            assert a._column_cache_depth == 1
+            assert a._column_cache is not None
+            raise RuntimeError("Failing on purpose.")
+
+        with self.assertRaises(RuntimeError):
+            a._node_io_loop(_fail, root_nodes=np.arange(3))
+        assert a._column_cache_depth == 0
+        assert a._column_cache is None
+
+    def test_chunk_store(self):
+        data = np.arange(100)
+        with h5py.File("chunks.h5", mode="w") as f:
+            f.create_dataset("data", data=data)
+
+        store = ChunkStore(chunk_size=8)
+        with h5py.File("chunks.h5", mode="r") as f:
+            # increasing ranges, ranges bigger than a chunk,
+            # going backward, and running off the end
+            for start, end in [(0, 3), (3, 5), (5, 30), (30, 31),
+                               (10, 12), (95, 100), (99, 100)]:
+                assert_array_equal(
+                    store.get(f, "data", (start, end)), data[start:end])
+
+    def test_empty_ctrees_data_file(self):
+        open("tree_0_0_0.dat", mode="w").close()
+        data_file = ConsistentTreesDataFile("tree_0_0_0.dat")
+        data_file.open()
+        assert data_file.mm.find(b"\n", 0) == -1
+        assert data_file.mm[0:0] == b""
+        data_file.close()
+        assert data_file.mm is None
+
+    def test_ahf_mtree(self):
+        lines = ["#   HaloID(1)   HaloPart(2)  NumProgenitors(3)",
+                 "10  500  2",
+                 "  100  20  400",
+                 "  50  21  60",
+                 "",
+                 "11  300  1",
+                 "  250  22  260"]
+        with open("good.AHF_mtree", mode="w") as f:
+            f.write("\n".join(lines))
+        data_file = types.SimpleNamespace(mtree_filename="good.AHF_mtree")
+        data = AHFDataFile._read_mtree(data_file)
+        assert_array_equal(data["prog_id"], [20, 21, 22])
+        assert_array_equal(data["desc_id"], [10, 10, 11])
+        assert_array_equal(data["desc_part"], [500, 500, 300])
+
+        # a progenitor before any descendent
+        with open("bad.AHF_mtree", mode="w") as f:
+            f.write("\n".join(lines[:1] + lines[2:]))
+        data_file = types.SimpleNamespace(mtree_filename="bad.AHF_mtree")
+        with self.assertRaises(RuntimeError):
+            AHFDataFile._read_mtree(data_file)
+
 @requires_file(R0)
 def test_field_access_without_tree_setup():
     """
@@ -73,3 +308,20 @@ def test_field_access_without_tree_setup():
     a = ytree_load(R0)
     t = a[a['mass'].argmax()]
     list(t.ancestors)[0]['desc_uid']
+
+@requires_file(R0)
+def test_catalog_halo_arrays():
+    """
+    Test that catalog arbors keep compact halo arrays and only
+    make TreeNodes for the trees that are accessed.
+    """
+    a = ytree_load(R0)
+    a._plant_trees()
+    for field, array in a._halo_info.items():
+        assert array.dtype == np.int32, field
+
+    t = a[a['mass'].argmax()]
+    assert t["tree", "uid"].dtype == np.int64
+    assert_array_equal(t["tree", "uid"], t._uids)
+    assert t.tree_size == (a._halo_info["_desc"][
+        t._si:t._si+t.tree_size] >= 0).sum() + 1
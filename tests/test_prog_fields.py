@@ -0,0 +1,76 @@
+"""
+tests for get_prog_fields function
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) ytree development team. All rights reserved.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import ytree
+
+from ytree.utilities.testing import requires_file
+
+TCL = "tiny_ctrees/locations.dat"
+
+@requires_file(TCL)
+def test_get_prog_fields():
+    a = ytree.load(TCL)
+    fields = ["mass", "uid"]
+    data, offsets = a.get_prog_fields(fields)
+    assert offsets.size == a.size + 1
+    assert offsets[-1] == data["mass"].size
+
+    for i, tree in enumerate(a):
+        for field in fields:
+            assert_array_equal(
+                data[field][offsets[i]:offsets[i+1]], tree["prog", field])
+
+@requires_file(TCL)
+def test_get_prog_fields_padded():
+    a = ytree.load(TCL)
+    trees = list(a[::3])
+    data, offsets = a.get_prog_fields(
+        ["mass", "uid"], trees=trees, padded=True)
+    nprog = np.diff(offsets)
+    assert data["mass"].shape == (len(trees), nprog.max())
+
+    for i, tree in enumerate(trees):
+        n = nprog[i]
+        assert_array_equal(data["mass"][i, :n], tree["prog", "mass"])
+        assert_array_equal(data["uid"][i, :n], tree["prog", "uid"])
+        assert np.isnan(data["mass"][i, n:]).all()
+        assert (data["uid"][i, n:] == -1).all()
+
+@requires_file(TCL)
+def test_get_prog_fields_empty():
+    a = ytree.load(TCL)
+    for padded in [False, True]:
+        data, offsets = a.get_prog_fields(
+            ["mass", "uid"], trees=[], padded=padded)
+        assert_array_equal(offsets, [0])
+        assert data["mass"].size == 0
+        assert str(data["mass"].units) == str(a["mass"].units)
+
+@requires_file(TCL)
+def test_get_prog_fields_unsigned():
+    a = ytree.load(TCL)
+    a.add_analysis_field("counter", "", dtype=np.uint32, default=7)
+    trees = list(a[:4])
+    data, offsets = a.get_prog_fields("counter", trees=trees, padded=True)
+    assert data["counter"].dtype == np.uint32
+
+    nprog = np.diff(offsets)
+    for i in range(len(trees)):
+        n = nprog[i]
+        assert (data["counter"][i, :n] == 7).all()
+        assert (data["counter"][i, n:] == np.iinfo(np.uint32).max).all()
@@ -13,7 +13,16 @@ tests for saving arbors and trees
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import glob
+import h5py
+import numpy as np
+from numpy.testing import assert_array_equal
+import os
+
+from ytree.data_structures.save_arbor import \
+    get_chunk_size
 from ytree.utilities.testing import \
+    compare_hdf5, \
     compare_trees, \
     requires_file, \
     TempDirTest
@@ -23,6 +32,14 @@ import ytree
 CT = "consistent_trees/tree_0_0_0.dat"
 TCT = "tiny_ctrees/locations.dat"
 
+def test_chunk_size():
+    layout = {"chunk_size": "auto"}
+    assert get_chunk_size(layout, np.array([5000, 5000, 6000])) == 8192
+    # empty groups are not chunked
+    assert get_chunk_size(layout, np.array([], dtype=np.int64)) is None
+    assert get_chunk_size(layout, np.zeros(3, dtype=np.int64)) is None
+    assert get_chunk_size({"chunk_size": 8}, np.array([3])) == 3
+
 class SaveArborTest(TempDirTest):
     @requires_file(CT)
     def test_default_save(self):
@@ -32,6 +49,67 @@ class SaveArborTest(TempDirTest):
         a2 = ytree.load(fn)
         assert a.size == a2.size
 
+    @requires_file(CT)
+    def test_parallel_save(self):
+        a = ytree.load(CT)
+        fn1 = a.save_arbor(filename="serial/arbor", max_file_size=512)
+        fn2 = a.save_arbor(filename="parallel/arbor", max_file_size=512, nprocs=3)
+
+        files1 = sorted(glob.glob(os.path.join(os.path.dirname(fn1), "*.h5")))
+        files2 = sorted(glob.glob(os.path.join(os.path.dirname(fn2), "*.h5")))
+        assert len(files1) > 3
+        assert [os.path.basename(f) for f in files1] == \
+          [os.path.basename(f) for f in files2]
+
+        for f1, f2 in zip(files1, files2):
+            compare_hdf5(f1, f2)
+
+        a1 = ytree.load(fn1)
+        a2 = ytree.load(fn2)
+        assert a1.size == a2.size
+        for t1, t2 in zip(a1, a2):
+            compare_trees(t1, t2)
+
+    @requires_file(CT)
+    def test_save_layout(self):
+        a = ytree.load(CT)
+        fn1 = a.save_arbor(filename="contiguous/arbor", max_file_size=2048)
+        fn2 = a.save_arbor(filename="compressed/arbor", max_file_size=2048,
+                           chunk_size=64, compression="gzip",
+                           float_precision={"scale_factor": "float16"})
+
+        with h5py.File(fn2[:-len(".h5")] + "_0000.h5", mode="r") as f:
+            for dataset in f["data"].values():
+                assert dataset.chunks == (64,)
+                assert dataset.compression == "gzip"
+                assert dataset.shuffle
+            assert f["data/scale_factor"].dtype == np.float16
+            assert f["data/position_x"].dtype == np.float32
+
+        a1 = ytree.load(fn1)
+        a2 = ytree.load(fn2)
+        fields = a1.field_list[:]
+        fields.remove("scale_factor")
+
+        # read trees out of order so chunks are read separately
+        gen = np.random.default_rng(3211)
+        for i in gen.permutation(a1.size):
+            compare_trees(a1[i], a2[i], fields=fields)
+            assert_array_equal(
+                a1[i]["tree", "scale_factor"].astype(np.float16),
+                a2[i]["tree", "scale_factor"])
+
+        # precision given for a field that is saved under its own name
+        fn3 = a.save_arbor(filename="mvir/arbor", fields=["Mvir"],
+                           float_precision={"Mvir": "float64"})
+        with h5py.File(fn3[:-len(".h5")] + "_0000.h5", mode="r") as f:
+            assert f["data/Mvir"].dtype == np.float64
+
+        with self.assertRaises(ValueError):
+            a.save_arbor(filename="bad/arbor", compression="zstd")
+        with self.assertRaises(ValueError):
+            a.save_arbor(filename="bad/arbor", float_precision="int32")
+
     @requires_file(CT)
     def test_save_non_roots(self):
         a = ytree.load(CT)
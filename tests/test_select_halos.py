@@ -13,7 +13,9 @@ tests for select_halos function
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-from numpy.testing import assert_raises
+from numpy.testing import \
+    assert_array_equal, \
+    assert_raises
 
 import ytree
 
@@ -44,3 +46,23 @@ def test_select_halos_bad_input():
     with assert_raises(ValueError):
         list(a.select_halos("(tree['flock', 'mass'].to('Msun') > 1e13)"))
         list(a.select_halos("(tree['forest', 'mass'].to('Msun') > 1e13) & (tree['tree', 'redshift'] < 0.5)"))
+
+@requires_file(CT)
+def test_select_halos_bulk():
+    a = ytree.load(CT)
+
+    for criteria in ['tree["tree", "Orig_halo_ID"] == 0',
+                     'tree["prog", "mass"].to("Msun") > 1e11',
+                     'tree["forest", "redshift"] > 1',
+                     'tree["tree", "mass"] > tree["tree", "mass"].max() / 2']:
+        halos = list(a.select_halos(criteria))
+        selection = a.select_halos(criteria, bulk=True)
+        assert selection.size == len(halos)
+        assert [h.uid for h in selection] == [h.uid for h in halos]
+
+    trees = a.container(list(a[::4])[::-1])
+    criteria = 'tree["tree", "mass"].to("Msun") > 1e11'
+    halos = list(a.select_halos(criteria, trees=trees))
+    selection = a.select_halos(criteria, trees=trees, bulk=True)
+    assert_array_equal(selection["uid"], [h.uid for h in halos])
+    assert selection[-1].uid == halos[-1].uid
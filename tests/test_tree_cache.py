@@ -0,0 +1,98 @@
+"""
+tests for TreeCache
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) ytree development team. All rights reserved.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+from numpy.testing import \
+    assert_array_equal, \
+    assert_raises
+
+import ytree
+
+from ytree.data_structures.tree_cache import \
+    get_tree_nbytes, \
+    parse_memory_size
+from ytree.utilities.testing import \
+    compare_arbors, \
+    requires_file, \
+    TempDirTest
+
+TCL = "tiny_ctrees/locations.dat"
+
+def test_parse_memory_size():
+    assert parse_memory_size(None) is None
+    assert parse_memory_size(100) == 100
+    assert parse_memory_size("512") == 512
+    assert parse_memory_size("2kB") == 2000
+    assert parse_memory_size("1.5 MiB") == 1.5 * 1024**2
+    assert parse_memory_size("8GB") == 8 * 1000**3
+
+    for bad in ["lots", "8 GiGs", -1]:
+        with assert_raises(ValueError):
+            parse_memory_size(bad)
+
+@requires_file(TCL)
+def test_tree_cache_limit():
+    a = ytree.load(TCL)
+    trees = list(a[:])
+    masses = [tree["tree", "mass"] for tree in trees]
+    max_size = max(get_tree_nbytes(tree) for tree in trees)
+
+    a = ytree.load(TCL)
+    limit = 3 * max_size
+    a.set_cache_limit(limit)
+    trees = list(a[:])
+    for tree, mass in zip(trees, masses):
+        assert_array_equal(tree["tree", "mass"], mass)
+        assert a.tree_cache.nbytes <= limit
+
+    # older trees have been reset, but their data can be read again
+    assert len(trees[0].field_data) == 0
+    for tree, mass in zip(trees, masses):
+        assert_array_equal(tree["tree", "mass"], mass)
+
+    a.set_cache_limit(None)
+    assert len(a.tree_cache) == 0
+    for tree in trees:
+        tree["tree", "mass"]
+    assert all(len(tree.field_data) > 0 for tree in trees)
+
+@requires_file(TCL)
+def test_tree_cache_analysis_fields():
+    a = ytree.load(TCL)
+    a.add_analysis_field("test_field", default=-1, units="Msun")
+    a.set_cache_limit(1)
+
+    # values for non-root nodes are stored with the root
+    nodes = []
+    for i, tree in enumerate(a[:4]):
+        node = list(tree["tree"])[-1]
+        node["test_field"] = i
+        nodes.append(node)
+        tree["tree", "mass"]
+
+    for i, node in enumerate(nodes):
+        assert node["test_field"] == i
+
+class TreeCacheSaveTest(TempDirTest):
+    def test_save_with_cache_limit(self):
+        try:
+            filename = ytree.utilities.loading.get_path(TCL)
+        except IOError:
+            self.skipTest("test file missing")
+
+        a = ytree.load(filename)
+        a.set_cache_limit(1)
+        fn = a.save_arbor(filename="cached")
+        a2 = ytree.load(fn)
+        compare_arbors(a2, ytree.load(filename))
@@ -0,0 +1,63 @@
+"""
+tests for tree node selectors
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) ytree development team. All rights reserved.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import ytree
+
+from ytree.utilities.testing import requires_file
+
+TCL = "tiny_ctrees/locations.dat"
+
+def _min_value(ancestors, field):
+    vals = np.array([a[field] for a in ancestors])
+    return ancestors[np.argmin(vals)]
+
+def _min_value_array(data, links, field):
+    values = data[field]
+    progenitors = np.full(links.size, -1, dtype=np.int64)
+    for i in range(links.size):
+        ancestors = links.ancestor_indices(i)
+        if ancestors.size > 0:
+            progenitors[i] = ancestors[np.argmin(values[ancestors])]
+    return progenitors
+
+
+ytree.add_tree_node_selector("test_min_value", _min_value)
+ytree.add_tree_node_selector(
+    "test_min_value_array", _min_value, array_function=_min_value_array)
+
+@requires_file(TCL)
+def test_selector_protocols():
+    """
+    Test that selectors with and without array functions and the
+    built-in selector give the same progenitor lines.
+    """
+
+    arbors = []
+    for selector in ["min_field_value", "test_min_value",
+                     "test_min_value_array"]:
+        a = ytree.load(TCL)
+        a.set_selector(selector, "virial_radius")
+        arbors.append(a)
+
+    for i in range(0, arbors[0].size, 8):
+        trees = [a[i] for a in arbors]
+        nodes = [list(tree["tree"])[tree.tree_size // 2] for tree in trees]
+        for my_nodes in (trees, nodes):
+            prog = my_nodes[0]["prog", "uid"]
+            for node in my_nodes[1:]:
+                assert_array_equal(node["prog", "uid"], prog)
@@ -13,8 +13,12 @@ tests for yt frontend and selection functions
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import glob
+import h5py
 import numpy as np
-from numpy.testing import assert_raises
+from numpy.testing import \
+    assert_array_equal, \
+    assert_raises
 import ytree
 
 from ytree.utilities.testing import \
@@ -88,6 +92,34 @@ class YTSelectionTest(TempDirTest):
         ytree_sp_mass.sort()
         assert_array_rel_equal(ytree_sp_mass, sp_mass, decimals=5)
 
+    @requires_file(CTG)
+    def test_spatial_index(self):
+        """
+        Test selections with and without the saved bounding boxes.
+        """
+
+        a = self.arbor
+        fns = [a.save_arbor(filename=filename, max_file_size=2000)
+               for filename in ["bounds", "no_bounds"]]
+        for filename in glob.glob("no_bounds/*.h5"):
+            with h5py.File(filename, mode="r+") as f:
+                for name in ["file_left_edge", "file_right_edge",
+                             "tree_left_edge", "tree_right_edge"]:
+                    if name in f["index"]:
+                        del f["index"][name]
+
+        ds, ds2 = [ytree.load(fn).ytds for fn in fns]
+        assert len(ds.index.data_files) > 1
+        assert ds.index._file_bounds is not None
+        assert ds2.index._file_bounds is None
+
+        for c, r in [(0.5, 20), (0.01, 15), (0.9, 5)]:
+            sels = [my_ds.sphere(c*my_ds.domain_right_edge, (r, "Mpc/h"))
+                    for my_ds in [ds, ds2]]
+            for field in ["mass", "file_number", "file_root_index"]:
+                assert_array_equal(*[np.sort(sel["halos", field].d)
+                                     for sel in sels])
+
     @requires_file(CTG)
     def test_above(self):
         a = self.arbor
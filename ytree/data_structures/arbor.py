@@ -13,8 +13,6 @@ Arbor class and member functions
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-from collections import \
-    defaultdict
 import functools
 import numpy as np
 import os
@@ -34,26 +32,41 @@ from unyt.unit_registry import \
 from yt.utilities.cosmology import \
     Cosmology
 
+from ytree.config import \
+    ytreecfg
 from ytree.data_structures.detection import \
     SelectionDetector
 from ytree.data_structures.fields import \
     FieldContainer, \
     FieldInfoContainer
 from ytree.data_structures.io import \
+    CatalogRootFieldIO, \
+    CatalogTreeFieldIO, \
     DefaultRootFieldIO, \
     TreeFieldIO
 from ytree.data_structures.node_link import \
-    NodeLink
+    TreeLinks, \
+    get_descendent_indices, \
+    get_pointer_indices
 from ytree.data_structures.save_arbor import \
     save_arbor
-from ytree.data_structures.node_container import NodeContainer
+from ytree.data_structures.node_container import \
+    HaloSelection, \
+    NodeContainer
 from ytree.data_structures.tree_node import \
     TreeNode
+from ytree.data_structures.tree_cache import \
+    TreeCache
 from ytree.data_structures.tree_node_selector import \
     tree_node_selector_registry
+from ytree.utilities.io import \
+    load_index_cache, \
+    save_index_cache
 from ytree.utilities.logger import \
     ytreeLogger, \
     fake_pbar
+from ytree.utilities.misc import \
+    get_index_dtype
 
 arbor_registry = {}
 _selection_types = ("forest", "tree", "prog")
@@ -270,6 +283,76 @@ class Arbor(metaclass=RegisteredArbor):
             dict((attr, -np.ones(self._size, dtype=np.int64))
                 for attr in self._node_too_attrs))
 
+    @property
+    def _cache_filename(self):
+        """
+        The file next to which cache files are written.
+        """
+        return os.path.join(self.directory, self.basename)
+
+    @property
+    def _cache_tag(self):
+        """
+        A string identifying how trees are organized for this arbor.
+        """
+        return type(self).__name__
+
+    def _get_cache_key_files(self):
+        """
+        Return all files from which field data are read.
+
+        Cached field data are only valid if none of these have changed.
+        """
+
+        key_files = []
+        stack = [self.filename, getattr(self, "data_files", None)]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, (list, tuple)):
+                stack.extend(item)
+            elif isinstance(item, str):
+                key_files.append(item)
+            elif hasattr(item, "filename"):
+                key_files.append(item.filename)
+
+        return list(dict.fromkeys(key_files))
+
+    def _load_node_info_cache(self, key_files):
+        """
+        Restore the node_info arrays from an index cache file.
+
+        Returns a dictionary of any additional attributes saved
+        with the cache, or None if no valid cache exists.
+        """
+
+        rval = load_index_cache(self.filename, key_files)
+        if rval is None:
+            return None
+        arrays, attrs = rval
+
+        attrs_needed = self._node_con_attrs + self._node_io_attrs
+        if any(attr not in arrays for attr in attrs_needed):
+            return None
+
+        self._size = arrays[attrs_needed[0]].size
+        self._node_info_storage = \
+          dict((attr, arrays[attr]) for attr in attrs_needed)
+        self._node_info_storage.update(
+            dict((attr, -np.ones(self._size, dtype=np.int64))
+                for attr in self._node_too_attrs))
+        return attrs
+
+    def _save_node_info_cache(self, key_files, attrs=None):
+        """
+        Save the node_info arrays to an index cache file.
+        """
+
+        attrs_needed = self._node_con_attrs + self._node_io_attrs
+        save_index_cache(
+            self.filename, key_files,
+            dict((attr, self._node_info[attr]) for attr in attrs_needed),
+            attrs=attrs)
+
     def is_setup(self, tree_node):
         """
         Return True if arrays of uids and descendent uids have
@@ -312,6 +395,17 @@ class Arbor(metaclass=RegisteredArbor):
         """
         return tree_node.root != -1
 
+    def _get_descendent_indices(self, tree_node):
+        """
+        Return the index of each node's descendent within the tree.
+
+        By default, descendent uids are matched to uids. Frontends
+        that store descendent pointers on disk can override this
+        to build the tree directly from those.
+        """
+        return get_descendent_indices(
+            tree_node.uids, tree_node.desc_uids)
+
     def _grow_tree(self, tree_node, **kwargs):
         """
         Construct the hierarchy of ancestors and descendents
@@ -323,37 +417,13 @@ class Arbor(metaclass=RegisteredArbor):
             return
 
         self._setup_tree(tree_node, **kwargs)
-        size      = tree_node.tree_size
-        uids      = tree_node.uids
-        desc_uids = tree_node.desc_uids
-        links     = np.empty(size, dtype=object)
-
-        # Make a dict mapping uids to index of storage array.
-        # First, try to get indices out as the dict is constructed
-        # since the dict will be smaller at first.
-        uidmap = {}
-        not_found = []
-        for i, (uid, desc_uid) in enumerate(zip(uids, desc_uids)):
-            node = NodeLink(i)
-            uidmap[uid] = i
-            desc_index = uidmap.get(desc_uid)
-            if desc_index is None:
-                not_found.append((node, desc_uid))
-            else:
-                desc = links[desc_index]
-                desc.add_ancestor(node)
-            links[i] = node
-
-        # Make any additional links missed on the first pass.
-        for node, desc_uid in not_found:
-            if desc_uid == -1:
-                continue
-            desc = links[uidmap[desc_uid]]
-            desc.add_ancestor(node)
+        desc_index = self._get_descendent_indices(tree_node)
+        links = TreeLinks(desc_index)
 
         tree_node.root = tree_node
         tree_node._link = links[0]
         tree_node._link_storage = links
+        self.tree_cache.touch(tree_node)
 
     _attr_map = None
     def _build_attr(self, attr, tree_node):
@@ -456,19 +526,22 @@ class Arbor(metaclass=RegisteredArbor):
         for data_file, nodes in zip(data_files, node_list):
             self._node_io_loop_start(data_file)
 
-            # if we're doing all of them, just give the indices
-            if root_nodes is None:
-                my_nodes = nodes
-            else:
-                my_nodes = root_nodes[nodes]
-
-            for node in self._yield_root_nodes(my_nodes):
-                rval = func(node, *args, **kwargs)
-                rvals.append(rval)
-                c += 1
-                pbar.update(c)
-
-            self._node_io_loop_finish(data_file)
+            # make sure anything opened for this data file is
+            # cleaned up if func raises an exception
+            try:
+                # if we're doing all of them, just give the indices
+                if root_nodes is None:
+                    my_nodes = nodes
+                else:
+                    my_nodes = root_nodes[nodes]
+
+                for node in self._yield_root_nodes(my_nodes):
+                    rval = func(node, *args, **kwargs)
+                    rvals.append(rval)
+                    c += 1
+                    pbar.update(c)
+            finally:
+                self._node_io_loop_finish(data_file)
 
         if finish:
             pbar.finish()
@@ -638,6 +711,52 @@ class Arbor(metaclass=RegisteredArbor):
             self._field_info = self._field_info_class(self)
         return self._field_info
 
+    _tree_cache = None
+    @property
+    def tree_cache(self):
+        """
+        The :class:`~ytree.data_structures.tree_cache.TreeCache` used to
+        limit the memory held by trees.
+
+        The initial limit is taken from the cache_limit option in the
+        ytree config file. See
+        :func:`~ytree.data_structures.arbor.Arbor.set_cache_limit`.
+        """
+        if self._tree_cache is None:
+            self._tree_cache = TreeCache(
+                self, limit=ytreecfg["ytree"].get("cache_limit", None))
+        return self._tree_cache
+
+    def set_cache_limit(self, limit):
+        """
+        Set the maximum memory to be held by trees.
+
+        Field data and the arrays used to build trees are kept in
+        memory after they are first accessed. When a limit is set, the
+        memory held by all trees is tracked and the least recently used
+        trees are reset once the limit is exceeded. Their data will be
+        read again if accessed later. Trees with analysis fields are
+        never reset. By default, there is no limit.
+
+        Parameters
+        ----------
+        limit : int or string
+            The limit in bytes or as a string with units, e.g., "8GB"
+            or "512 MiB". If None, there is no limit.
+
+        Examples
+        --------
+
+        >>> import ytree
+        >>> a = ytree.load("tiny_ctrees/locations.dat")
+        >>> a.set_cache_limit("2GB")
+        >>> trees = list(a[:])
+        >>> for tree in trees:
+        ...     print (tree["tree", "mass"].max())
+
+        """
+        self.tree_cache.set_limit(limit)
+
     _size = None
     @property
     def size(self):
@@ -812,7 +931,7 @@ class Arbor(metaclass=RegisteredArbor):
         return nc
 
     def select_halos(self, criteria, trees=None,
-                     select_from=None, fields=None):
+                     select_from=None, fields=None, bulk=False):
         """
         Select halos from the arbor based on a set of criteria given as a string.
 
@@ -821,6 +940,13 @@ class Arbor(metaclass=RegisteredArbor):
         with them before the search has completed. The progress bar will update
         to report the number of matches found as the search progresses.
 
+        With bulk=True, the criteria are instead evaluated on the field
+        arrays of each tree without creating TreeNodes, with trees read
+        grouped by data file. This is much faster for large searches.
+        Matches are returned as a
+        :class:`~ytree.data_structures.node_container.HaloSelection`
+        holding only the arbor index and tree_id of each halo.
+
         Parameters
         ----------
 
@@ -835,12 +961,20 @@ class Arbor(metaclass=RegisteredArbor):
             This keyword is no longer required and using it does nothing.
         fields : deprecated, do not use
             This keyword is no longer required and using it does nothing.
+        bulk : optional, bool
+            If True, evaluate the criteria on field arrays without creating
+            TreeNodes and return a
+            :class:`~ytree.data_structures.node_container.HaloSelection`.
+            Default: False.
 
         Returns
         -------
 
         halos : :class:`~ytree.data_structures.tree_node.TreeNode` generator
-            A generator yielding all TreeNodes meeting the criteria.
+            A generator yielding all TreeNodes meeting the criteria. If
+            bulk is True, a
+            :class:`~ytree.data_structures.node_container.HaloSelection`
+            is returned instead.
 
         Examples
         --------
@@ -852,6 +986,10 @@ class Arbor(metaclass=RegisteredArbor):
         >>>
         >>> halos = list(a.select_halos('tree["prog", "mass"].to("Msun") >= 1e10'))
         >>> print (len(halos))
+        >>>
+        >>> halos = a.select_halos('tree["tree", "redshift"] > 1', bulk=True)
+        >>> print (halos.arbor_index, halos.tree_id)
+        >>> print (halos["mass"])
 
         """
 
@@ -878,6 +1016,16 @@ class Arbor(metaclass=RegisteredArbor):
                 f"{tree.selectors}.")
         selector = tree.selectors[0]
 
+        if bulk:
+            return self._select_halos_bulk(
+                criteria, selector, tree.fields, trees)
+        return self._select_halos(criteria, selector, trees)
+
+    def _select_halos(self, criteria, selector, trees):
+        """
+        Evaluate select_halos criteria one tree at a time.
+        """
+
         if trees is None:
             trees = self
 
@@ -896,6 +1044,201 @@ class Arbor(metaclass=RegisteredArbor):
 
         pbar.finish()
 
+    def _select_halos_bulk(self, criteria, selector, fields, trees):
+        """
+        Evaluate select_halos criteria on field arrays for each tree.
+
+        Trees are processed grouped by data file and the criteria are
+        evaluated on the field arrays of each tree without creating
+        TreeNodes for the matching halos.
+        """
+
+        reset = trees is None
+        if trees is not None:
+            if isinstance(trees, NodeContainer):
+                trees = trees.nodes
+            trees = list(trees)
+            root_nodes = np.empty(len(trees), dtype=object)
+            root_nodes[:] = trees
+        else:
+            root_nodes = None
+            trees = self
+
+        found = 0
+        pbar = get_pbar(f"Selecting halos ({found} found)", len(trees))
+
+        def _select_tree_halos(node):
+            nonlocal found
+            self._node_io.get_fields(node, fields=fields, root_only=False)
+            indices = getattr(node, f"_{selector}_field_indices")
+            root = node.find_root()
+            tree = dict(((selector, field), root.field_data[field][indices])
+                        for field in fields)
+            imatches = np.where(eval(criteria, globals(), {"tree": tree}))[0]
+            tree_id = np.arange(root.tree_size)[indices][imatches]
+            arbor_index = np.full(tree_id.size, root._arbor_index)
+            if reset:
+                self.reset_node(root)
+
+            if imatches.size > 0:
+                found += imatches.size
+                if isinstance(pbar, TqdmProgressBar):
+                    pbar._pbar.set_description_str(f"Selecting halos (found {found})")
+            return arbor_index, tree_id
+
+        rvals = self._node_io_loop(
+            _select_tree_halos, pbar=pbar, root_nodes=root_nodes)
+        pbar.finish()
+
+        if rvals:
+            arbor_index, tree_id = [np.concatenate(a) for a in zip(*rvals)]
+        else:
+            arbor_index = np.empty(0, dtype=np.int64)
+            tree_id = np.empty(0, dtype=np.int64)
+
+        return HaloSelection(self, arbor_index, tree_id)
+
+    def get_prog_fields(self, fields, trees=None, padded=False,
+                        fill_value=None):
+        """
+        Get field values for the progenitor lines of many trees at once.
+
+        This is equivalent to querying tree["prog", field] for every
+        tree, but trees are processed grouped by data file so that each
+        file is only opened once. Values for all trees are returned
+        together, either as a single ragged array with offsets marking
+        where each tree begins or as a padded two-dimensional array.
+
+        Parameters
+        ----------
+        fields : string or list of strings
+            The fields to be returned.
+        trees : optional, list or array of TreeNodes
+            The TreeNodes for which progenitor fields will be returned.
+            If none given, all trees in the arbor are used.
+            Default: None.
+        padded : optional, bool
+            If True, return arrays of shape (number of trees, length of
+            the longest progenitor line), with each row starting with
+            the head node. If False, return the values for all trees
+            concatenated into one array.
+            Default: False.
+        fill_value : optional, numeric
+            Value used for padding when padded is True. If None, nan is
+            used for floating point fields, -1 for signed integer fields,
+            the largest representable value for unsigned integer fields,
+            and an empty value for all others.
+            Default: None.
+
+        Returns
+        -------
+        field_data : dict
+            Dictionary of field arrays.
+        offsets : array of ints
+            Array of size number of trees + 1 such that the progenitor
+            line of tree i is given by offsets[i]:offsets[i+1] in the
+            ragged arrays. If padded, the length of each line is
+            np.diff(offsets).
+
+        Examples
+        --------
+
+        >>> import ytree
+        >>> a = ytree.load("tiny_ctrees/locations.dat")
+        >>> data, offsets = a.get_prog_fields(["mass", "redshift"])
+        >>> # the progenitor masses of the third tree
+        >>> print (data["mass"][offsets[2]:offsets[3]])
+        >>>
+        >>> data, offsets = a.get_prog_fields("mass", padded=True)
+        >>> print (data["mass"].shape)
+
+        """
+
+        if isinstance(fields, str):
+            fields = [fields]
+
+        reset = trees is None
+        if trees is not None:
+            if isinstance(trees, NodeContainer):
+                trees = trees.nodes
+            trees = list(trees)
+            root_nodes = np.empty(len(trees), dtype=object)
+            root_nodes[:] = trees
+            if root_nodes.size == 0:
+                return self._empty_prog_fields(fields, padded)
+        else:
+            root_nodes = None
+
+        def _get_prog_fields(node):
+            self._node_io.get_fields(node, fields=fields, root_only=False)
+            indices = node._prog_field_indices
+            root = node.find_root()
+            rval = dict((field, root.field_data[field][indices])
+                        for field in fields)
+            if reset:
+                self.reset_node(root)
+            return rval
+
+        rvals = self._node_io_loop(
+            _get_prog_fields, pbar="Getting progenitor fields",
+            root_nodes=root_nodes)
+
+        sizes = np.array([rval[fields[0]].shape[0] for rval in rvals],
+                         dtype=np.int64)
+        offsets = np.zeros(sizes.size + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        field_data = {}
+        for field in fields:
+            field_data[field] = np.concatenate(
+                [rval[field] for rval in rvals])
+        del rvals
+
+        if not padded:
+            return field_data, offsets
+
+        nlines = sizes.size
+        nmax = sizes.max() if nlines > 0 else 0
+        row = np.repeat(np.arange(nlines), sizes)
+        column = np.arange(offsets[-1]) - np.repeat(offsets[:-1], sizes)
+        for field in fields:
+            data = field_data[field]
+            fv = fill_value
+            if fv is None:
+                if data.dtype.kind == "f":
+                    fv = np.nan
+                elif data.dtype.kind == "i":
+                    fv = -1
+                elif data.dtype.kind == "u":
+                    fv = np.iinfo(data.dtype).max
+                else:
+                    fv = np.zeros(1, dtype=data.dtype)[0]
+            pdata = np.full((nlines, nmax) + data.shape[1:], fv,
+                            dtype=data.dtype)
+            pdata[row, column] = data
+            units = getattr(data, "units", None)
+            if units is not None:
+                pdata = self.arr(pdata, units)
+            field_data[field] = pdata
+
+        return field_data, offsets
+
+    def _empty_prog_fields(self, fields, padded):
+        """
+        Return get_prog_fields results for an empty list of trees.
+        """
+
+        shape = (0, 0) if padded else (0,)
+        field_data = {}
+        for field in fields:
+            fi = self.field_info[field]
+            data = np.empty(shape, dtype=fi.get("dtype", np.float64))
+            units = fi.get("units", "")
+            if units:
+                data = self.arr(data, units)
+            field_data[field] = data
+        return field_data, np.zeros(1, dtype=np.int64)
+
     def add_analysis_field(self, name, units, dtype=None, default=0):
         r"""
         Add an empty field to be filled by analysis operations.
@@ -1109,6 +1452,39 @@ class Arbor(metaclass=RegisteredArbor):
             Smaller numbers will result in more files. Performance
             may change somewhat with different values.
             Default: 524288 (2^19).
+        nprocs : optional, int
+            The number of processes used to write data files. If
+            greater than 1, data files are written in parallel by
+            forked processes, each of which reads the trees for its
+            own files. The saved arbor is the same as when saving
+            with one process. This requires the "fork" start method
+            of the multiprocessing module.
+            Default: 1.
+        chunk_size : optional, int or "auto"
+            If given, field data are stored in HDF5 chunks of this
+            many nodes. If "auto", the chunk size is set from the
+            average tree size in each file. Only the chunks
+            holding a tree are read when getting its fields.
+            Default: None, unless compression is used, then "auto".
+        compression : optional, string
+            Lossless compression to apply to all datasets, either
+            "gzip" or "lzf". Compressed files are smaller, but take
+            somewhat longer to read.
+            Default: None.
+        compression_opts : optional, int
+            Options for the compression filter. For "gzip", this is
+            the compression level, from 0 to 9.
+            Default: None.
+        shuffle : optional, bool
+            If True, apply the HDF5 shuffle filter when compressing.
+            This usually improves compression of numerical data.
+            Default: True.
+        float_precision : optional, dtype or dict
+            If given, floating point fields are saved with this
+            type, e.g., "float32". If a dict, the keys are field
+            names and the values are their types. Fields that are
+            not floating point are saved unchanged.
+            Default: None.
 
         Returns
         -------
@@ -1183,23 +1559,21 @@ class CatalogArbor(Arbor):
     pre-determined.
 
     Unlike formats where tree information is stored in single file,
-    halos are scattered about multiple catalog files. This requires
-    us to store the root TreeNode objects and their full assemblies.
+    halos are scattered about multiple catalog files. When trees are
+    planted, all halos are linked to their descendents and arranged
+    in arrays such that each tree occupies a contiguous range. The
+    TreeNodes are only created when trees are accessed.
     """
 
     _prefix = None
     _data_file_class = None
+    _tree_field_io_class = CatalogTreeFieldIO
+    _root_field_io_class = CatalogRootFieldIO
     # does the dataset define unique ids?
     _has_uids = False
 
-    # We will store root TreeNodes instead of generate them,
-    # so we don't need to store anything here.
-    _node_con_attrs = ()
-
-    # Don't reset _ancestors or descendents because we won't be able to
-    # rebuild trees without calling _plant_trees again.
-    _setup_attrs = ("_desc_uids", "_uids", "_nodes", "_link_storage")
-    _grow_attrs = ()
+    # index of the root in the arrays of halo info
+    _node_io_attrs = ('_si',)
 
     def __init__(self, filename):
         super().__init__(filename)
@@ -1213,49 +1587,20 @@ class CatalogArbor(Arbor):
     def _get_data_files(self):
         raise NotImplementedError
 
-    def _generate_root_node(self, index):
-        """
-        Return a node self._trees.
-
-        These cannot be generated easily, so we keep them.
-        """
-        node = self._trees[index]
-        if not hasattr(node, '_arbor_index'):
-            node._arbor_index = index
-        return node
-
-    _trees = None
-    @property
-    def is_planted(self):
-        """
-        Determine if trees have been planted.
-        """
-        return self._trees is not None
-
     def _plant_trees(self):
         """
-        Construct all trees.
-
-        Since nodes are spread out over multiple files, we will
-        plant all trees and create all ancestor/descendent links.
+        Link all halos to their descendents and arrange them into trees.
 
-        The links will be held by the nodes themselves and we will
-        not store the nodes in an array until _setup_tree is called.
+        Descendent ids of halos in each catalog are matched to the
+        halo ids of the previous catalog. Halos whose descendent cannot
+        be found become roots, unless the dataset defines unique ids.
+        In that case, they are linked to the halo with that uid in any
+        other catalog.
         """
 
         if self.is_planted:
             return
 
-        # This is a somewhat hacky way of catching halos with links
-        # spanning more than one data set. That said, dict access
-        # is much faster than I thought and perhaps this whole
-        # routine needs to be refactored.
-        if self._has_uids:
-            all_dict = {}
-            missed_connections = []
-
-        # this can be called once with the list, but fields are
-        # not guaranteed to be returned in order.
         if self._has_uids:
             id_fields = ["uid", "desc_uid"]
         else:
@@ -1265,138 +1610,159 @@ class CatalogArbor(Arbor):
            for field in id_fields]
         halo_id_f, desc_id_f = fields
         dtypes = dict((field, np.int64) for field in fields)
-        uid = 0
-        trees = []
-        nfiles = len(self.data_files)
-        descs = lastids = None
+
+        catalog_files = []
+        uids = []
+        desc_indices = []
+        file_indices = []
+        rows = []
+        missed = []
+        missed_uids = []
+        nhalos = 0
+        last_ids = None
         pbar = get_pbar("Planting trees", len(self.data_files))
         for i, dfl in enumerate(self.data_files):
             if not isinstance(dfl, list):
                 dfl = [dfl]
 
-            batches = []
-            bsize = []
-            hids = []
-            ancs = defaultdict(list)
+            halo_ids = []
+            desc_ids = []
             for data_file in dfl:
                 data = data_file._read_fields(fields, dtypes=dtypes)
-                nhalos = len(data[halo_id_f])
-                batch = np.empty(nhalos, dtype=object)
-
-                for it in range(nhalos):
-                    descid = data[desc_id_f][it]
-                    if self._has_uids:
-                        my_uid = data[halo_id_f][it]
-                    else:
-                        my_uid = uid
-                    root = i == 0 or descid == -1
-                    # The data says a descendent exists, but it's not there.
-                    # This shouldn't happen, but it does sometimes.
-                    # This can also happen when a descendent is more than
-                    # one snapshot removed.
-                    mcollect = False
-                    if not root and descid not in lastids:
-                        root = True
-                        my_descid = descid
-                        descid = data[desc_id_f][it] = -1
-                        if self._has_uids:
-                            mcollect = True
-                    tree_node = TreeNode(my_uid, arbor=self, root=root)
-                    tree_node._fi = it
-                    tree_node.data_file = data_file
-                    batch[it] = tree_node
-
-                    if self._has_uids:
-                        all_dict[my_uid] = tree_node
-
-                    if root:
-                        if mcollect:
-                            tree_node._desc_uid = my_descid
-                            missed_connections.append(tree_node)
-                        else:
-                            trees.append(tree_node)
-                    else:
-                        ancs[descid].append(tree_node)
-                    uid += 1
-                data_file.trees = batch
-                batches.append(batch)
-                bsize.append(batch.size)
-                hids.append(data[halo_id_f])
-
-            if i > 0:
-                for descid, ancestors in ancs.items():
-                    # this will not be fast
-                    descendent = descs[descid == lastids][0]
-                    descendent._ancestors = ancestors
-                    for ancestor in ancestors:
-                        ancestor._descendent = descendent
-
-            if i < nfiles - 1:
-                descs = np.empty(sum(bsize), dtype=object)
-                lastids = np.empty(descs.size, dtype=np.int64)
-                ib = 0
-                for batch, hid, bs in zip(batches, hids, bsize):
-                    descs[ib:ib+bs] = batch
-                    lastids[ib:ib+bs] = hid
-                    ib += bs
+                my_ids = np.asarray(data[halo_id_f], dtype=np.int64)
+                halo_ids.append(my_ids)
+                desc_ids.append(
+                    np.asarray(data[desc_id_f], dtype=np.int64))
+                file_indices.append(
+                    np.full(my_ids.size, len(catalog_files)))
+                rows.append(np.arange(my_ids.size))
+                catalog_files.append(data_file)
+            halo_ids = np.concatenate(halo_ids)
+            desc_ids = np.concatenate(desc_ids)
+
+            # Link each halo to the first halo in the previous
+            # catalog with its descendent id.
+            desc_index = np.full(halo_ids.size, -1, dtype=np.int64)
+            if last_ids is not None and last_ids.size > 0:
+                desc_index = get_descendent_indices(last_ids, desc_ids)
+                desc_index[desc_index >= 0] += nhalos - last_ids.size
+            found = desc_index >= 0
+
+            # The data says a descendent exists, but it's not there.
+            # This shouldn't happen, but it does sometimes.
+            # This can also happen when a descendent is more than
+            # one snapshot removed.
+            if self._has_uids and i > 0:
+                lost = np.flatnonzero(~found & (desc_ids != -1))
+                missed.append(lost + nhalos)
+                missed_uids.append(desc_ids[lost])
+
+            if self._has_uids:
+                uids.append(halo_ids)
+            else:
+                uids.append(nhalos + np.arange(halo_ids.size))
+            desc_indices.append(desc_index)
+            nhalos += halo_ids.size
+            last_ids = halo_ids
             pbar.update(i+1)
         pbar.finish()
 
-        if self._has_uids:
-            for node in missed_connections:
-                my_desc_uid = node._desc_uid
-                my_desc = all_dict[my_desc_uid]
-                delattr(node, "_desc_uid")
-
-                node._descendent = my_desc
-                node.root = my_desc.root
-                if my_desc._ancestors is None:
-                    my_desc._ancestors = []
-                my_desc._ancestors.append(node)
-
-        self._trees = np.array(trees)
-        self._size = self._trees.size
+        uids = np.concatenate(uids)
+        desc_index = np.concatenate(desc_indices)
+
+        # Link halos with missing descendents to the last
+        # halo with their descendent's uid.
+        missed = np.concatenate(missed or [[]]).astype(np.int64)
+        if missed.size > 0:
+            missed_uids = np.concatenate(missed_uids)
+            uid_order = np.argsort(uids, kind="stable")
+            suids = uids[uid_order]
+            ipos = np.searchsorted(suids, missed_uids, side="right") - 1
+            ipos = np.maximum(ipos, 0)
+            found = suids[ipos] == missed_uids
+            desc_index[missed[found]] = uid_order[ipos[found]]
+
+        self._catalog_files = catalog_files
+        self._arrange_trees(uids, desc_index,
+                            np.concatenate(file_indices),
+                            np.concatenate(rows))
+
+    def _arrange_trees(self, uids, desc_index, file_index, rows):
+        """
+        Store halo arrays with each tree in a contiguous range.
+
+        Halos are given in the order in which they were read. Trees
+        are ordered by their roots and the ancestors of each halo
+        are ordered as they were read. The halo arrays are:
+
+        - uid: the uid of each halo.
+        - _desc: the index of the descendent within the arrays.
+        - _fi: the index of the data file in _catalog_files.
+        - _ri: the row of the halo within its data file.
+
+        To keep memory use low for large simulations, these are
+        stored with the smallest integer types that will hold them.
+        """
+
+        order = TreeLinks(desc_index).preorder
+        position = np.empty(order.size, dtype=np.int64)
+        position[order] = np.arange(order.size)
+        desc = desc_index[order]
+        has_desc = desc >= 0
+        desc[has_desc] = position[desc[has_desc]]
+
+        # Use the smallest integer types possible since these
+        # hold an entry for every halo.
+        if uids.size > 0 and np.abs(uids).max() < np.iinfo(np.int32).max:
+            uid_dtype = np.int32
+        else:
+            uid_dtype = np.int64
+        index_dtype = get_index_dtype(order.size)
+        file_dtype = get_index_dtype(len(self._catalog_files))
+        row_dtype = get_index_dtype(rows.max() + 1 if rows.size else 0)
+
+        self._halo_info = {
+            "uid": uids[order].astype(uid_dtype),
+            "_desc": desc.astype(index_dtype),
+            "_fi": file_index[order].astype(file_dtype),
+            "_ri": rows[order].astype(row_dtype)}
+
+        roots = np.flatnonzero(~has_desc)
+        self._size = roots.size
+        self._node_info["uid"] = uids[order[roots]]
+        self._node_info["_si"] = roots
+        self._node_info["_tree_size"] = np.diff(np.append(roots, order.size))
 
-    def _setup_tree(self, tree_node):
+    def _setup_tree(self, tree_node, **kwargs):
         """
-        Walk the tree and place all nodes into an array.
-
-        This is required for field access.
+        Create arrays of uids and desc_uids from the halo arrays.
         """
 
         if self.is_setup(tree_node):
             return
 
-        nodes     = []
-        uids      = []
-        desc_uids = [-1]
-        # This is redundant, but enables functionality that uses
-        # the link storage, like TreeNode.get_node.
-        links     = []
-        for i, node in enumerate(tree_node._tree_nodes):
-            node._tree_id = i
-            node.root     = tree_node
-            nodes.append(node)
-            uids.append(node.uid)
-            link = NodeLink(i)
-            links.append(link)
-            if i > 0:
-                desc_uids.append(node.descendent.uid)
-                desc_link = links[node.descendent.tree_id]
-                desc_link.add_ancestor(link)
-        tree_node._nodes     = np.array(nodes)
-        tree_node._uids      = np.array(uids)
-        tree_node._desc_uids = np.array(desc_uids)
-        tree_node._tree_size = tree_node._uids.size
-        tree_node._link_storage = np.array(links)
+        start = tree_node._si
+        tree_slice = slice(start, start + tree_node._tree_size)
+        uids = self._halo_info["uid"]
+        desc = self._halo_info["_desc"][tree_slice]
+        has_desc = desc >= 0
+        desc_uids = np.full(desc.size, -1, dtype=np.int64)
+        desc_uids[has_desc] = uids[desc[has_desc]]
+
+        tree_node._uids      = uids[tree_slice].astype(np.int64)
+        tree_node._desc_uids = desc_uids
         # This should bypass any attempt to get this field in
         # the conventional way.
         if self.field_info["uid"].get("source") == "arbor":
             tree_node.field_data["uid"] = tree_node._uids
             tree_node.field_data["desc_uid"] = tree_node._desc_uids
 
-    def _grow_tree(self, tree_node):
+    def _get_descendent_indices(self, tree_node):
         """
-        Trees are grown when they are planted.
+        Get descendent indices from the halo arrays.
         """
-        pass
+
+        start = tree_node._si
+        tree_slice = slice(start, start + tree_node._tree_size)
+        return get_pointer_indices(
+            self._halo_info["_desc"][tree_slice], start)
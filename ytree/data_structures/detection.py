@@ -66,6 +66,7 @@ class SelectionDetector(Detector):
     def __init__(self, arbor):
         self.arbor = arbor
         self.selectors = []
+        self.fields = []
 
     def _validate_key(self, key):
         if not isinstance(key, tuple) and len(key) != 2:
@@ -83,6 +84,8 @@ class SelectionDetector(Detector):
         selector, field = key
         if selector not in self.selectors:
             self.selectors.append(selector)
+        if field not in self.fields:
+            self.fields.append(field)
 
         fi = self.arbor.field_info[field]
         units = fi.get("units", "")
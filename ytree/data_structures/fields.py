@@ -61,6 +61,7 @@ class FieldInfoContainer(dict):
     def __init__(self, arbor):
         self.arbor = weakref.proxy(arbor)
         self._data_types = dict(self.data_types)
+        self._field_plans = {}
 
     def setup_known_fields(self):
         """
@@ -287,18 +288,93 @@ Check the TypeError exception above for more details.
 
         self.vector_fields = tuple(added_fields)
 
+    def _clear_field_plans(self):
+        self._field_plans = {}
+
+    def __setitem__(self, key, value):
+        self._clear_field_plans()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._clear_field_plans()
+        super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self._clear_field_plans()
+        super().update(*args, **kwargs)
+
+    def pop(self, *args):
+        self._clear_field_plans()
+        return super().pop(*args)
+
+    def get_field_plan(self, fields):
+        """
+        Return all fields needed to get a list of fields, ordered
+        such that every field comes after its dependencies.
+
+        Plans are compiled once for each list of fields and kept
+        until fields are added or removed.
+        """
+
+        key = tuple(fields)
+        plan = self._field_plans.get(key)
+        if plan is not None:
+            return plan
+
+        plan = []
+        done = set()
+        visiting = set()
+
+        def _visit(field):
+            if field in done:
+                return
+            # Unknown fields are only an error if not already in
+            # the field cache, so this is checked when resolving.
+            if field not in self:
+                done.add(field)
+                plan.append((field, None))
+                return
+            if field in visiting:
+                raise ArborFieldCircularDependency(field, self.arbor)
+
+            visiting.add(field)
+            ftype = self[field].get("type")
+            if ftype in ("derived", "alias"):
+                for dep in self[field]["dependencies"]:
+                    _visit(dep)
+            visiting.discard(field)
+            done.add(field)
+            plan.append((field, ftype))
+
+        for field in fields:
+            _visit(field)
+
+        plan = tuple(plan)
+        self._field_plans[key] = plan
+        return plan
+
     def resolve_field_dependencies(self, fields, fcache=None, fsize=None):
         """
         Divide fields into those to be read and those to generate.
+
+        Fields to generate are ordered such that each field's
+        dependencies will have been generated before it.
         """
         if fcache is None:
             fcache = {}
+
+        plan = self.get_field_plan(fields)
+
+        # Walk the plan backward, from requested fields to their
+        # dependencies, to skip anything only needed for fields
+        # that already exist.
+        needed = set(fields)
         fields_to_read = []
         fields_to_generate = []
-        fields_to_resolve = fields[:]
+        for field, ftype in reversed(plan):
+            if field not in needed:
+                continue
 
-        while len(fields_to_resolve) > 0:
-            field = fields_to_resolve.pop(0)
             if field in fcache:
                 # Check that the field array is the size we want.
                 # It might not be if it was previously gotten just
@@ -310,22 +386,16 @@ Check the TypeError exception above for more details.
             if field not in self:
                 raise ArborFieldNotFound(field, self.arbor)
 
-            ftype = self[field].get("type")
             if ftype == "derived" or ftype == "alias":
-                deps = self[field]["dependencies"]
-                if field in deps:
-                    raise ArborFieldCircularDependency(
-                        field, self.arbor)
-                fields_to_resolve.extend(
-                    set(deps).difference(set(fields_to_resolve)))
-                if field not in fields_to_generate:
-                    fields_to_generate.append(field)
+                needed.update(self[field]["dependencies"])
+                fields_to_generate.append(field)
             elif ftype == "analysis":
                 fields_to_generate.append(field)
             else:
-                if field not in fields_to_read:
-                    fields_to_read.append(field)
+                fields_to_read.append(field)
 
+        fields_to_read.reverse()
+        fields_to_generate.reverse()
         return fields_to_read, fields_to_generate
 
 class FieldContainer(dict):
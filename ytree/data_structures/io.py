@@ -13,13 +13,21 @@ FieldIO class and member functions
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-from collections import defaultdict
+import json
+import mmap
 import numpy as np
 import os
 import weakref
 
+from ytree.config import \
+    ytreecfg
 from ytree.utilities.exceptions import \
     ArborAnalysisFieldNotGenerated
+from ytree.utilities.io import \
+    append_index_cache, \
+    load_index_cache, \
+    parse_text_columns, \
+    save_index_cache
 from ytree.utilities.logger import \
     ytreeLogger as mylog
 
@@ -86,6 +94,15 @@ class FieldIO:
         """
         raise NotImplementedError
 
+    def _load_fields(self, storage_object, fields, **kwargs):
+        """
+        Get fields that are on disk.
+
+        This is where fields can be taken from a cache instead
+        of being read.
+        """
+        return self._read_fields(storage_object, fields, **kwargs)
+
     def _store_fields(self, storage_object, fields):
         """
         Only keep items on the fields list.
@@ -138,35 +155,31 @@ class FieldIO:
 
         # Read in fields we need that are on disk.
         if fields_to_read:
-            read_data = self._read_fields(
+            read_data = self._load_fields(
                 storage_object, fields_to_read, **kwargs)
             fcache.update(read_data)
 
-        # Generate all derived fields/aliases, but
-        # only after dependencies have been generated.
-        while len(fields_to_generate) > 0:
-            field = fields_to_generate.pop(0)
-            if fi[field].get("type") == "analysis":
+        # Generate all derived fields/aliases. These are ordered
+        # such that dependencies are generated first.
+        for field in fields_to_generate:
+            ftype = fi[field]["type"]
+            if ftype == "analysis":
                 if field not in fields:
                     raise ArborAnalysisFieldNotGenerated(field, self.arbor)
                 self._initialize_analysis_field(storage_object, field)
                 continue
-            deps = set(fi[field]["dependencies"])
-            need = deps.difference(fcache)
-            # have not created all dependencies yet, try again later
-            if need:
-                fields_to_generate.append(field)
-            # all dependencies present, generate the field
-            else:
-                units = fi[field].get("units")
-                ftype = fi[field]["type"]
-                if ftype == "alias":
-                    data = fcache[fi[field]["dependencies"][0]]
-                elif ftype == "derived":
-                    data = fi[field]["function"](fi[field], fcache)
+            units = fi[field].get("units")
+            if ftype == "alias":
+                data = fcache[fi[field]["dependencies"][0]]
+                # Convert a copy so the aliased field keeps its units.
+                if hasattr(data, "units") and units is not None and \
+                  str(data.units) != units:
+                    data = data.to(units)
+            elif ftype == "derived":
+                data = fi[field]["function"](fi[field], fcache)
                 if hasattr(data, "units") and units is not None:
                     data.convert_to_units(units)
-                fcache[field] = data
+            fcache[field] = data
 
         self._store_fields(storage_object, set(old_fields).union(fields))
         return storage_object.field_data
@@ -191,42 +204,81 @@ class TreeFieldIO(FieldIO):
     def _determine_field_storage(self, data_object):
         return data_object.find_root()
 
+    def get_fields(self, data_object, fields=None, **kwargs):
+        field_data = super().get_fields(
+            data_object, fields=fields, **kwargs)
+        if fields:
+            self.arbor.tree_cache.touch(data_object.find_root())
+        return field_data
+
+class CatalogTreeFieldIO(TreeFieldIO):
+    """
+    IO class for getting fields for a tree from halo catalogs.
+
+    Halos in a tree are grouped by data file and read from each
+    file with a single call.
+    """
+
     def _read_fields(self, root_node, fields, dtypes=None,
                      root_only=False):
         """
         Read fields from disk for a single tree.
         """
 
+        start = root_node._si
+        if root_only:
+            indices = np.array([start])
+        else:
+            indices = np.arange(start, start + root_node.tree_size)
+        return self._read_halo_fields(indices, fields, dtypes=dtypes)
+
+    def _read_halo_fields(self, indices, fields, dtypes=None):
+        """
+        Read fields for halos given their indices in the halo arrays.
+
+        Fields from the arbor (i.e., uid and desc_uid) are taken
+        from the halo arrays instead of the data files.
+        """
+
         if dtypes is None:
             dtypes = {}
         my_dtypes = self._determine_dtypes(
             fields, override_dict=dtypes)
 
-        if root_only:
-            fsize = 1
-        else:
-            fsize = root_node.tree_size
+        arbor = self.arbor
+        halo_info = arbor._halo_info
+        fi = arbor.field_info
+        afields = [field for field in fields
+                   if fi[field].get("source") == "arbor"]
+        rfields = [field for field in fields if field not in afields]
 
         field_data = {}
         for field in fields:
             field_data[field] = \
-              np.empty(fsize, dtype=my_dtypes[field])
-
-        if root_only:
-            my_nodes = [root_node]
-        else:
-            my_nodes = root_node._tree_nodes
-
-        data_files = defaultdict(list)
-        for node in my_nodes:
-            data_files[node.data_file].append(node)
-
-        for data_file, nodes in data_files.items():
-            my_data = data_file._read_fields(fields, tree_nodes=nodes,
-                                             dtypes=my_dtypes)
-            for field in fields:
-                for i, node in enumerate(nodes):
-                    field_data[field][node.tree_id] = my_data[field][i]
+              np.empty(indices.size, dtype=my_dtypes[field])
+
+        if rfields:
+            file_index = halo_info["_fi"][indices]
+            order = np.argsort(file_index, kind="stable")
+            ifiles, starts = np.unique(file_index[order], return_index=True)
+            for ifile, my_order in zip(ifiles, np.split(order, starts[1:])):
+                data_file = arbor._catalog_files[ifile]
+                my_rows = halo_info["_ri"][indices[my_order]]
+                my_data = data_file._read_fields(
+                    rfields, rows=my_rows, dtypes=my_dtypes)
+                for field in rfields:
+                    field_data[field][my_order] = my_data[field]
+
+        desc = halo_info["_desc"][indices]
+        has_desc = desc >= 0
+        if "uid" in afields:
+            field_data["uid"][:] = halo_info["uid"][indices]
+        if "desc_uid" in fields:
+            # Halos whose descendent is missing are roots.
+            field_data["desc_uid"][~has_desc] = -1
+            if "desc_uid" in afields:
+                field_data["desc_uid"][has_desc] = \
+                  halo_info["uid"][desc[has_desc]]
 
         self._apply_units(fields, field_data)
 
@@ -236,8 +288,115 @@ class DefaultRootFieldIO(FieldIO):
     """
     Class for getting root fields from arbors that have no
     specialized storage for root fields.
+
+    If the index_cache_dir option is set, root fields read from
+    disk are saved to a cache file in that directory so they can be
+    loaded quickly the next time they are needed.
     """
 
+    _use_field_cache = True
+
+    def __init__(self, arbor, default_dtype=np.float64):
+        super().__init__(arbor, default_dtype=default_dtype)
+        self._field_cache = None
+        self._field_units = None
+
+    def _field_cache_enabled(self):
+        """
+        Root fields are only cached in a configured directory so
+        nothing is written next to the data.
+        """
+
+        return self._use_field_cache and \
+          ytreecfg["ytree"].get("index_cache_dir", None) is not None
+
+    def _get_field_cache(self):
+        """
+        Return a dictionary of cached root fields.
+
+        Fields are loaded from the cache file the first time.
+        """
+
+        if self._field_cache is not None:
+            return self._field_cache
+
+        self._field_cache = {}
+        self._field_units = {}
+        arbor = self.arbor
+        # plant trees first since this may find more data files
+        arbor._plant_trees()
+        rval = load_index_cache(
+            arbor._cache_filename, arbor._get_cache_key_files(),
+            kind="roots")
+        if rval is None:
+            return self._field_cache
+
+        arrays, attrs = rval
+        if attrs.get("arbor_type") != arbor._cache_tag:
+            return self._field_cache
+        units = json.loads(attrs.get("units", "{}"))
+        self._field_units = units
+
+        for field, data in arrays.items():
+            if data.shape[0] != arbor.size:
+                continue
+            funits = units.get(field, "")
+            if funits:
+                data = arbor.arr(data, funits)
+            self._field_cache[field] = data
+        return self._field_cache
+
+    def _save_field_cache(self, field_data):
+        """
+        Add newly read root fields to the cache file.
+
+        Only the new fields are written. The whole file is rewritten
+        only if it did not already hold a valid cache for this arbor.
+        """
+
+        arrays = {}
+        for field, data in field_data.items():
+            arrays[field] = np.asarray(data)
+            self._field_units[field] = str(getattr(data, "units", ""))
+
+        arbor = self.arbor
+        attrs = {"arbor_type": arbor._cache_tag,
+                 "units": json.dumps(self._field_units)}
+        if self._field_units.keys() == arrays.keys():
+            # nothing valid was loaded, so start a new file
+            save_function = save_index_cache
+        else:
+            save_function = append_index_cache
+        save_function(
+            arbor._cache_filename, arbor._get_cache_key_files(), arrays,
+            attrs=attrs, kind="roots")
+
+    def _load_fields(self, storage_object, fields, **kwargs):
+        if not self._field_cache_enabled() or kwargs.get("dtypes"):
+            return super()._load_fields(storage_object, fields, **kwargs)
+
+        field_cache = self._get_field_cache()
+        field_data = dict((field, field_cache[field])
+                          for field in fields if field in field_cache)
+
+        fields_to_read = [field for field in fields
+                          if field not in field_data]
+        if fields_to_read:
+            read_data = self._read_fields(
+                storage_object, fields_to_read, **kwargs)
+            field_data.update(read_data)
+            # Only cache numeric fields. Also, names with
+            # slashes would become hdf5 groups.
+            new_data = dict(
+                (field, read_data[field]) for field in fields_to_read
+                if read_data[field].dtype.kind in "biuf" and
+                "/" not in field)
+            if new_data:
+                field_cache.update(new_data)
+                self._save_field_cache(new_data)
+
+        return field_data
+
     def _initialize_analysis_field(self, storage_object, name):
         fi = self.arbor.field_info[name]
         default = fi['default']
@@ -268,6 +427,53 @@ class DefaultRootFieldIO(FieldIO):
 
         return field_data
 
+class CatalogRootFieldIO(DefaultRootFieldIO):
+    """
+    Class for getting root fields from halo catalogs.
+
+    Roots are grouped by data file and read from each file with
+    a single call.
+    """
+
+    def _read_fields(self, storage_object, fields, dtypes=None,
+                     root_only=True):
+        if not fields:
+            return
+
+        self.arbor._plant_trees()
+        return self.arbor._node_io._read_halo_fields(
+            self.arbor._node_info["_si"], fields, dtypes=dtypes)
+
+class ChunkStore:
+    """
+    Cache chunks of datasets from an open HDF5 file.
+
+    Reads of increasing, contiguous ranges of a dataset, such as
+    one tree after another, are served from a single larger read
+    until they run past the end of the chunk.
+    """
+    def __init__(self, chunk_size=262144):
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        self.data = {}
+        self.ind = {}
+
+    def get(self, fh, field, index):
+        start, end = index
+        si, ei = self.ind.get(field, (0, 0))
+
+        if field not in self.data or ei < end or si > start:
+            si = start
+            ei = start + max(self.chunk_size, end - start)
+            self.ind[field] = (si, ei)
+            self.data[field] = fh[field][si:ei]
+
+        data_s = start - si
+        data_e = end - si
+        return self.data[field][data_s:data_e]
+
 class DataFile:
     """
     Base class for data files.
@@ -295,14 +501,6 @@ class DataFile:
             self.fh.close()
             self.fh = None
 
-
-# A dict of arbor field generators.
-arbor_fields = {}
-arbor_fields['uid'] = lambda t: t.uid
-# This will only be called for a root.
-arbor_fields['desc_uid'] = lambda t: -1 if t.descendent is None \
-  else t.descendent.uid
-
 class CatalogDataFile(DataFile):
     """
     Base class for halo catalog files.
@@ -351,25 +549,7 @@ class CatalogDataFile(DataFile):
 
         return field_data
 
-    def _get_arbor_fields(self, afields, tree_nodes, dtypes):
-        """
-        Get fields from arbor/tree_node properties.
-        """
-
-        if not afields:
-            return {}
-
-        nt = len(tree_nodes)
-        field_data = self._create_field_arrays(afields, dtypes, size=nt)
-
-        for field in afields:
-            for i in range(nt):
-                field_data[field][i] = \
-                  arbor_fields[field](tree_nodes[i])
-
-        return field_data
-
-    def _get_header_fields(self, hfields, tree_nodes, dtypes):
+    def _get_header_fields(self, hfields, rows, dtypes):
         """
         Get fields from file header.
         """
@@ -380,7 +560,7 @@ class CatalogDataFile(DataFile):
         field_data = {}
         hfield_values = dict((field, getattr(self, field))
                              for field in hfields)
-        nt = len(tree_nodes)
+        nt = len(rows)
         for field in hfields:
             field_data[field] = hfield_values[field] * \
               np.ones(nt, dtypes[field])
@@ -393,15 +573,17 @@ class CatalogDataFile(DataFile):
         """
         raise NotImplementedError
 
-    def _read_data_select(self, rfields, tree_nodes, dtypes):
+    def _read_data_select(self, rfields, rows, dtypes):
         """
-        Read field data for a given set of halos.
+        Read field data for a given set of rows.
         """
         raise NotImplementedError
 
-    def _read_fields(self, fields, tree_nodes=None, dtypes=None):
+    def _read_fields(self, fields, rows=None, dtypes=None):
         """
-        Read all requested fields from disk, header, or arbor properties.
+        Read all requested fields from disk or the file header.
+
+        If rows is None, read all halos in the file.
         """
         if dtypes is None:
             dtypes = {}
@@ -409,7 +591,7 @@ class CatalogDataFile(DataFile):
         field_data = {}
         afields, hfields, rfields = self._get_field_sources(fields)
 
-        if tree_nodes is None:
+        if rows is None:
             field_data = self._read_data_default(
                 fields, dtypes)
 
@@ -417,16 +599,160 @@ class CatalogDataFile(DataFile):
             # fields from the actual data
             field_data.update(
                 self._read_data_select(
-                    rfields, tree_nodes, dtypes))
-
-            # fields from arbor-related info
-            field_data.update(
-                self._get_arbor_fields(
-                    afields, tree_nodes, dtypes))
+                    rfields, rows, dtypes))
 
             # fields from the file header
             field_data.update(
                 self._get_header_fields(
-                    hfields, tree_nodes, dtypes))
+                    hfields, rows, dtypes))
+
+        return field_data
+
+class TextCatalogDataFile(CatalogDataFile):
+    """
+    Base class for halo catalogs with one halo per line of text.
 
+    The file is memory-mapped and only the requested columns are
+    converted, all at once. The offset of every line is found by
+    scanning for newlines. For large files, these are saved to an
+    index cache file so they do not need to be found again.
+
+    Subclasses must set _hoffset, the offset of the first line of
+    data, and file_size when parsing the header.
+    """
+
+    mm = None
+    offsets = None
+    # size of blocks to scan for newlines
+    _scan_block_size = 1 << 26
+    # column separator, None for any whitespace
+    _delimiter = None
+    # start of comments within lines
+    _comments = "#"
+
+    @property
+    def _text_filename(self):
+        """
+        The name of the file containing the halo data.
+        """
+        return self.filename
+
+    def open(self):
+        if self.fh is not None:
+            return
+        self.fh = open(self._text_filename, "r")
+        if os.fstat(self.fh.fileno()).st_size > 0:
+            self.mm = mmap.mmap(
+                self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        super().close()
+
+    def _read_bytes(self, start, end):
+        if self.mm is None or end <= start:
+            return b""
+        return self.mm[start:end]
+
+    def _get_offsets(self):
+        """
+        Get the offset of every line of data in the file.
+
+        Lines that are empty or start with the comment string are
+        skipped. The file must be open.
+        """
+
+        if self.offsets is not None:
+            return self.offsets
+
+        # Small files are faster to scan than to load from the cache.
+        filename = self._text_filename
+        use_cache = self.file_size > self._scan_block_size
+        if use_cache:
+            rval = load_index_cache(filename, [filename], kind="lines")
+            if rval is not None:
+                self.offsets = rval[0]["offsets"]
+                return self.offsets
+
+        start = self._hoffset
+        end = self.file_size
+        if self.mm is None or end <= start:
+            self.offsets = np.empty(0, dtype=np.int64)
+            return self.offsets
+
+        # Scan in blocks to keep memory use low for large files.
+        line_starts = [np.array([start], dtype=np.int64)]
+        for bstart in range(start, end, self._scan_block_size):
+            bsize = min(self._scan_block_size, end - bstart)
+            block = np.frombuffer(
+                self.mm, dtype=np.uint8, count=bsize, offset=bstart)
+            line_starts.append(np.flatnonzero(block == ord("\n")) + bstart + 1)
+            del block
+        line_starts = np.concatenate(line_starts)
+        line_starts = line_starts[line_starts < end]
+
+        buff = np.frombuffer(self.mm, dtype=np.uint8)
+        first = buff[line_starts]
+        is_data = (first != ord("\n")) & (first != ord("\r"))
+        if self._comments:
+            is_comment = np.ones(line_starts.size, dtype=bool)
+            for i, char in enumerate(self._comments.encode()):
+                position = line_starts + i
+                is_comment &= position < end
+                is_comment &= buff[np.minimum(position, end - 1)] == char
+            is_data &= ~is_comment
+        del buff
+        self.offsets = line_starts[is_data]
+
+        if use_cache:
+            save_index_cache(filename, [filename],
+                             {"offsets": self.offsets}, kind="lines")
+        return self.offsets
+
+    def _parse_columns(self, buff, fields, dtypes):
+        fi = self.arbor.field_info
+        data = parse_text_columns(
+            buff, [fi[field]["column"] for field in fields],
+            [dtypes[field] for field in fields],
+            delimiter=self._delimiter, comments=self._comments)
+        return dict(zip(fields, data))
+
+    def _read_data_default(self, rfields, dtypes):
+        if not rfields:
+            return {}
+
+        self.open()
+        buff = self._read_bytes(self._hoffset, self.file_size)
+        self.close()
+
+        return self._parse_columns(buff, list(rfields), dtypes)
+
+    def _read_data_select(self, rfields, rows, dtypes):
+        if not rfields:
+            return {}
+        if len(rows) == 0:
+            return self._create_field_arrays(rfields, dtypes, size=0)
+
+        # Read lines in the order they appear in the file, with
+        # runs of consecutive lines read together.
+        urows, inverse = np.unique(rows, return_inverse=True)
+        self.open()
+        offsets = self._get_offsets()
+        breaks = np.flatnonzero(np.diff(urows) != 1) + 1
+        run_starts = offsets[urows[np.append(0, breaks)]]
+        # each run ends where the line after its last one starts
+        run_next = urows[np.append(breaks, urows.size) - 1] + 1
+        run_ends = np.where(
+            run_next < offsets.size,
+            offsets[np.minimum(run_next, offsets.size - 1)],
+            self.file_size)
+        buff = b"".join([self._read_bytes(start, end)
+                         for start, end in zip(run_starts, run_ends)])
+        self.close()
+
+        field_data = self._parse_columns(buff, list(rfields), dtypes)
+        for field in field_data:
+            field_data[field] = field_data[field][inverse]
         return field_data
@@ -1,5 +1,4 @@
 import numpy as np
-import types
 
 from ytree.data_structures.fields import FieldContainer
 
@@ -11,8 +10,17 @@ class NodeContainer:
 
     This is a convenience object to hold a series of TreeNodes
     and provide simple field access similar to querying fields
-    for an entire arbor. Field access for the container is cached
-    for fast second-time access.
+    for an entire arbor. Fields are read for all nodes at once,
+    with trees grouped by data file, and are cached for fast
+    second-time access. Fields for the forest, tree, or
+    progenitor list of each node can be queried with
+    container["prog", field], which returns a list of arrays.
+
+    Nodes are stored as the arbor index of the root of their tree
+    and their tree_id within that tree, and TreeNode objects are
+    only created as they are iterated over or accessed. The roots
+    of trees holding field data in memory, such as analysis fields,
+    are kept so those values are not lost.
 
     Parameters
     ----------
@@ -65,39 +73,287 @@ class NodeContainer:
 
     """
     def __init__(self, nodes, arbor=None):
-        self._nodes = nodes
+        self.arbor = arbor
         self.field_data = FieldContainer(arbor)
+        self._selection_data = {}
+        self._root = None
+        self._roots = {}
+
+        if nodes is None:
+            return
+
+        arbor_index = []
+        tree_id = []
+        for node in nodes:
+            root = node.find_root()
+            index = int(root._arbor_index)
+            if index not in self._roots and len(root.field_data) > 0:
+                self._roots[index] = root
+            arbor_index.append(index)
+            tree_id.append(node.tree_id)
+        self._arbor_index = np.array(arbor_index, dtype=np.int64)
+        self._tree_id = np.array(tree_id, dtype=np.int64)
+
+    @property
+    def arbor_index(self):
+        """
+        The index within the arbor of the root of each node's tree.
+        """
+        return self._arbor_index
+
+    @property
+    def tree_id(self):
+        """
+        The index of each node within its tree.
+        """
+        return self._tree_id
 
     @property
     def nodes(self):
-        if isinstance(self._nodes, types.GeneratorType):
-            self._nodes = list(self._nodes)
-        return self._nodes
+        """
+        A list of all TreeNodes in the container.
+        """
+        return list(self)
 
     def __len__(self):
-        return len(self.nodes)
+        return self._tree_id.size
 
     @property
     def size(self):
         return self.__len__()
 
     def __iter__(self):
-        for node in self.nodes:
-            yield node
+        for i in range(self.size):
+            yield self._get_node(i)
 
     def __getitem__(self, key):
+        if isinstance(key, tuple):
+            if len(key) != 2 or key[0] not in _selection_types:
+                raise SyntaxError(
+                    "Must be of form (\"forest\", field), "
+                    "(\"tree\", field), or (\"prog\", field).")
+
+            if key not in self._selection_data:
+                self._selection_data[key] = \
+                  self._get_selection_fields(key[0], [key[1]])[key[1]]
+            return self._selection_data[key]
+
         if isinstance(key, str):
             if key in _selection_types:
                 raise SyntaxError("Argument must be a field or integer.")
 
             if key not in self.field_data:
-                self.field_data[key] = self.field_data.arbor.arr(
-                    [tree[key] for tree in self.nodes])
+                self.field_data.update(self._get_node_fields([key]))
             return self.field_data[key]
 
-        if isinstance(key, (int, np.integer, slice)):
-            return self.nodes[key]
+        if isinstance(key, (int, np.integer)):
+            return self._get_node(key)
+
+        if isinstance(key, slice):
+            return [self._get_node(i) for i in range(self.size)[key]]
 
         else:
             raise ValueError(
                 f"Unrecognized argument type: {key} ({type(key)}).")
+
+    def _get_node(self, index):
+        """
+        Create the TreeNode at a position in the container.
+        """
+
+        arbor_index = int(self._arbor_index[index])
+        tree_id = int(self._tree_id[index])
+
+        root = self._roots.get(arbor_index)
+        if root is None:
+            # Nodes are often grouped by tree, so keep the last root
+            # around to avoid regrowing its tree for every node.
+            if self._root is None or \
+              self._root._arbor_index != arbor_index:
+                self._root = self.arbor[arbor_index]
+            root = self._root
+
+        if tree_id == 0:
+            return root
+        return root.get_node("forest", tree_id)
+
+    def _get_roots(self):
+        """
+        Group nodes by the root of their tree.
+
+        Returns
+        -------
+        root_nodes : array
+            The arbor indices of the roots to be given to
+            _node_io_loop, or root TreeNodes if the container
+            keeps any of them.
+        positions : dict of int arrays
+            The positions in the container of the nodes in each tree,
+            keyed by arbor index in the same order as root_nodes.
+        """
+
+        arbor_index, group = \
+          np.unique(self._arbor_index, return_inverse=True)
+        order = np.argsort(group, kind="stable")
+        positions = dict(zip(
+            arbor_index.tolist(),
+            np.split(order, np.flatnonzero(np.diff(group[order])) + 1)))
+
+        if not any(index in self._roots for index in arbor_index.tolist()):
+            return arbor_index, positions
+
+        root_nodes = np.empty(arbor_index.size, dtype=object)
+        for i, index in enumerate(arbor_index.tolist()):
+            root = self._roots.get(index)
+            if root is None:
+                root = self.arbor._generate_root_node(index)
+            root_nodes[i] = root
+        return root_nodes, positions
+
+    def _tree_io_loop(self, func):
+        """
+        Call a function on the root of each tree with the positions
+        of its nodes in the container, with trees grouped by data file.
+
+        Returns the return values in the order of the positions and an
+        array to put values for the concatenated positions back in
+        the order of the container.
+        """
+
+        arbor = self.arbor
+        root_nodes, positions = self._get_roots()
+
+        def _get_tree(root):
+            index = int(root._arbor_index)
+            rval = func(root, positions[index])
+            if index not in self._roots:
+                arbor.reset_node(root)
+            return rval
+
+        rvals = arbor._node_io_loop(_get_tree, root_nodes=root_nodes)
+
+        position = np.concatenate(list(positions.values()))
+        return_order = np.empty_like(position)
+        return_order[position] = np.arange(position.size)
+        return rvals, return_order
+
+    def _get_node_fields(self, fields):
+        """
+        Get field values for all nodes in bulk.
+
+        If all nodes are roots, values are taken from the arbor's
+        root field arrays if they have already been loaded, and only
+        the roots are read otherwise. If not, nodes are grouped by the
+        root of their tree and trees are read grouped by data file.
+        """
+
+        arbor = self.arbor
+        if self.size == 0:
+            return dict((field, arbor.arr([])) for field in fields)
+
+        root_only = bool((self._tree_id == 0).all())
+
+        field_data = {}
+        if root_only:
+            # avoid loading fields for the whole arbor
+            field_data = dict(
+                (field, arbor[field][self._arbor_index]) for field in fields
+                if field in arbor.field_data)
+            fields = [field for field in fields if field not in field_data]
+            if not fields:
+                return field_data
+
+        def _get_fields(root, position):
+            arbor._node_io.get_fields(
+                root, fields=fields, root_only=root_only)
+            tree_id = self._tree_id[position]
+            return dict((field, root.field_data[field][tree_id])
+                        for field in fields)
+
+        rvals, return_order = self._tree_io_loop(_get_fields)
+        for field in fields:
+            field_data[field] = np.concatenate(
+                [rval[field] for rval in rvals])[return_order]
+        return field_data
+
+    def _get_selection_indices(self, root, selector, tree_id):
+        """
+        Get the field array indices for the forest, tree, or
+        progenitor list of a node in a tree.
+        """
+
+        if selector == "forest":
+            return root._forest_field_indices
+
+        self.arbor._grow_tree(root)
+        if tree_id == 0:
+            return getattr(root, f"_{selector}_field_indices")
+
+        links = root._links
+        if selector == "tree":
+            return links.tree_indices(tree_id)
+
+        node = self.arbor._generate_tree_node(root, links[tree_id])
+        return node._prog_field_indices
+
+    def _get_selection_fields(self, selector, fields):
+        """
+        Get field values for the forest, tree, or progenitor list
+        of all nodes, with trees read grouped by data file.
+
+        Returns a dictionary of lists with an array for each node.
+        """
+
+        arbor = self.arbor
+        if self.size == 0:
+            return dict((field, []) for field in fields)
+
+        def _get_fields(root, position):
+            arbor._node_io.get_fields(root, fields=fields, root_only=False)
+            rval = []
+            for tree_id in self._tree_id[position].tolist():
+                indices = self._get_selection_indices(
+                    root, selector, tree_id)
+                rval.append(dict((field, root.field_data[field][indices])
+                                 for field in fields))
+            return rval
+
+        rvals, return_order = self._tree_io_loop(_get_fields)
+        data = [values for rval in rvals for values in rval]
+        return dict((field, [data[i][field] for i in return_order])
+                    for field in fields)
+
+class HaloSelection(NodeContainer):
+    """
+    A compact collection of halos returned by a bulk selection.
+
+    Halos are stored as the arbor index of the tree to which they
+    belong and their tree_id within that tree. TreeNode objects are
+    only created as they are iterated over or accessed.
+
+    Parameters
+    ----------
+
+    arbor : :class:`~ytree.data_structures.arbor.Arbor`
+        The Arbor to which the halos belong.
+    arbor_index : array of ints
+        The index within the arbor of the root of each halo's tree.
+    tree_id : array of ints
+        The index of each halo within its tree.
+
+    Examples
+    --------
+
+    >>> import ytree
+    >>> a = ytree.load("tiny_ctrees/locations.dat")
+    >>> halos = a.select_halos('tree["tree", "redshift"] > 1', bulk=True)
+    >>> print (halos.size)
+    >>> print (halos.arbor_index[:5], halos.tree_id[:5])
+    >>> for halo in halos:
+    ...     print (halo["mass"])
+
+    """
+    def __init__(self, arbor, arbor_index, tree_id):
+        super().__init__(None, arbor=arbor)
+        self._arbor_index = np.asarray(arbor_index, dtype=np.int64)
+        self._tree_id = np.asarray(tree_id, dtype=np.int64)
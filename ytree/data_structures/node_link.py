@@ -1,5 +1,5 @@
 """
-NodeLink class
+NodeLink and TreeLinks classes
 
 
 
@@ -13,14 +13,274 @@ NodeLink class
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import numpy as np
+
+def get_descendent_indices(uids, desc_uids):
+    """
+    Get the index of each node's descendent within a tree.
+
+    Descendent uids are matched to the uid array with a sort and
+    binary search instead of a dictionary. Nodes with no
+    descendent, or whose descendent is not in the tree, are
+    given an index of -1.
+    """
+
+    uid_order = np.argsort(uids, kind="stable")
+    suids = uids[uid_order]
+    ipos = np.searchsorted(suids, desc_uids)
+    ipos[ipos == suids.size] = 0
+    found = (suids[ipos] == desc_uids) & (desc_uids != -1)
+    desc_index = np.where(found, uid_order[ipos], -1)
+    return desc_index.astype(np.int64)
+
+def get_pointer_indices(desc_uids, root_uid):
+    """
+    Get the index of each node's descendent from on-disk pointers.
+
+    This is for trees where each node's uid is the uid of the root
+    plus the node's position within the tree, so descendent uids are
+    just pointers offset by the root uid and no matching is needed.
+    Pointers of -1, or to nodes outside the tree, are given an index
+    of -1.
+    """
+
+    desc_uids = np.asarray(desc_uids)
+    desc_index = desc_uids.astype(np.int64) - root_uid
+    outside = (desc_uids == -1) | \
+      (desc_index < 0) | (desc_index >= desc_index.size)
+    desc_index[outside] = -1
+    return desc_index
+
+class TreeLinks:
+    """
+    The ancestor/descendent structure of a tree stored as arrays.
+
+    For a tree of N nodes, desc_index holds the index of each node's
+    descendent (-1 for none). The ancestors of node i are
+    anc_indices[anc_offsets[i]:anc_offsets[i+1]]. NodeLink objects
+    are only created when they are asked for.
+    """
+
+    def __init__(self, desc_index):
+        self.desc_index = desc_index
+        self.size = desc_index.size
+
+        # This keeps the original ordering of ancestors. Those with a
+        # higher index than their descendent come first, then those
+        # with a lower index, each group ordered by index.
+        indices = np.arange(self.size)
+        has_desc = desc_index >= 0
+        my_anc = indices[has_desc]
+        my_desc = desc_index[has_desc]
+        order = np.lexsort((my_anc, my_desc > my_anc, my_desc))
+        self.anc_indices = my_anc[order]
+        self.anc_offsets = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(my_desc, minlength=self.size),
+                  out=self.anc_offsets[1:])
+
+        self._link_cache = {}
+        self._progenitor_cache = None
+        self._preorder = None
+        self._subtree_size = None
+        self._position = None
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += self.size
+            link = self._link_cache.get(key)
+            if link is None:
+                link = NodeLink(int(key), self)
+                self._link_cache[key] = link
+            return link
+
+        indices = np.arange(self.size)[key]
+        links = np.empty(indices.size, dtype=object)
+        for i, index in enumerate(indices):
+            links[i] = self[index]
+        return links
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes held by the link arrays.
+        """
+        arrays = (self.desc_index, self.anc_indices, self.anc_offsets,
+                  self._preorder, self._subtree_size, self._position)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    @property
+    def num_ancestors(self):
+        """
+        Number of ancestors of every node in the tree.
+        """
+        return np.diff(self.anc_offsets)
+
+    def ancestor_indices(self, index):
+        """
+        Return the indices of the ancestors of a single node.
+        """
+        return self.anc_indices[
+            self.anc_offsets[index]:self.anc_offsets[index+1]]
+
+    def select_ancestors(self, values, reduction):
+        """
+        Select one ancestor for every node in a single pass.
+
+        The ancestor chosen is the one whose value is returned by
+        applying the reduction (e.g., np.maximum) over the values of
+        all ancestors. As with np.argmax, ties go to the first
+        ancestor. Nodes with no ancestors get an index of -1.
+        """
+
+        selected = np.full(self.size, -1, dtype=np.int64)
+        nanc = self.num_ancestors
+        has_anc = nanc > 0
+        if not has_anc.any():
+            return selected
+
+        avalues = values[self.anc_indices]
+        target = reduction.reduceat(avalues, self.anc_offsets[:-1][has_anc])
+        segment = np.repeat(np.arange(target.size), nanc[has_anc])
+        match = avalues == target[segment]
+        # reductions propagate nans and argmax/argmin return the first one
+        if avalues.dtype.kind == "f":
+            match |= np.isnan(avalues) & np.isnan(target[segment])
+
+        first = np.flatnonzero(match)
+        _, ifirst = np.unique(segment[first], return_index=True)
+        selected[has_anc] = self.anc_indices[first[ifirst]]
+        return selected
+
+    def progenitor_indices(self, index, progenitors):
+        """
+        Return the indices of the line of progenitors starting with
+        a node, given the selected progenitor of every node.
+        """
+
+        pline = [index]
+        while True:
+            index = progenitors[index]
+            if index < 0:
+                break
+            pline.append(index)
+        return np.array(pline, dtype=np.int64)
+
+    def _get_levels(self):
+        """
+        Return arrays of node indices for each level of the tree,
+        starting with all nodes that have no descendent.
+
+        Within a level, nodes are grouped by descendent in the
+        same order as their descendents in the previous level.
+        """
+
+        levels = [np.where(self.desc_index < 0)[0]]
+        while True:
+            parents = levels[-1]
+            start = self.anc_offsets[parents]
+            count = self.anc_offsets[parents+1] - start
+            nchildren = count.sum()
+            if nchildren == 0:
+                break
+            # concatenate the ancestor ranges of all parents
+            group_start = np.repeat(start - np.cumsum(count) + count, count)
+            children = self.anc_indices[np.arange(nchildren) + group_start]
+            levels.append(children)
+        return levels
+
+    def _compute_preorder(self):
+        """
+        Compute the depth-first ordering of the tree.
+
+        This is the same order in which nodes are visited by walking
+        ancestor lists recursively, starting from the root. Because
+        every subtree is contiguous in this ordering, the tree beneath
+        any node is a slice of it.
+        """
+
+        levels = self._get_levels()
+
+        subtree_size = np.ones(self.size, dtype=np.int64)
+        for level in levels[:0:-1]:
+            np.add.at(subtree_size, self.desc_index[level],
+                      subtree_size[level])
+
+        position = np.empty(self.size, dtype=np.int64)
+        sizes = subtree_size[levels[0]]
+        position[levels[0]] = np.cumsum(sizes) - sizes
+        for level in levels[1:]:
+            sizes = subtree_size[level]
+            descs = self.desc_index[level]
+            # offset of each node from its descendent is one plus the
+            # sizes of the subtrees of its preceding siblings
+            csum = np.cumsum(sizes) - sizes
+            first = np.ones(level.size, dtype=bool)
+            first[1:] = descs[1:] != descs[:-1]
+            group_start = np.maximum.accumulate(
+                np.where(first, np.arange(level.size), 0))
+            position[level] = position[descs] + 1 + \
+              csum - csum[group_start]
+
+        preorder = np.empty(self.size, dtype=np.int64)
+        preorder[position] = np.arange(self.size)
+
+        self._preorder = preorder
+        self._subtree_size = subtree_size
+        self._position = position
+
+    @property
+    def preorder(self):
+        """
+        The indices of all nodes in depth-first order.
+
+        Nodes with no descendent are taken in order of their index,
+        each followed by the tree beneath it.
+        """
+
+        if self._preorder is None:
+            self._compute_preorder()
+        return self._preorder
+
+    def tree_indices(self, index=0):
+        """
+        Return the indices of all nodes in the tree beneath a node,
+        in depth-first order, starting with that node.
+        """
+
+        preorder = self.preorder
+        start = self._position[index]
+        return preorder[start:start+self._subtree_size[index]]
+
 class NodeLink:
-    __slots__ = ('tree_id', 'descendent', 'ancestors')
+    """
+    Link to a node's ancestors and descendent within a tree.
+
+    This holds only the node's index within the tree. Ancestors and
+    descendent are looked up from the arrays of a TreeLinks object.
+    """
 
-    def __init__(self, tree_id):
+    __slots__ = ('tree_id', '_tree_links')
+
+    def __init__(self, tree_id, tree_links):
         self.tree_id = tree_id
-        self.descendent = None
-        self.ancestors = []
+        self._tree_links = tree_links
+
+    @property
+    def descendent(self):
+        desc_index = self._tree_links.desc_index[self.tree_id]
+        if desc_index < 0:
+            return None
+        return self._tree_links[desc_index]
 
-    def add_ancestor(self, node):
-        self.ancestors.append(node)
-        node.descendent = self
+    @property
+    def ancestors(self):
+        tl = self._tree_links
+        return [tl[i] for i in tl.ancestor_indices(self.tree_id)]
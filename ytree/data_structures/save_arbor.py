@@ -5,13 +5,20 @@ save_arbor supporting functions
 
 """
 
+import h5py
 import json
+import multiprocessing
 import numpy as np
 import os
+import traceback
 import types
 
+from unyt import \
+    unyt_array
 from yt.frontends.ytdata.utilities import save_as_dataset
 from yt.funcs import get_pbar
+from ytree.utilities.exceptions import \
+    ArborFieldNotFound
 from ytree.utilities.io import ensure_dir
 from ytree.utilities.logger import ytreeLogger as mylog
 
@@ -23,9 +30,15 @@ from ytree.utilities.logger import ytreeLogger as mylog
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+# limits on automatic chunk sizes in number of nodes
+_min_chunk_size = 4096
+_max_chunk_size = 65536
+
 def save_arbor(arbor, filename=None, fields=None, trees=None,
                save_in_place=None, save_roots_only=False,
-               max_file_size=524288):
+               max_file_size=524288, nprocs=1,
+               chunk_size=None, compression=None, compression_opts=None,
+               shuffle=True, float_precision=None):
     """
     Save the arbor to a file.
 
@@ -54,6 +67,9 @@ def save_arbor(arbor, filename=None, fields=None, trees=None,
         arbor, filename, fields, trees, save_in_place)
     filename = determine_output_filename(filename, ".h5")
     fields = determine_field_list(arbor, fields, update)
+    layout = determine_dataset_layout(
+        arbor, fields, chunk_size, compression,
+        compression_opts, shuffle, float_precision)
 
     if not fields:
         mylog.warning(
@@ -64,13 +80,15 @@ def save_arbor(arbor, filename=None, fields=None, trees=None,
             " - No custom list of trees has been provided.")
         return None
 
-    group_nnodes, group_ntrees, root_field_data = \
+    group_nnodes, group_ntrees, root_field_data, file_bounds = \
       save_data_files(arbor, filename, fields, trees,
-                      max_file_size, update, save_roots_only)
+                      max_file_size, update, save_roots_only,
+                      nprocs=nprocs, layout=layout)
 
     header_filename = save_header_file(
         arbor, filename, fields, root_field_data,
-        group_nnodes, group_ntrees)
+        group_nnodes, group_ntrees, file_bounds=file_bounds,
+        layout=layout)
 
     return header_filename
 
@@ -150,6 +168,66 @@ def determine_field_list(arbor, fields, update):
 
     return fields
 
+def determine_dataset_layout(arbor, fields, chunk_size, compression,
+                             compression_opts, shuffle, float_precision):
+    """
+    Get the chunking, compression, and precision of saved fields.
+
+    Return None if no options are given. In that case, datasets
+    are written just as by yt's save_as_dataset, contiguous and
+    uncompressed.
+    """
+
+    if chunk_size is None and compression is None and \
+      float_precision is None:
+        return None
+
+    if compression not in [None, "gzip", "lzf"]:
+        raise ValueError(
+            f"Unsupported compression: {compression}. "
+            "Must be None, \"gzip\", or \"lzf\".")
+
+    if chunk_size is None and compression is not None:
+        chunk_size = "auto"
+    if chunk_size not in [None, "auto"] and \
+      (not isinstance(chunk_size, (int, np.integer)) or chunk_size < 1):
+        raise ValueError(
+            f"Invalid chunk_size: {chunk_size}. "
+            "Must be a positive integer or \"auto\".")
+
+    if float_precision is None:
+        precision = {}
+    elif isinstance(float_precision, dict):
+        precision = {}
+        for field, dtype in float_precision.items():
+            if field not in arbor.field_info:
+                raise ArborFieldNotFound(field, arbor=arbor)
+            precision[field] = dtype
+            for alias in arbor.field_info[field].get("aliases", []):
+                precision[alias] = dtype
+    else:
+        precision = dict((field, float_precision) for field in fields)
+
+    # dtypes of fields to be changed, by name on disk
+    dtypes = {}
+    for field, fieldname in zip(fields, get_output_fieldnames(fields)):
+        if field not in precision:
+            continue
+        dtype = np.dtype(precision[field])
+        if dtype.kind != "f":
+            raise ValueError(
+                f"Invalid float_precision for {field}: {dtype}. "
+                "Must be a floating point type.")
+        dtypes[fieldname] = dtype
+
+    layout = {
+        "chunk_size": chunk_size,
+        "compression": compression,
+        "compression_opts": compression_opts,
+        "shuffle": bool(shuffle) and compression is not None,
+        "dtypes": dtypes}
+    return layout
+
 def get_output_fieldnames(fields):
     """
     Get filenames as they will be written to disk.
@@ -158,15 +236,22 @@ def get_output_fieldnames(fields):
     return [field.replace("/", "_") for field in fields]
 
 def save_data_files(arbor, filename, fields, trees,
-                    max_file_size, update, nodes_only):
+                    max_file_size, update, nodes_only, nprocs=1,
+                    layout=None):
     """
     Write all data files by grouping trees together.
 
-    Return arrays of number of nodes and trees written to each file
-    as well as a dictionary of root fields.
+    Return arrays of number of nodes and trees written to each file,
+    a dictionary of root fields, and a list of the bounding boxes of
+    halo positions in each file.
 
     If update is True, use the file layout of the arbor instead of
     calculating from max_file_size.
+
+    If nprocs is greater than 1, each data file is written by a
+    forked process, with up to nprocs running at once. Results are
+    gathered in the same order as when saving serially, so the
+    output is the same.
     """
 
     # Keep the trees we want to transplant separate.
@@ -195,7 +280,9 @@ def save_data_files(arbor, filename, fields, trees,
     if not save_all:
         save_files = set(np.digitize([tree._ai for tree in save_roots.values()], arbor._node_io._ei))
 
-    root_field_data = {field: [] for field in fields}
+    # root field data and file bounds for each group of trees
+    group_results = {}
+    workers = []
 
     group_nnodes = []
     group_ntrees = []
@@ -215,14 +302,24 @@ def save_data_files(arbor, filename, fields, trees,
             mylog.info(f"[{cg_number+1}] / [~{total_guess}]: Compiling root fields.")
             cg_start = current_group[0]._arbor_index
             cg_end = current_group[-1]._arbor_index + 1
-            for field in fields:
-                root_field_data[field].append(arbor[field][cg_start:cg_end])
+            group_results[cg_number] = \
+              ({field: [arbor[field][cg_start:cg_end]] for field in fields}, None)
+
+        elif nprocs > 1:
+            if len(workers) >= nprocs:
+                finish_save_worker(workers.pop(0), group_results)
+            workers.append(start_save_worker(
+                arbor, filename, fields,
+                np.array(current_group), cg_number, total_guess,
+                layout=layout))
 
         else:
-            save_data_file(
+            group_root_data = {field: [] for field in fields}
+            bounds = save_data_file(
                 arbor, filename, fields,
-                np.array(current_group), root_field_data,
-                cg_number, total_guess)
+                np.array(current_group), group_root_data,
+                cg_number, total_guess, layout=layout)
+            group_results[cg_number] = (group_root_data, bounds)
 
     if update:
         file_sizes = np.diff(arbor._node_io._ei, prepend=0)
@@ -248,49 +345,126 @@ def save_data_files(arbor, filename, fields, trees,
     if current_group:
         my_save(i, cg_nnodes, cg_ntrees)
 
+    while workers:
+        finish_save_worker(workers.pop(0), group_results)
+
     group_nnodes = np.array(group_nnodes)
     group_ntrees = np.array(group_ntrees)
 
-    return group_nnodes, group_ntrees, root_field_data
+    root_field_data = {field: [] for field in fields}
+    file_bounds = []
+    for cg_number in range(group_nnodes.size):
+        group_root_data, bounds = group_results.pop(cg_number)
+        for field in fields:
+            root_field_data[field].extend(group_root_data[field])
+        if bounds is not None:
+            file_bounds.append(bounds)
+
+    return group_nnodes, group_ntrees, root_field_data, file_bounds
+
+def start_save_worker(arbor, filename, fields, tree_group,
+                      current_iteration, total_guess, layout=None):
+    """
+    Start a forked process to write the data file for a group of trees.
+
+    The process inherits the arbor, so nothing needs to be sent to it.
+    """
+
+    ctx = multiprocessing.get_context("fork")
+    conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(
+        target=save_data_file_worker,
+        args=(child_conn, arbor, filename, fields, tree_group,
+              current_iteration, total_guess, layout),
+        daemon=True)
+    process.start()
+    child_conn.close()
+    return process, conn, current_iteration, total_guess
+
+def save_data_file_worker(conn, arbor, filename, fields, tree_group,
+                          current_iteration, total_guess, layout):
+    """
+    Write a data file and send back its root fields and bounds.
+    """
+
+    try:
+        root_field_data = {field: [] for field in fields}
+        bounds = save_data_file(
+            arbor, filename, fields, tree_group, root_field_data,
+            current_iteration, total_guess, pbar=False, layout=layout)
+        conn.send((True, (root_field_data, bounds)))
+    except BaseException:
+        conn.send((False, traceback.format_exc()))
+    finally:
+        conn.close()
+
+def finish_save_worker(worker, group_results):
+    """
+    Wait for a worker to finish and store its results.
+    """
+
+    process, conn, current_iteration, total_guess = worker
+    try:
+        success, result = conn.recv()
+    except EOFError:
+        success, result = False, "Process exited without sending results."
+    conn.close()
+    process.join()
+
+    if not success:
+        raise RuntimeError(
+            f"Saving data file {current_iteration} failed:\n{result}")
+    mylog.info(f"[{current_iteration+1}] / [~{total_guess}]: Saved data file.")
+    group_results[current_iteration] = result
 
 def save_data_file(arbor, filename, fields, tree_group,
                    root_field_data,
-                   current_iteration, total_guess):
+                   current_iteration, total_guess, pbar=True,
+                   layout=None):
     """
     Write data file for a single group of trees.
+
+    If halo positions are saved, return the bounding box of
+    all positions in the file.
     """
 
     fieldnames = get_output_fieldnames(fields)
 
-    arbor._node_io_loop(
-        arbor._node_io.get_fields,
-        pbar=f"Getting fields [{current_iteration+1} / ~{total_guess}]",
-        root_nodes=tree_group, fields=fields, root_only=False)
+    if pbar:
+        pbar = f"Getting fields [{current_iteration+1} / ~{total_guess}]"
+    else:
+        pbar = None
 
-    main_fdata  = {}
-    main_ftypes = {}
+    # keep data for all trees in the group until written
+    with arbor.tree_cache.pause():
+        arbor._node_io_loop(
+            arbor._node_io.get_fields, pbar=pbar,
+            root_nodes=tree_group, fields=fields, root_only=False)
 
-    analysis_fdata  = {}
-    analysis_ftypes = {}
+        main_fdata  = {}
+        main_ftypes = {}
 
-    my_tree_size  = np.array([tree.tree_size for tree in tree_group])
-    my_tree_end   = my_tree_size.cumsum()
-    my_tree_start = my_tree_end - my_tree_size
-    for field, fieldname in zip(fields, fieldnames):
-        fi = arbor.field_info[field]
+        analysis_fdata  = {}
+        analysis_ftypes = {}
 
-        if fi.get("type") in ["analysis", "analysis_saved"]:
-            my_fdata  = analysis_fdata
-            my_ftypes = analysis_ftypes
-        else:
-            my_fdata  = main_fdata
-            my_ftypes = main_ftypes
+        my_tree_size  = np.array([tree.tree_size for tree in tree_group])
+        my_tree_end   = my_tree_size.cumsum()
+        my_tree_start = my_tree_end - my_tree_size
+        for field, fieldname in zip(fields, fieldnames):
+            fi = arbor.field_info[field]
 
-        my_ftypes[fieldname] = "data"
-        my_fdata[fieldname]  = np.concatenate(
-            [node.field_data[field] if node.is_root else node["tree", field]
-             for node in tree_group])
-        root_field_data[field].append(my_fdata[fieldname][my_tree_start])
+            if fi.get("type") in ["analysis", "analysis_saved"]:
+                my_fdata  = analysis_fdata
+                my_ftypes = analysis_ftypes
+            else:
+                my_fdata  = main_fdata
+                my_ftypes = main_ftypes
+
+            my_ftypes[fieldname] = "data"
+            my_fdata[fieldname]  = np.concatenate(
+                [node.field_data[field] if node.is_root else node["tree", field]
+                 for node in tree_group])
+            root_field_data[field].append(my_fdata[fieldname][my_tree_start])
 
     # In case we have saved any non-root trees,
     # mark them as having no descendents.
@@ -300,6 +474,9 @@ def save_data_file(arbor, filename, fields, tree_group,
     for node in tree_group:
         arbor.reset_node(node)
 
+    chunk_size = get_chunk_size(layout, my_tree_size)
+
+    file_bounds = None
     if main_fdata:
         main_fdata["tree_start_index"] = my_tree_start
         main_fdata["tree_end_index"]   = my_tree_end
@@ -308,19 +485,140 @@ def save_data_file(arbor, filename, fields, tree_group,
                    "tree_end_index",
                    "tree_size"]:
             main_ftypes[ft] = "index"
+
+        # Bounding boxes of each tree let the yt frontend
+        # read only the trees near a selection.
+        tree_bounds = get_tree_bounds(arbor, main_fdata, my_tree_start)
+        if tree_bounds is not None:
+            main_fdata["tree_left_edge"], main_fdata["tree_right_edge"] = \
+              tree_bounds
+            main_ftypes["tree_left_edge"] = "index"
+            main_ftypes["tree_right_edge"] = "index"
+            file_bounds = (tree_bounds[0].min(axis=0),
+                           tree_bounds[1].max(axis=0))
+
         my_filename = f"{filename}_{current_iteration:04d}.h5"
-        save_as_dataset({}, my_filename, main_fdata,
-                        field_types=main_ftypes)
+        save_field_data({}, my_filename, main_fdata,
+                        field_types=main_ftypes,
+                        layout=layout, chunk_size=chunk_size)
 
     if analysis_fdata:
         my_filename = f"{filename}_{current_iteration:04d}-analysis.h5"
-        save_as_dataset({}, my_filename, analysis_fdata,
-                        field_types=analysis_ftypes)
+        save_field_data({}, my_filename, analysis_fdata,
+                        field_types=analysis_ftypes,
+                        layout=layout, chunk_size=chunk_size)
+
+    return file_bounds
+
+def get_tree_bounds(arbor, fdata, tree_start):
+    """
+    Get bounding boxes of the halo positions in each tree.
+
+    Positions are wrapped into the periodic box, just as they are
+    by the yt frontend. Return None if halo positions or the box
+    size are not available.
+    """
+
+    pfields = [f"position_{ax}" for ax in "xyz"]
+    if arbor.box_size is None or \
+      not all(field in fdata for field in pfields):
+        return None
+
+    units = fdata["position_x"].units
+    pos = np.stack(
+        [fdata[field].to(units).d.astype(np.float64) for field in pfields],
+        axis=1)
+    np.mod(pos, arbor.box_size.to(units).d, out=pos)
+
+    left = np.minimum.reduceat(pos, tree_start, axis=0)
+    right = np.maximum.reduceat(pos, tree_start, axis=0)
+    return arbor.arr(left, units), arbor.arr(right, units)
+
+def get_chunk_size(layout, tree_size):
+    """
+    Get the number of nodes in each chunk of a data file's fields.
+
+    An automatic chunk size is the average tree size rounded up to
+    a power of 2, so most trees are read from one or two chunks.
+    This is kept within limits so chunks are neither too small to
+    compress well nor too large to read quickly.
+    """
+
+    if layout is None or layout["chunk_size"] is None:
+        return None
+
+    chunk_size = layout["chunk_size"]
+    if tree_size.sum() == 0:
+        return None
+    if chunk_size == "auto":
+        mean_size = tree_size.sum() / tree_size.size
+        chunk_size = 2**int(np.ceil(np.log2(mean_size)))
+        chunk_size = min(max(chunk_size, _min_chunk_size), _max_chunk_size)
+    return int(min(chunk_size, tree_size.sum()))
+
+def save_field_data(ds, filename, data, field_types=None,
+                    extra_attrs=None, layout=None, chunk_size=None):
+    """
+    Save field data to an hdf5 file.
+
+    Without a layout, this is yt's save_as_dataset. Otherwise, the
+    attributes are written by save_as_dataset and the datasets are
+    written here with the chunking, compression, and precision of
+    the layout. Fields of type "data" are stored in chunks of
+    chunk_size nodes. Other fields are chunked automatically by
+    h5py when compressed.
+    """
+
+    if layout is None:
+        return save_as_dataset(ds, filename, data,
+                               field_types=field_types,
+                               extra_attrs=extra_attrs)
+
+    save_as_dataset(ds, filename, {}, extra_attrs=extra_attrs)
+
+    with h5py.File(filename, mode="r+") as fh:
+        for field, fdata in data.items():
+            if field_types is None:
+                field_type = "data"
+            else:
+                field_type = field_types[field]
+            group = fh.require_group(field_type)
+
+            if fdata.dtype.kind == "U":
+                fdata = fdata.astype("|S")
+
+            options = {}
+            if field_type == "data":
+                dtype = layout["dtypes"].get(field)
+                if dtype is not None and fdata.dtype.kind == "f":
+                    fdata = fdata.astype(dtype)
+                if chunk_size is not None and fdata.size > 0:
+                    options["chunks"] = \
+                      (min(chunk_size, fdata.shape[0]),) + fdata.shape[1:]
+
+            if layout["compression"] is not None and fdata.size > 0:
+                options["compression"] = layout["compression"]
+                options["compression_opts"] = layout["compression_opts"]
+                options["shuffle"] = layout["shuffle"]
+
+            dataset = group.create_dataset(field, data=fdata, **options)
+            units = ""
+            if isinstance(fdata, unyt_array):
+                units = str(fdata.units)
+            dataset.attrs["units"] = units
+            if "num_elements" not in group.attrs:
+                group.attrs["num_elements"] = fdata.size
+
+    return filename
 
 def save_header_file(arbor, filename, fields, root_field_data,
-                     group_nnodes, group_ntrees):
+                     group_nnodes, group_ntrees, file_bounds=None,
+                     layout=None):
     """
     Write the header file.
+
+    If given, the bounding box of halo positions in each data
+    file is saved for the yt frontend.
     """
 
     ds = {}
@@ -383,14 +681,19 @@ def save_header_file(arbor, filename, fields, root_field_data,
         hdata = {"tree_start_index": tree_start_index,
                  "tree_end_index"  : tree_end_index,
                  "tree_size"       : group_ntrees}
+        if file_bounds and len(file_bounds) == group_nnodes.size:
+            for i, edge in enumerate(["left", "right"]):
+                hdata[f"file_{edge}_edge"] = arbor.arr(
+                    [bounds[i].d for bounds in file_bounds],
+                    file_bounds[0][i].units)
         hdata.update(main_rdata)
         del main_rdata
         htypes = dict((f, "index") for f in hdata)
         htypes.update(main_rtypes)
 
-        save_as_dataset(ds, header_filename, hdata,
+        save_field_data(ds, header_filename, hdata,
                         field_types=htypes,
-                        extra_attrs=extra_attrs)
+                        extra_attrs=extra_attrs, layout=layout)
         del hdata
 
     # Save analysis fields to a sidecar file.
@@ -403,9 +706,9 @@ def save_header_file(arbor, filename, fields, root_field_data,
         htypes.update(analysis_rtypes)
 
         analysis_header_filename = f"{filename}-analysis.h5"
-        save_as_dataset(ds, analysis_header_filename, hdata,
+        save_field_data(ds, analysis_header_filename, hdata,
                         field_types=htypes,
-                        extra_attrs=extra_attrs)
+                        extra_attrs=extra_attrs, layout=layout)
         del hdata
 
     return header_filename
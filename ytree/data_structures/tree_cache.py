@@ -0,0 +1,199 @@
+"""
+TreeCache class
+
+
+
+"""
+
+#-----------------------------------------------------------------------------
+# Copyright (c) ytree development team. All rights reserved.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import re
+import weakref
+
+_memory_units = {
+    "": 1, "b": 1,
+    "kb": 1000, "mb": 1000**2, "gb": 1000**3, "tb": 1000**4,
+    "kib": 1024, "mib": 1024**2, "gib": 1024**3, "tib": 1024**4,
+}
+
+def parse_memory_size(size):
+    """
+    Convert a memory size to a number of bytes.
+
+    Sizes can be given as a number of bytes or as a string,
+    such as "512MB" or "8 GiB". None is returned unchanged.
+    """
+
+    if size is None:
+        return None
+    if isinstance(size, str):
+        match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", size)
+        if match is None or match.group(2).lower() not in _memory_units:
+            raise ValueError(f"Cannot parse memory size: \"{size}\".")
+        value, units = match.groups()
+        size = float(value) * _memory_units[units.lower()]
+    size = int(size)
+    if size < 0:
+        raise ValueError(f"Memory size must be positive: {size}.")
+    return size
+
+def get_tree_nbytes(root_node):
+    """
+    Return the number of bytes held in memory by a tree.
+
+    This includes field data and the arrays used to build the tree.
+    """
+
+    arrays = list(root_node.field_data.values())
+    for attr in ("_uids", "_desc_uids"):
+        arrays.append(getattr(root_node, attr, None))
+
+    # aliased fields share the same array
+    seen = set()
+    nbytes = 0
+    for array in arrays:
+        if array is None or id(array) in seen:
+            continue
+        seen.add(id(array))
+        nbytes += getattr(array, "nbytes", 0)
+
+    links = getattr(root_node, "_link_storage", None)
+    if links is not None:
+        nbytes += links.nbytes
+    return nbytes
+
+class TreeCache:
+    """
+    Keep the memory held by trees of an Arbor under a limit.
+
+    Root TreeNodes are tracked in order of last use. When the total
+    memory held by all tracked trees exceeds the limit, the least
+    recently used trees are reset with Arbor.reset_node. Trees
+    holding analysis field values are never reset, since those
+    cannot be read back from disk.
+
+    Trees are only tracked if a limit has been set.
+
+    Parameters
+    ----------
+    arbor : :class:`~ytree.data_structures.arbor.Arbor`
+        The Arbor whose trees are tracked.
+    limit : optional, int or string
+        The memory limit in bytes or as a string, e.g., "8GB".
+        If None, there is no limit.
+        Default: None.
+    """
+
+    def __init__(self, arbor, limit=None):
+        self.arbor = weakref.proxy(arbor)
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._paused = 0
+        self.set_limit(limit)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set_limit(self, limit):
+        """
+        Set the memory limit and remove trees to meet it.
+        """
+
+        self.limit = parse_memory_size(limit)
+        if self.limit is None:
+            self.clear()
+        else:
+            self._evict()
+
+    def clear(self):
+        """
+        Stop tracking all trees without resetting them.
+        """
+
+        self._entries.clear()
+        self.nbytes = 0
+
+    @contextmanager
+    def pause(self):
+        """
+        Do not reset any trees within this context.
+
+        This is used when data for many trees are needed at once.
+        """
+
+        self._paused += 1
+        try:
+            yield
+        finally:
+            self._paused -= 1
+        self._evict()
+
+    def touch(self, root_node):
+        """
+        Mark a tree as most recently used and update its size.
+        """
+
+        if self.limit is None:
+            return
+
+        key = id(root_node)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+            ref = entry[0]
+        else:
+            ref = weakref.ref(
+                root_node, lambda ref, key=key: self._remove(key, ref))
+
+        nbytes = get_tree_nbytes(root_node)
+        self._entries[key] = [ref, nbytes]
+        self.nbytes += nbytes
+        self._evict()
+
+    def _remove(self, key, ref):
+        """
+        Stop tracking a tree that no longer exists.
+        """
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is ref:
+            del self._entries[key]
+            self.nbytes -= entry[1]
+
+    def _evict(self):
+        """
+        Reset least recently used trees until under the limit.
+
+        The most recently used tree is always kept.
+        """
+
+        if self.limit is None or self._paused:
+            return
+
+        fi = self.arbor.field_info
+        for key in list(self._entries)[:-1]:
+            if self.nbytes <= self.limit:
+                break
+
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            ref, nbytes = entry
+            root_node = ref()
+            if root_node is not None:
+                if any(fi.get(field, {}).get("type") in
+                       ("analysis", "analysis_saved")
+                       for field in root_node.field_data):
+                    continue
+                self.arbor.reset_node(root_node)
+
+            del self._entries[key]
+            self.nbytes -= nbytes
@@ -197,17 +197,17 @@ class TreeNode:
             # pass back to the arbor to avoid calculating again
             self.arbor._store_node_info(self, '_tree_size')
         else:
-            self._tree_size = len(list(self["tree"]))
+            self._tree_size = self._tree_field_indices.size
         return self._tree_size
 
     _link_storage = None
     @property
     def _links(self):
         """
-        Array of NodeLink objects with the ancestor/descendent structure.
+        TreeLinks object with the ancestor/descendent structure.
 
-        This is only used by conventional Arbor objects, i.e., not
-        CatalogArbor objects.
+        NodeLink objects for individual nodes are created from this
+        only when they are needed.
         """
         if not self.is_root:
             return None
@@ -367,8 +367,10 @@ class TreeNode:
         if indices is None:
             raise RuntimeError("Bad selector.")
 
-        my_link = self.root._links[indices][index]
-        return self.arbor._generate_tree_node(self.root, my_link)
+        root = self.find_root()
+        tree_id = np.arange(root.tree_size)[indices][index]
+        my_link = root._links[tree_id]
+        return self.arbor._generate_tree_node(root, my_link)
 
     def get_leaf_nodes(self, selector=None):
         """
@@ -406,11 +408,17 @@ class TreeNode:
             else:
                 selector = "tree"
 
-        uids = self[selector, "uid"]
-        desc_uids = self[selector, "desc_uid"]
-        lids = np.where(~np.isin(uids, desc_uids))[0]
+        self.arbor._grow_tree(self)
+        indices = getattr(self, f"_{selector}_field_indices", None)
+        if indices is None:
+            raise RuntimeError("Bad selector.")
+
+        root = self.find_root()
+        links = root._links
+        tree_ids = np.arange(links.size)[indices]
+        lids = tree_ids[links.num_ancestors[tree_ids] == 0]
         for lid in lids:
-            yield self.get_node(selector, lid)
+            yield self.arbor._generate_tree_node(root, links[lid])
 
     def get_root_nodes(self):
         """
@@ -504,7 +512,8 @@ class TreeNode:
             return self._tfi
 
         self.arbor._grow_tree(self)
-        self._tfi = np.array([node.tree_id for node in self._tree_nodes])
+        root = self.find_root()
+        self._tfi = root._links.tree_indices(self.tree_id)
         return self._tfi
 
     @property
@@ -526,15 +535,10 @@ class TreeNode:
 
         """
 
-        self.arbor._grow_tree(self)
-        my_node = self
-        while my_node is not None:
-            yield my_node
-            ancestors = list(my_node.ancestors)
-            if ancestors:
-                my_node = my_node.arbor.selector(ancestors)
-            else:
-                my_node = None
+        yield self
+        root = self.find_root()
+        for tree_id in self._prog_field_indices[1:]:
+            yield self.arbor._generate_tree_node(root, root._links[tree_id])
 
     _pfi = None
     @property
@@ -548,7 +552,29 @@ class TreeNode:
             return self._pfi
 
         self.arbor._grow_tree(self)
-        self._pfi = np.array([node.tree_id for node in self._prog_nodes])
+        root = self.find_root()
+        links = root._links
+
+        tree_id = self.tree_id
+        selector = self.arbor.selector
+        # Selectors with array functions do not need TreeNodes
+        # to be created for the ancestors.
+        if selector.array_function is not None:
+            progenitors = selector.get_progenitors(root)
+            self._pfi = links.progenitor_indices(tree_id, progenitors)
+            return self._pfi
+
+        pfi = [tree_id]
+        while True:
+            ancestors = links.ancestor_indices(tree_id)
+            if ancestors.size == 0:
+                break
+            anc_nodes = [self.arbor._generate_tree_node(root, links[i])
+                         for i in ancestors]
+            tree_id = selector(anc_nodes).tree_id
+            pfi.append(tree_id)
+
+        self._pfi = np.array(pfi)
         return self._pfi
 
     def save_tree(self, filename=None, fields=None):
@@ -20,7 +20,7 @@ from yt.utilities.operator_registry import \
 
 tree_node_selector_registry = OperatorRegistry()
 
-def add_tree_node_selector(name, function):
+def add_tree_node_selector(name, function, array_function=None):
     r"""
     Add a TreeNodeSelector to the registry of known selectors, so they
     can be chosen with :func:`~ytree.data_structures.arbor.Arbor.set_selector`.
@@ -31,6 +31,16 @@ def add_tree_node_selector(name, function):
         Name of the selector.
     function : callable
         The associated function.
+    array_function : optional, callable
+        A function doing the same selection with field arrays for a
+        whole tree at once. This accepts a dictionary-like object of
+        field arrays for the tree and the tree's
+        :class:`~ytree.data_structures.node_link.TreeLinks`, and
+        returns an array with the index of the selected ancestor of
+        every node, or -1 for nodes with no ancestors. If given, this
+        is used instead of function, so no TreeNodes need to be
+        created.
+        Default: None.
 
     Examples
     --------
@@ -44,8 +54,14 @@ def add_tree_node_selector(name, function):
     >>> a.set_selector("max_field_value", "mass")
     >>> print (a[0]["prog"])
 
+    >>> def max_value_array(data, links, field):
+    ...     return links.select_ancestors(data[field], np.maximum)
+    >>> ytree.add_tree_node_selector(
+    ...     "max_field_value", max_value, array_function=max_value_array)
+
     """
-    tree_node_selector_registry[name] = TreeNodeSelector(function)
+    tree_node_selector_registry[name] = TreeNodeSelector(
+        function, array_function=array_function)
 
 class TreeNodeSelector:
     r"""
@@ -60,6 +76,11 @@ class TreeNodeSelector:
 
     The function should return a single TreeNode.
 
+    Selectors may also have an array function, which accepts field
+    arrays and links for the whole tree and returns the index of the
+    selected ancestor of every node. This is used instead of the
+    function when available.
+
     Examples
     --------
 
@@ -73,16 +94,55 @@ class TreeNodeSelector:
     >>> print (a[0]["prog"])
 
     """
-    def __init__(self, function, args=None, kwargs=None):
+    def __init__(self, function, args=None, kwargs=None,
+                 array_function=None):
         self.function = function
         self.args = args
         if self.args is None: self.args = []
         self.kwargs = kwargs
         if self.kwargs is None: self.kwargs = {}
+        self.array_function = array_function
 
     def __call__(self, ancestors):
         return self.function(ancestors, *self.args, **self.kwargs)
 
+    def get_progenitors(self, root_node):
+        """
+        Get the selected ancestor of every node in a tree.
+
+        This is only available for selectors with an array function.
+        The result is cached with the tree's links.
+        """
+
+        links = root_node._links
+        cache = links._progenitor_cache
+        if cache is not None and cache[0] is self:
+            return cache[1]
+
+        progenitors = self.array_function(
+            TreeFieldArrays(root_node), links, *self.args, **self.kwargs)
+        links._progenitor_cache = (self, progenitors)
+        return progenitors
+
+class TreeFieldArrays:
+    """
+    Field arrays for all nodes in a tree, read when first needed.
+
+    This is given to array functions of selectors. Arrays are
+    indexed the same way as the tree's links.
+    """
+
+    def __init__(self, root_node):
+        self.root_node = root_node
+        self._arrays = {}
+
+    def __getitem__(self, field):
+        array = self._arrays.get(field)
+        if array is None:
+            array = np.asarray(self.root_node["forest", field])
+            self._arrays[field] = array
+        return array
+
 def max_field_value(ancestors, field):
     r"""
     Return the TreeNode with the maximum value of the given field.
@@ -103,8 +163,16 @@ def max_field_value(ancestors, field):
     vals = np.array([a[field] for a in ancestors])
     return ancestors[np.argmax(vals)]
 
+def _max_field_value_array(data, links, field):
+    """
+    Select the ancestor with the maximum field value for every node.
+    """
+
+    return links.select_ancestors(data[field], np.maximum)
 
-add_tree_node_selector("max_field_value", max_field_value)
+
+tree_node_selector_registry["max_field_value"] = TreeNodeSelector(
+    max_field_value, array_function=_max_field_value_array)
 
 def min_field_value(ancestors, field):
     r"""
@@ -126,5 +194,13 @@ def min_field_value(ancestors, field):
     vals = np.array([a[field] for a in ancestors])
     return ancestors[np.argmin(vals)]
 
+def _min_field_value_array(data, links, field):
+    """
+    Select the ancestor with the minimum field value for every node.
+    """
+
+    return links.select_ancestors(data[field], np.minimum)
+
 
-add_tree_node_selector("min_field_value", min_field_value)
+tree_node_selector_registry["min_field_value"] = TreeNodeSelector(
+    min_field_value, array_function=_min_field_value_array)
@@ -221,6 +221,14 @@ class AHFArbor(CatalogArbor):
         self.data_files[-1].mtree_filename = None
         self.data_files.reverse()
 
+    def _get_cache_key_files(self):
+        key_files = super()._get_cache_key_files()
+        for data_file in self.data_files:
+            for fn in [data_file.halos_filename, data_file.mtree_filename]:
+                if fn is not None:
+                    key_files.append(fn)
+        return key_files
+
     def _get_file_index(self, f):
         reg = self._file_pattern.search(f)
         if not reg:
@@ -22,12 +22,13 @@ import weakref
 from ytree.frontends.ahf.misc import \
     parse_AHF_file
 from ytree.data_structures.io import \
-    CatalogDataFile
+    TextCatalogDataFile
 from ytree.utilities.io import \
-    f_text_block
+    f_text_block, \
+    parse_text_columns
 from ytree.utilities.misc import fround
 
-class AHFDataFile(CatalogDataFile):
+class AHFDataFile(TextCatalogDataFile):
     _redshift_precision = 3
 
     def __init__(self, filename, arbor):
@@ -58,7 +59,6 @@ class AHFDataFile(CatalogDataFile):
         self._get_other_filenames()
         self.fh = None
         self._parse_data_header()
-        self.offsets = None
 
     def _get_other_filenames(self):
         """
@@ -117,9 +117,9 @@ class AHFDataFile(CatalogDataFile):
         for par, val in vals.items():
             setattr(self, par, val)
 
-    def open(self):
-        if self.fh is None:
-            self.fh = open(self.halos_filename, "r")
+    @property
+    def _text_filename(self):
+        return self.halos_filename
 
     _links = None
     @property
@@ -153,12 +153,17 @@ class AHFDataFile(CatalogDataFile):
 
         m = data["shared"]**2 / (data["prog_part"] * data["desc_part"])
 
-        progids = np.unique(data["prog_id"])
-        descids = np.empty(progids.size, dtype=progids.dtype)
-
-        for i, progid in enumerate(progids):
-            prf = data["prog_id"] == progid
-            descids[i] = data["desc_id"][prf][m[prf].argmax()]
+        # Sort by progenitor id, then by decreasing merit, so the
+        # first entry in each group is the chosen descendent. The sort
+        # is stable, so ties go to the first entry in the file, and
+        # NaNs are placed first, just as argmax would do.
+        order = np.lexsort((-m, ~np.isnan(m), data["prog_id"]))
+        prog_ids = data["prog_id"][order]
+        first = np.ones(prog_ids.size, dtype=bool)
+        first[1:] = prog_ids[1:] != prog_ids[:-1]
+
+        progids = prog_ids[first]
+        descids = data["desc_id"][order][first]
         udata = {"prog_id": progids, "desc_id": descids}
 
         self._links = udata
@@ -171,80 +176,56 @@ class AHFDataFile(CatalogDataFile):
         if self.mtree_filename is None:
             return None
 
-        data = defaultdict(list)
-        descid = descpart = None
-
-        f = open(self.mtree_filename, "r")
-        for line, offset in f_text_block(f):
-            if line.startswith("#"):
-                continue
-            if line[0].isdigit():
-                oline = line.split()
-                descid = int(oline[0])
-                descpart = int(oline[1])
-            else:
-                oline = line.split()
-                data["shared"].append(int(oline[0]))
-                data["prog_id"].append(int(oline[1]))
-                data["prog_part"].append(int(oline[2]))
-                data["desc_id"].append(descid)
-                data["desc_part"].append(descpart)
-        f.close()
-
-        if not data:
-            return None
-
-        for field in data:
-            data[field] = np.array(data[field])
-        return data
-
-    def _read_data_default(self, rfields, dtypes):
-        if not rfields:
-            return {}
-
-        fi = self.arbor.field_info
-        field_data = self._create_field_arrays(rfields, dtypes)
-        offsets = []
-
-        self.open()
-        f = self.fh
-        f.seek(self._hoffset)
-        file_size = self.file_size - self._hoffset
-        for line, offset in f_text_block(f, file_size=file_size):
-            offsets.append(offset)
-            sline = line.split()
-            for field in rfields:
-                dtype = dtypes[field]
-                field_data[field].append(dtype(sline[fi[field]["column"]]))
-        self.close()
-
-        if self.offsets is None:
-            self.offsets = np.array(offsets)
+        with open(self.mtree_filename, "rb") as f:
+            buff = np.frombuffer(f.read(), dtype=np.uint8)
 
-        return field_data
-
-    def _read_data_select(self, rfields, tree_nodes, dtypes):
-        if not rfields:
-            return {}
-
-        fi = self.arbor.field_info
-        nt = len(tree_nodes)
-        field_data = self._create_field_arrays(
-            rfields, dtypes, size=nt)
+        if buff.size == 0:
+            return None
 
-        self.open()
-        f = self.fh
-
-        for i in range(nt):
-            f.seek(self.offsets[tree_nodes[i]._fi])
-            line = f.readline()
-            sline = line.split()
-            for field in rfields:
-                dtype = dtypes[field]
-                field_data[field][i] = dtype(sline[fi[field]["column"]])
-        self.close()
+        # Descendent lines start with a digit and are followed by
+        # indented lines for each of their progenitors. Classify each
+        # line by its first character and parse each kind separately.
+        newlines = np.flatnonzero(buff == ord("\n"))
+        starts = np.concatenate([[0], newlines + 1])
+        ends = np.concatenate([newlines + 1, [buff.size]])
+        keep = starts < buff.size
+        starts = starts[keep]
+        ends = ends[keep]
+        first = buff[starts]
+        filled = np.logical_or.reduceat(buff > ord(" "), starts)
+        is_desc = (first >= ord("0")) & (first <= ord("9"))
+        is_prog = filled & ~is_desc & (first != ord("#"))
+        if not is_prog.any():
+            return None
 
-        return field_data
+        def _select_lines(selection):
+            # Mark the start and end of each selected line and take a
+            # running sum to get a mask of the selected bytes.
+            marks = np.zeros(buff.size + 1, dtype=np.int8)
+            marks[starts[selection]] = 1
+            marks[ends[selection]] -= 1
+            mask = np.cumsum(marks[:-1], dtype=np.int8).view(bool)
+            return buff[mask].tobytes()
+
+        idtype = np.int64
+        descid, descpart = parse_text_columns(
+            _select_lines(is_desc), [0, 1], [idtype] * 2)
+        shared, progid, progpart = parse_text_columns(
+            _select_lines(is_prog), [0, 1, 2], [idtype] * 3)
+
+        # index of the descendent preceding each progenitor
+        idesc = (np.cumsum(is_desc) - 1)[is_prog]
+        if idesc[0] < 0:
+            iline = np.flatnonzero(is_prog)[0] + 1
+            raise RuntimeError(
+                f"Progenitor on line {iline} of {self.mtree_filename} "
+                "has no descendent before it.")
+        data = {"shared": shared,
+                "prog_id": progid,
+                "prog_part": progpart,
+                "desc_id": descid[idesc],
+                "desc_part": descpart[idesc]}
+        return data
 
     def _get_mtree_fields(self, tfields, dtypes, field_data):
         """
@@ -259,20 +240,20 @@ class AHFDataFile(CatalogDataFile):
             len(field_data["ID"]),
             dtype=dtypes['desc_id'])
 
-        if self.links == -1:
+        if links == -1:
             descids[:] = -1
         else:
-            for i, hid in enumerate(field_data["ID"]):
-                inlink = hid == links["prog_id"]
-                if not inlink.any():
-                    descids[i] = -1
-                else:
-                    descids[i] = \
-                      links["desc_id"][np.where(inlink)[0][0]]
+            my_ids = np.asarray(field_data["ID"])
+            # progenitor ids are sorted, so join with a binary search
+            prog_ids = links["prog_id"]
+            ipos = np.searchsorted(prog_ids, my_ids)
+            ipos[ipos == prog_ids.size] = 0
+            found = prog_ids[ipos] == my_ids
+            descids[:] = np.where(found, links["desc_id"][ipos], -1)
 
         field_data["desc_id"] = descids
 
-    def _read_fields(self, fields, tree_nodes=None, dtypes=None):
+    def _read_fields(self, fields, rows=None, dtypes=None):
         if dtypes is None:
             dtypes = {}
 
@@ -300,23 +281,19 @@ class AHFDataFile(CatalogDataFile):
                 dtypes.update(self.arbor._node_io._determine_dtypes(["ID"]))
 
         field_data = {}
-        if tree_nodes is None:
+        if rows is None:
             field_data.update(
                 self._read_data_default(rfields, dtypes))
 
         else:
             # fields from the actual data
             field_data.update(
-                self._read_data_select(rfields, tree_nodes, dtypes))
-
-            # fields from arbor-related info
-            field_data.update(
-                self._get_arbor_fields(afields, tree_nodes, dtypes))
+                self._read_data_select(rfields, rows, dtypes))
 
             # fields from the file header
             field_data.update(
                 self._get_header_fields(
-                    hfields, tree_nodes, dtypes))
+                    hfields, rows, dtypes))
 
         # use data from the mtree file to get descendent ids
         self._get_mtree_fields(tfields, dtypes, field_data)
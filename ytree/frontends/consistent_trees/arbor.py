@@ -13,6 +13,8 @@ ConsistentTreesArbor class and member functions
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+from concurrent.futures import \
+    ThreadPoolExecutor
 import glob
 import numpy as np
 import operator
@@ -21,6 +23,8 @@ import os
 from yt.funcs import \
     get_pbar
 
+from ytree.config import \
+    ytreecfg
 from ytree.data_structures.arbor import \
     SegmentedArbor
 
@@ -31,6 +35,7 @@ from ytree.frontends.consistent_trees.io import \
     ConsistentTreesTreeFieldIO, \
     ConsistentTreesHlistDataFile
 from ytree.frontends.consistent_trees.utilities import \
+    find_tree_markers, \
     parse_ctrees_header
 from ytree.frontends.rockstar.arbor import \
     RockstarArbor
@@ -49,6 +54,8 @@ class ConsistentTreesArbor(SegmentedArbor):
     _tree_field_io_class = ConsistentTreesTreeFieldIO
     _default_dtype = np.float32
     _node_io_attrs = ('_fi', '_si', '_ei')
+    # size of the byte ranges scanned in parallel for trees
+    _plant_chunk_size = 64 * 1024**2
 
     def _get_data_files(self):
         self.data_files = [ConsistentTreesDataFile(self.filename)]
@@ -68,46 +75,55 @@ class ConsistentTreesArbor(SegmentedArbor):
         if self.is_planted or self._size == 0:
             return
 
-        lkey = len("tree ")+1
-        block_size = 4096
+        if self._load_node_info_cache([self.filename]) is not None:
+            return
 
         data_file = self.data_files[0]
-
         data_file.open()
-        data_file.fh.seek(0, 2)
-        file_size = data_file.fh.tell()
+        file_size = len(data_file.mm)
         pbar = get_pbar("Loading tree roots", file_size)
-        data_file.fh.seek(self._hoffset)
-
-        offset = self._hoffset
-        itree = 0
-        nblocks = np.ceil(float(file_size-self._hoffset) /
-                          block_size).astype(np.int64)
-        for ib in range(nblocks):
-            my_block = min(block_size, file_size - offset)
-            if my_block <= 0: break
-            buff = data_file.fh.read(my_block)
-            lihash = -1
-            for ih in range(buff.count("#")):
-                ihash = buff.find("#", lihash+1)
-                inl = buff.find("\n", ihash+1)
-                if inl < 0:
-                    buff += data_file.fh.readline()
-                    inl = len(buff)
-                uid = int(buff[ihash+lkey:inl])
-                self._node_info['uid'][itree] = uid
-                lihash = ihash
-                self._node_info['_si'][itree] = offset + inl + 1
-                self._node_info['_fi'][itree] = 0
-                if itree > 0:
-                    self._node_info['_ei'][itree-1] = offset + ihash - 1
-                itree += 1
-            offset = data_file.fh.tell()
-            pbar.update(offset)
-        self._node_info['_ei'][-1] = offset
+
+        # Scan ranges of the file for tree markers concurrently.
+        starts = np.arange(self._hoffset, file_size, self._plant_chunk_size)
+        ends = np.append(starts[1:], file_size)
+
+        def _find_markers(bounds):
+            return find_tree_markers(data_file.mm, *bounds)
+
+        ranges = list(zip(starts, ends))
+        if len(ranges) > 1:
+            nthreads = ytreecfg["ytree"].getint("nthreads", fallback=None)
+            pool = ThreadPoolExecutor(max_workers=nthreads)
+            results = pool.map(_find_markers, ranges)
+        else:
+            pool = None
+            results = map(_find_markers, ranges)
+
+        uids = []
+        line_starts = []
+        data_starts = []
+        for (_, end), (my_uids, line_start, data_start) in \
+          zip(ranges, results):
+            uids.append(my_uids)
+            line_starts.append(line_start)
+            data_starts.append(data_start)
+            pbar.update(end)
+        if pool is not None:
+            pool.shutdown()
         data_file.close()
+
+        uids = np.concatenate(uids)
+        line_starts = np.concatenate(line_starts)
+        self._size = uids.size
+        self._node_info['uid'][:] = uids
+        self._node_info['_fi'][:] = 0
+        self._node_info['_si'][:] = np.concatenate(data_starts)
+        self._node_info['_ei'][:-1] = line_starts[1:] - 1
+        self._node_info['_ei'][-1] = file_size
         pbar.finish()
 
+        self._save_node_info_cache([self.filename])
+
     @classmethod
     def _is_valid(self, *args, **kwargs):
         """
@@ -147,10 +163,26 @@ class ConsistentTreesGroupArbor(ConsistentTreesArbor):
         fn = os.path.join(self.directory, line.split()[3])
         super()._parse_parameter_file(filename=fn, ntrees_in_file=False)
 
+    def _get_cache_key_files(self):
+        """
+        Return locations.dat and all tree files next to it.
+
+        Tree files are found by name so the key can be made before
+        locations.dat has been read.
+        """
+
+        tree_files = glob.glob(os.path.join(self.directory, "tree_*.dat"))
+        return [self.filename] + sorted(tree_files)
+
     def _plant_trees(self):
         if self.is_planted:
             return
 
+        attrs = self._load_node_info_cache(self._get_cache_key_files())
+        if attrs is not None:
+            self._set_data_files(attrs["data_files"])
+            return
+
         f = open(self.filename, 'r')
         f.seek(self._hoffset)
         ldata = list(map(
@@ -175,10 +207,7 @@ class ConsistentTreesGroupArbor(ConsistentTreesArbor):
         data_files = [None]*(ufids.max()+1)
         for i,fid in enumerate(ufids):
             data_files[fid] = dfns[i]
-        self.data_files = \
-          [None if fn is None
-           else ConsistentTreesDataFile(os.path.join(self.directory, fn))
-           for fn in data_files]
+        self._set_data_files(data_files)
 
         ldata.sort(key=operator.itemgetter(1, 2))
         pbar = get_pbar("Loading tree roots", self._size)
@@ -206,6 +235,23 @@ class ConsistentTreesGroupArbor(ConsistentTreesArbor):
             self._node_info['_ei'][i] = data_file.fh.tell()
             data_file.close()
 
+        self._save_node_info_cache(
+            self._get_cache_key_files(),
+            attrs={"data_files": ["" if fn is None else fn
+                                  for fn in data_files]})
+
+    def _set_data_files(self, data_files):
+        """
+        Create data file objects from a list of filenames.
+
+        Empty data files are not listed in locations.dat and
+        so are given as None or an empty string.
+        """
+
+        self.data_files = \
+          [ConsistentTreesDataFile(os.path.join(self.directory, fn))
+           if fn else None for fn in data_files]
+
     @classmethod
     def _is_valid(self, *args, **kwargs):
         """
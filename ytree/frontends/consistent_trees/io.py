@@ -13,7 +13,7 @@ ConsistentTreesArbor io classes and member functions
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-import numpy as np
+import mmap
 import os
 
 from ytree.data_structures.io import \
@@ -21,10 +21,28 @@ from ytree.data_structures.io import \
     TreeFieldIO
 from ytree.frontends.rockstar.io import \
     RockstarDataFile
+from ytree.utilities.io import \
+    parse_text_columns
 
 class ConsistentTreesDataFile(DataFile):
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.mm = None
+
     def open(self):
         self.fh = open(self.filename, "r")
+        # empty files cannot be memory-mapped
+        if os.fstat(self.fh.fileno()).st_size > 0:
+            self.mm = mmap.mmap(
+                self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.mm = b""
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.mm = None
+        super().close()
 
 class ConsistentTreesTreeFieldIO(TreeFieldIO):
     def _read_fields(self, root_node, fields, dtypes=None,
@@ -44,36 +62,39 @@ class ConsistentTreesTreeFieldIO(TreeFieldIO):
         if data_file.fh is None:
             close = True
             data_file.open()
-        fh = data_file.fh
-        fh.seek(root_node._si)
+
+        start = root_node._si
         if root_only:
-            data = [fh.readline()]
+            end = data_file.mm.find(b"\n", start)
+            if end < 0:
+                end = root_node._ei
         else:
-            data = fh.read(
-                root_node._ei -
-                root_node._si).split("\n")
-            if len(data[-1]) == 0:
-                data.pop()
+            end = root_node._ei
+        field_data = self._read_block(
+            data_file, start, end, fields, my_dtypes)
+
         if close:
             data_file.close()
 
-        nhalos = len(data)
-        field_data = {}
-        fi = self.arbor.field_info
-        for field in fields:
-            field_data[field] = np.empty(nhalos, dtype=my_dtypes[field])
-
-        for i, datum in enumerate(data):
-            ldata = datum.strip().split()
-            if len(ldata) == 0: continue
-            for field in fields:
-                dtype = my_dtypes[field]
-                field_data[field][i] = dtype(ldata[fi[field]["column"]])
-
         self._apply_units(fields, field_data)
 
         return field_data
 
+    def _read_block(self, data_file, start, end, fields, dtypes):
+        """
+        Read fields for all halos within a range of bytes.
+
+        The range can span any number of contiguous trees since
+        the lines separating trees are skipped as comments.
+        """
+
+        fi = self.arbor.field_info
+        columns = [fi[field]["column"] for field in fields]
+        data = parse_text_columns(
+            data_file.mm[start:end], columns,
+            [dtypes[field] for field in fields])
+        return dict(zip(fields, data))
+
 class ConsistentTreesHlistDataFile(RockstarDataFile):
     def _parse_header(self):
         super()._parse_header()
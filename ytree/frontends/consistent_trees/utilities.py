@@ -13,6 +13,7 @@ ConsistentTreesArbor utility functions
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import numpy as np
 import re
 
 from unyt.exceptions import \
@@ -142,3 +143,67 @@ def parse_ctrees_header(arbor, input_stream,
 
     arbor.box_size = arbor.quan(float(box[0]), box[1])
     return fi
+
+def find_tree_markers(buff, start, end, marker=b"#tree "):
+    """
+    Find all tree marker lines beginning within a range of bytes.
+
+    Marker lines look like "#tree <uid>" and precede the data for
+    each tree. The search is done with array operations over the
+    buffer, so it can be run on different ranges concurrently.
+
+    Parameters
+    ----------
+    buff : buffer
+        The full contents of the file, e.g., a memory map.
+    start, end : int
+        The range of bytes within which marker lines start.
+
+    Returns
+    -------
+    uids : array of ints
+        The uid of the root of each tree.
+    line_start : array of ints
+        The offset of the start of each marker line.
+    data_start : array of ints
+        The offset of the first line after each marker line.
+    """
+
+    size = len(buff)
+    # Include the byte before to check for line starts and enough after
+    # to find the end of the last marker line.
+    my_start = max(start - 1, 0)
+    my_end = min(end + 256, size)
+    data = np.frombuffer(buff, dtype=np.uint8,
+                         count=my_end-my_start, offset=my_start)
+
+    hashes = np.flatnonzero(data[:end-my_start] == ord(marker[:1]))
+    hashes = hashes[hashes >= start - my_start]
+    if start > 0:
+        hashes = hashes[data[hashes-1] == ord("\n")]
+    else:
+        hashes = hashes[(hashes == 0) | (data[hashes-1] == ord("\n"))]
+
+    newlines = np.flatnonzero(data == ord("\n"))
+    inl = np.searchsorted(newlines, hashes)
+    line_end = np.empty(hashes.size, dtype=np.int64)
+    found = inl < newlines.size
+    line_end[found] = newlines[inl[found]]
+    # marker lines running past the end of the scanned bytes
+    for i in np.where(~found)[0]:
+        iend = buff.find(b"\n", int(hashes[i] + my_start))
+        line_end[i] = (size if iend < 0 else iend) - my_start
+
+    # Convert the digits following each marker to integers.
+    ulen = line_end - hashes - len(marker)
+    ndigits = max(ulen.max(), 0) if ulen.size else 0
+    uids = np.zeros(hashes.size, dtype=np.int64)
+    for i in range(ndigits):
+        ipos = np.minimum(hashes + len(marker) + i, data.size - 1)
+        digit = data[ipos].astype(np.int64) - ord("0")
+        use = (i < ulen) & (digit >= 0) & (digit <= 9)
+        uids[use] = 10 * uids[use] + digit[use]
+
+    line_start = hashes + my_start
+    data_start = line_end + my_start + 1
+    return uids, line_start, data_start
@@ -72,6 +72,10 @@ class ConsistentTreesHDF5Arbor(SegmentedArbor):
         self._node_io_attrs += (_access_names[access]['host_attr'],)
         super().__init__(filename)
 
+    @property
+    def _cache_tag(self):
+        return f"{super()._cache_tag}:{self.access}"
+
     def _node_io_loop_finish(self, data_file):
         data_file._field_cache.reset()
         data_file.close()
@@ -21,33 +21,11 @@ from yt.funcs import \
     get_pbar
 
 from ytree.data_structures.io import \
+    ChunkStore, \
     DataFile, \
     DefaultRootFieldIO, \
     TreeFieldIO
 
-class ChunkStore:
-    def __init__(self, chunk_size=262144):
-        self.chunk_size = chunk_size
-        self.reset()
-
-    def reset(self):
-        self.data = {}
-        self.ind = {}
-
-    def get(self, fh, field, index):
-        start, end = index
-        si, ei = self.ind.get(field, (0, 0))
-
-        if field not in self.data or ei < end or si > start:
-            si = start
-            ei = start + self.chunk_size
-            self.ind[field] = (si, ei)
-            self.data[field] = fh[field][si:ei]
-
-        data_s = start - si
-        data_e = end - si
-        return self.data[field][data_s:data_e]
-
 class ConsistentTreesHDF5DataFile(DataFile):
     def __init__(self, filename, linkname):
         super().__init__(filename)
@@ -105,10 +83,17 @@ class ConsistentTreesHDF5RootFieldIO(DefaultRootFieldIO):
     """
     Read in fields for first node in all trees/forest.
 
-    This function is optimized for the struct of arrays layout.
-    It will work for array of structs layout, but field access
-    will be 1 to 2 orders of magnitude slower.
+    Only the rows holding the first nodes are read, in blocks of at
+    most _block_size rows, so memory use does not grow with the size
+    of the field datasets. For the array of structs layout, all
+    fields are read from a block at once and only the requested
+    fields are kept, but this is still much slower than the struct
+    of arrays layout.
     """
+
+    # maximum number of rows to read at once
+    _block_size = 1048576
+
     def _read_fields(self, storage_object, fields, dtypes=None):
         if dtypes is None:
             dtypes = {}
@@ -133,11 +118,13 @@ class ConsistentTreesHDF5RootFieldIO(DefaultRootFieldIO):
 
             fh = data_file.fh['Forests']
             if self.arbor._aos:
-                fh = fh['halos']
+                fdata = self._read_rows(fh['halos'], my_indices, fields)
+            else:
+                fdata = dict((field, self._read_rows(fh[field], my_indices))
+                             for field in fields)
 
             for field in fields:
-                darray = fh[field][()]
-                rdata[field].append(darray[my_indices])
+                rdata[field].append(fdata[field])
 
             arbor._node_io_loop_finish(data_file)
 
@@ -156,3 +143,42 @@ class ConsistentTreesHDF5RootFieldIO(DefaultRootFieldIO):
         self._apply_units(fields, field_data)
 
         return field_data
+
+    def _read_rows(self, dataset, indices, fields=None):
+        """
+        Read the given rows of a dataset in contiguous blocks.
+
+        If fields is None, return an array of the rows. Otherwise,
+        the dataset is compound and a dictionary of arrays is
+        returned for the given fields.
+        """
+
+        order = np.argsort(indices, kind="stable")
+        sindices = indices[order]
+
+        if fields is None:
+            rdata = np.empty(indices.size, dtype=dataset.dtype)
+        else:
+            rdata = dict((field, np.empty(indices.size,
+                                          dtype=dataset.dtype[field]))
+                         for field in fields)
+
+        i = 0
+        while i < sindices.size:
+            # each block spans at most _block_size rows
+            start = sindices[i]
+            j = np.searchsorted(
+                sindices, start + self._block_size, side="left")
+            end = sindices[j-1] + 1
+            bindices = sindices[i:j] - start
+            border = order[i:j]
+
+            if fields is None:
+                rdata[border] = dataset[start:end][bindices]
+            else:
+                block = dataset.fields(fields)[start:end]
+                for field in fields:
+                    rdata[field][border] = block[field][bindices]
+            i = j
+
+        return rdata
@@ -22,6 +22,8 @@ from yt.funcs import \
 
 from ytree.data_structures.arbor import \
     SegmentedArbor
+from ytree.data_structures.node_link import \
+    get_pointer_indices
 
 from ytree.frontends.gadget4.fields import \
     Gadget4FieldInfo
@@ -127,6 +129,15 @@ class Gadget4Arbor(SegmentedArbor):
         self._node_info["uid"] = offset
         pbar.finish()
 
+    def _get_descendent_indices(self, tree_node):
+        """
+        Get descendent indices from the TreeDescendant pointers.
+
+        Uids are the root uid plus the position within the tree,
+        so this is just an offset of the descendent uids.
+        """
+        return get_pointer_indices(tree_node.desc_uids, tree_node.uid)
+
     @classmethod
     def _is_valid(self, *args, **kwargs):
         """
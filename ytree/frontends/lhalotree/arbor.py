@@ -23,6 +23,8 @@ from unyt.exceptions import \
 
 from ytree.data_structures.arbor import \
     Arbor
+from ytree.data_structures.node_link import \
+    get_pointer_indices
 
 from ytree.frontends.lhalotree.fields import \
     LHaloTreeFieldInfo
@@ -200,6 +202,15 @@ class LHaloTreeArbor(Arbor):
 
         pbar.finish()
 
+    def _get_descendent_indices(self, tree_node):
+        """
+        Get descendent indices from the Descendant pointers.
+
+        Uids are the root uid plus the position within the tree,
+        so this is just an offset of the descendent uids.
+        """
+        return get_pointer_indices(tree_node.desc_uids, tree_node.uid)
+
     @classmethod
     def _is_valid(self, *args, **kwargs):
         """
@@ -23,6 +23,8 @@ from yt.funcs import \
 
 from ytree.data_structures.arbor import \
     SegmentedArbor
+from ytree.data_structures.node_link import \
+    get_pointer_indices
 
 from ytree.frontends.lhalotree_hdf5.fields import \
     LHaloTreeHDF5FieldInfo
@@ -115,6 +117,15 @@ class LHaloTreeHDF5Arbor(SegmentedArbor):
         uids = self._node_info['_tree_size']
         self._node_info['uid'] = uids.cumsum() - uids
 
+    def _get_descendent_indices(self, tree_node):
+        """
+        Get descendent indices from the Descendant pointers.
+
+        Uids are the root uid plus the position within the tree,
+        so this is just an offset of the descendent uids.
+        """
+        return get_pointer_indices(tree_node.desc_uids, tree_node.uid)
+
     @classmethod
     def _is_valid(self, *args, **kwargs):
         """
@@ -16,9 +16,6 @@ MoriaArbor class and member functions
 import h5py
 import numpy as np
 
-from yt.funcs import \
-    get_pbar
-
 from ytree.data_structures.arbor import \
     Arbor
 
@@ -78,12 +75,15 @@ class MoriaArbor(Arbor):
     def _get_data_files(self):
         self.data_files = [self._data_file_class(self.parameter_filename)]
 
+    # number of snapshots of status_sparta to read at once
+    _status_block_size = 16
+
     def _plant_trees(self):
         if self.is_planted:
             return
 
         f = h5py.File(self.parameter_filename, mode='r')
-        status = f["status_sparta"][()]
+        status = f["status_sparta"]
         root_status = status[-1]
         hosts = root_status == 10
         self._size = hosts.sum()
@@ -92,16 +92,70 @@ class MoriaArbor(Arbor):
         self._node_info['_ei'][:-1] = self._node_info['_si'][1:]
         self._node_info['_ei'][-1] = root_status.size
         self._node_info['uid'][:] = f["id"][-1][hosts]
+
+        # Count halos in each column, then sum the columns of each tree.
+        counts = np.zeros(root_status.size, dtype=np.int64)
+        block = self._status_block_size
+        for start in range(0, status.shape[0], block):
+            counts += (status[start:start+block] != 0).sum(axis=0)
         f.close()
 
-        pbar = get_pbar('Planting trees', self._size)
+        if self._size > 0:
+            self._node_info['_tree_size'][:] = \
+              np.add.reduceat(counts, self._node_info['_si'])
+
+    _status_index = None
+    _status_offsets = None
+
+    def _get_status_index(self):
+        """
+        Get the positions of all halos within their trees.
+
+        Field arrays for a tree are created by flipping the 2D
+        (snapshot, halo) array for its columns and flattening it.
+        For each tree, this returns the indices into that flattened
+        array where halos exist. Indices for all trees are created
+        at once from the status_sparta dataset and kept.
+        """
+
+        if self._status_index is not None:
+            return self._status_index, self._status_offsets
+
+        self._plant_trees()
         si = self._node_info['_si']
         ei = self._node_info['_ei']
-        for i in range(self._size):
-            tree_status = status[:, si[i]:ei[i]]
-            self._node_info['_tree_size'][i] = (tree_status != 0).sum()
-            pbar.update(i+1)
-        pbar.finish()
+
+        rows = []
+        cols = []
+        with h5py.File(self.parameter_filename, mode='r') as f:
+            status = f["status_sparta"]
+            nsnaps = status.shape[0]
+            block = self._status_block_size
+            for start in range(0, nsnaps, block):
+                my_rows, my_cols = np.nonzero(status[start:start+block])
+                rows.append(my_rows + start)
+                cols.append(my_cols)
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+
+        # ignore halos in columns before the first tree
+        if si.size > 0:
+            keep = cols >= si[0]
+        else:
+            keep = np.zeros(cols.size, dtype=bool)
+        rows = nsnaps - 1 - rows[keep]
+        cols = cols[keep]
+
+        tree = np.searchsorted(si, cols, side="right") - 1
+        order = np.lexsort((cols, rows, tree))
+        tree = tree[order]
+        self._status_index = \
+          rows[order] * (ei - si)[tree] + cols[order] - si[tree]
+        self._status_offsets = np.zeros(self._size + 1, dtype=np.int64)
+        self._status_offsets[1:] = \
+          np.bincount(tree, minlength=self._size).cumsum()
+
+        return self._status_index, self._status_offsets
 
     def _setup_tree(self, tree_node, **kwargs):
         """
@@ -84,9 +84,11 @@ class MoriaTreeFieldIO(TreeFieldIO):
         else:
             index = (slice(None), slice(root_node._si, root_node._ei))
             if not hasattr(root_node, "_status"):
-                status = data_file.read_data("status_sparta", index)
-                status = self._transform_data(status)
-                root_node._status = np.where(status != 0)[0]
+                status_index, status_offsets = \
+                  self.arbor._get_status_index()
+                ai = root_node._ai
+                root_node._status = \
+                  status_index[status_offsets[ai]:status_offsets[ai+1]]
             dfilter = root_node._status
 
         # this field cache is for temporarily storing vector field data
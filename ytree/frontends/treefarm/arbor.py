@@ -27,6 +27,7 @@ from ytree.data_structures.arbor import \
 from ytree.frontends.treefarm.fields import \
     TreeFarmFieldInfo
 from ytree.frontends.treefarm.io import \
+    TreeFarmColumnCache, \
     TreeFarmDataFile
 from ytree.utilities.io import \
     _hdf5_yt_attr, \
@@ -41,6 +42,25 @@ class TreeFarmArbor(CatalogArbor):
     _field_info_class = TreeFarmFieldInfo
     _data_file_class = TreeFarmDataFile
 
+    # Limits for caching catalog columns and open files
+    # while looping over trees.
+    _column_cache_limit = 1024**3
+    _max_open_files = 16
+    _column_cache = None
+    _column_cache_depth = 0
+
+    def _node_io_loop_start(self, data_file):
+        if self._column_cache is None:
+            self._column_cache = TreeFarmColumnCache(
+                self._column_cache_limit, self._max_open_files)
+        self._column_cache_depth += 1
+
+    def _node_io_loop_finish(self, data_file):
+        self._column_cache_depth -= 1
+        if self._column_cache_depth == 0:
+            self._column_cache.clear()
+            self._column_cache = None
+
     def _parse_parameter_file(self):
         fh = h5py.File(self.filename, "r")
 
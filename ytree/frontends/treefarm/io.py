@@ -13,12 +13,73 @@ TreeFarmArbor io classes and member functions
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+from collections import OrderedDict
 import h5py
-import numpy as np
 
 from ytree.data_structures.io import \
     CatalogDataFile
 
+class TreeFarmColumnCache:
+    """
+    Keep recently used columns of halo catalogs in memory.
+
+    This is used while looping over many trees, where each tree
+    needs a few halos from many catalogs. Columns are kept in order
+    of last use and the least recently used are removed when their
+    total size goes over the limit. A small number of files are
+    also kept open.
+
+    Parameters
+    ----------
+    limit : int
+        Maximum number of bytes held by cached columns.
+    max_files : int
+        Maximum number of files kept open.
+    """
+
+    def __init__(self, limit, max_files):
+        self.limit = limit
+        self.max_files = max_files
+        self.nbytes = 0
+        self._columns = OrderedDict()
+        self._handles = OrderedDict()
+
+    def _get_handle(self, data_file):
+        fh = self._handles.pop(data_file.filename, None)
+        if fh is None:
+            fh = h5py.File(data_file.filename, "r")
+            while len(self._handles) >= self.max_files:
+                self._handles.popitem(last=False)[1].close()
+        self._handles[data_file.filename] = fh
+        return fh
+
+    def get(self, data_file, field):
+        """
+        Return a full column of a catalog.
+        """
+
+        key = (data_file.filename, field)
+        column = self._columns.pop(key, None)
+        if column is None:
+            column = self._get_handle(data_file)[field][()]
+            self.nbytes += column.nbytes
+            # the newest column is always kept
+            while self._columns and self.nbytes > self.limit:
+                self.nbytes -= self._columns.popitem(last=False)[1].nbytes
+        self._columns[key] = column
+        return column
+
+    def clear(self):
+        """
+        Remove all columns and close all files.
+        """
+
+        self._columns.clear()
+        self.nbytes = 0
+        for fh in self._handles.values():
+            fh.close()
+        self._handles.clear()
+
 class TreeFarmDataFile(CatalogDataFile):
     def open(self):
         self.fh = h5py.File(self.filename, "r")
@@ -68,17 +129,21 @@ class TreeFarmDataFile(CatalogDataFile):
             field_data[field] = field_data[field].astype(dtype)
         return field_data
 
-    def _read_data_select(self, rfields, tree_nodes, dtypes):
+    def _read_data_select(self, rfields, rows, dtypes):
         field_data = {}
         if not rfields:
             return field_data
 
-        file_ids = np.array([node._fi for node in tree_nodes])
-        self.open()
-        fh = self.fh
-        for field in rfields:
-            field_data[field] = fh[field][()][file_ids]
-        self.close()
+        cache = self.arbor._column_cache
+        if cache is not None:
+            for field in rfields:
+                field_data[field] = cache.get(self, field)[rows]
+        else:
+            self.open()
+            fh = self.fh
+            for field in rfields:
+                field_data[field] = fh[field][()][rows]
+            self.close()
 
         for field in rfields:
             dtype = dtypes[field]
@@ -21,6 +21,7 @@ from yt.funcs import \
     get_pbar
 
 from ytree.data_structures.io import \
+    ChunkStore, \
     DataFile, \
     DefaultRootFieldIO, \
     TreeFieldIO
@@ -28,6 +29,13 @@ from ytree.utilities.exceptions import \
     ArborFieldNotFound
 
 class TreeFrogDataFile(DataFile):
+    # Each snapshot and field gets its own chunk, so keep them small.
+    _chunk_size = 16384
+
+    def __init__(self, filename):
+        super().__init__(filename)
+        self._field_cache = ChunkStore(chunk_size=self._chunk_size)
+
     def _calculate_arbor_offsets(self):
         """
         Calculate snapshots and snapshot-offsets where each forest appears last.
@@ -62,19 +70,36 @@ class TreeFrogDataFile(DataFile):
         self._arbor_start = s1
         self._arbor_offset = o1
 
-    def read_data(self, group, field, frange=None):
+    def read_data(self, group, field, frange=None, chunked=False):
+        """
+        Read a range of a field from a snapshot group.
+
+        Only the requested range is read from disk. If chunked is
+        True, contiguous ranges are read through a cache of chunks
+        that is kept until the file is closed, so forests that
+        are next to each other share a single read.
+        """
+
         if frange is None:
-            frange = ()
+            frange = slice(None)
         # This is the easiest way I can think of to fix the
         # descendent ids of roots.
         if field == "Descendant":
             # Descendant and ID fields are uint64. We need to convert them
             # to signed ints in order to set equal to -1.
-            data = self.fh[group][field][()][frange].astype("int64")
-            ids = self.fh[group]["ID"][()][frange].astype("int64")
+            data = self._read_range(
+                group, field, frange, chunked).astype("int64")
+            ids = self._read_range(
+                group, "ID", frange, chunked).astype("int64")
             data[data == ids] = -1
             return data
-        return self.fh[group][field][()][frange]
+        return self._read_range(group, field, frange, chunked)
+
+    def _read_range(self, group, field, frange, chunked):
+        if chunked:
+            return self._field_cache.get(
+                self.fh, f"{group}/{field}", (frange.start, frange.stop))
+        return self.fh[group][field][frange]
 
     _arbor_start = None
     @property
@@ -94,6 +119,10 @@ class TreeFrogDataFile(DataFile):
         if self.fh is None:
             self.fh = h5py.File(self.filename, mode="r")
 
+    def close(self):
+        self._field_cache.reset()
+        super().close()
+
 class TreeFrogTreeFieldIO(TreeFieldIO):
     def _read_fields(self, root_node, fields, dtypes=None,
                      root_only=False):
@@ -141,10 +170,13 @@ class TreeFrogTreeFieldIO(TreeFieldIO):
             offset = offsets[gi]
             size = sizes[gi]
             for field in rfields:
+                # Use the chunk cache if the file is being kept
+                # open for reading many trees.
                 rdata[field].append(
                     data_file.read_data(
                         group, field,
-                        frange=slice(offset,offset+size)))
+                        frange=slice(offset,offset+size),
+                        chunked=not close))
 
             for field in afields:
                 rdata[field].append(self._get_arbor_field(field, gi, size))
@@ -205,10 +237,12 @@ class TreeFrogRootFieldIO(DefaultRootFieldIO):
             arbor._node_io_loop_start(data_file)
 
             size = nodes.size
+            # the index of each forest within this file
+            fnodes = arbor._node_info['_si'][nodes]
             # the index of the last snapshot for each forest
-            s1 = data_file.arbor_start[nodes]
+            s1 = data_file.arbor_start[fnodes]
             # the offset within that snapshot
-            o1 = data_file.arbor_offset[nodes]
+            o1 = data_file.arbor_offset[fnodes]
 
             fdata = {}
             # np.unique(s1) gives us the total number of HDF5 groups we need to open
@@ -216,13 +250,17 @@ class TreeFrogRootFieldIO(DefaultRootFieldIO):
                 group = f"Snap_{gi:03d}"
                 # which forests' roots are in this group
                 isnap = np.where(s1 == gi)[0]
+                # o1[isnap] is the list of file offsets for this HDF5 group,
+                # so only read the range that covers them.
+                gindex = o1[isnap]
+                gstart = gindex.min()
+                frange = slice(gstart, gindex.max() + 1)
 
                 for field in rfields:
-                    gdata = data_file.read_data(group, field)
+                    gdata = data_file.read_data(group, field, frange=frange)
                     if field not in fdata:
                         fdata[field] = np.empty(size, dtype=gdata.dtype)
-                    # o1[isnap] is the list of file offsets for this HDF5 group
-                    fdata[field][isnap] = gdata[o1[isnap]]
+                    fdata[field][isnap] = gdata[gindex - gstart]
 
             for field in rfields:
                 rdata[field].append(fdata[field])
@@ -21,6 +21,84 @@ from ytree.data_structures.io import \
     DataFile, \
     TreeFieldIO
 
+class DatasetChunks:
+    """
+    Chunks of a field read from a chunked HDF5 dataset.
+
+    Ranges of the field are served from the chunks covering them,
+    with consecutive missing chunks read together. Chunks are kept,
+    so reading one tree after another reads each chunk only once.
+    If given, units are attached with the arr function as chunks
+    are read.
+
+    Once the number of separate reads reaches an eighth of the
+    number of chunks, the rest of the field is read at once, so
+    reading many trees costs little more than reading the whole
+    field as for contiguous datasets.
+    """
+
+    # fewest separate reads before reading all the rest
+    _min_reads = 8
+
+    def __init__(self, dataset, dtype=None, units="", arr=None):
+        self.name = dataset.name
+        self.chunk_size = dataset.chunks[0]
+        self.size = dataset.shape[0]
+        self.dtype = dtype
+        self.units = units
+        self.arr = arr
+        self.chunks = {}
+        self.nreads = 0
+        nchunks = -(-self.size // self.chunk_size)
+        self.max_reads = max(self._min_reads, nchunks // 8)
+
+    def _read_chunks(self, fh, first, last):
+        """
+        Read and store chunks first through last.
+        """
+
+        cs = self.chunk_size
+        data = fh[self.name][first*cs:min((last+1)*cs, self.size)]
+        self.nreads += 1
+        if self.dtype is not None:
+            data = data.astype(self.dtype)
+        if self.units != "":
+            data = self.arr(data, self.units)
+        for i in range(first, last+1):
+            self.chunks[i] = data[(i-first)*cs:(i-first+1)*cs]
+
+    def get(self, fh, start, end):
+        cs = self.chunk_size
+        first = start // cs
+        last = (end - 1) // cs
+
+        # most trees are within a chunk we already have
+        if first == last and first in self.chunks:
+            return self.chunks[first][start-first*cs:end-first*cs]
+
+        if self.nreads < self.max_reads:
+            lo, hi = first, last
+        else:
+            lo, hi = 0, (self.size - 1) // cs
+
+        # read runs of consecutive missing chunks
+        i = lo
+        while i <= hi:
+            if i in self.chunks:
+                i += 1
+                continue
+            j = i
+            while j < hi and j + 1 not in self.chunks:
+                j += 1
+            self._read_chunks(fh, i, j)
+            i = j + 1
+
+        if first == last:
+            return self.chunks[first][start-first*cs:end-first*cs]
+        return np.concatenate(
+            [self.chunks[i] for i in range(first, last+1)])[
+                start-first*cs:end-first*cs]
+
 class YTreeDataFile(DataFile):
     def __init__(self, filename):
         super().__init__(filename)
@@ -64,28 +142,42 @@ class YTreeTreeFieldIO(TreeFieldIO):
                         data_file.fh[f"index/tree_{itype}_index"][()])
         ii = root_node._ai - self._si[dfi]
 
+        start = int(data_file._start_index[ii])
+        end = int(data_file._end_index[ii])
+
         field_data = {}
         fi = self.arbor.field_info
         for field in fields:
-            if field not in data_file._field_cache:
-                if fi[field].get("type") == "analysis_saved":
-                    fh = data_file.analysis_fh
-                else:
-                    fh = data_file.fh
-                fdata = fh[f"data/{field}"][()]
+            if fi[field].get("type") == "analysis_saved":
+                fh = data_file.analysis_fh
+            else:
+                fh = data_file.fh
+            units = fi[field].get("units", "")
 
+            if field not in data_file._field_cache:
+                dataset = fh[f"data/{field}"]
                 dtype = dtypes.get(field)
-                if dtype is not None:
-                    fdata = fdata.astype(dtype)
 
-                units = fi[field].get("units", "")
-                if units != "":
-                    fdata = self.arbor.arr(fdata, units)
+                # Only read the chunks we need from chunked datasets.
+                if dataset.chunks is not None:
+                    fdata = DatasetChunks(
+                        dataset, dtype=dtype,
+                        units=units, arr=self.arbor.arr)
+
+                else:
+                    fdata = dataset[()]
+                    if dtype is not None:
+                        fdata = fdata.astype(dtype)
+
+                    if units != "":
+                        fdata = self.arbor.arr(fdata, units)
                 data_file._field_cache[field] = fdata
 
-            field_data[field] = \
-              data_file._field_cache[field][
-                  data_file._start_index[ii]:data_file._end_index[ii]]
+            fdata = data_file._field_cache[field]
+            if isinstance(fdata, DatasetChunks):
+                field_data[field] = fdata.get(fh, start, end)
+            else:
+                field_data[field] = fdata[start:end]
 
         if close:
             data_file.close()
@@ -93,6 +185,9 @@ class YTreeTreeFieldIO(TreeFieldIO):
         return field_data
 
 class YTreeRootFieldIO(DefaultRootFieldIO):
+    # root fields are already stored by field
+    _use_field_cache = False
+
     def _read_fields(self, storage_object, fields, dtypes=None):
         if dtypes is None:
             dtypes = {}
@@ -14,16 +14,23 @@ io utilities
 #-----------------------------------------------------------------------------
 
 import errno
+import h5py
+import hashlib
+import io
 import numpy as np
 import os
+import shutil
 from unyt import \
     unyt_array, \
     unyt_quantity
 
 from yt.funcs import \
     get_pbar
+from ytree.config import \
+    ytreecfg
 from ytree.utilities.logger import \
-    fake_pbar
+    fake_pbar, \
+    ytreeLogger as mylog
 
 def dirname(path, level=1):
     """
@@ -96,6 +103,56 @@ def _hdf5_yt_array_lite(fh, field):
     if units == "dimensionless": units = ""
     return (fh[field][()], units)
 
+def parse_text_columns(buff, columns, dtypes, delimiter=None,
+                       comments="#"):
+    """
+    Parse selected columns from a block of delimited text.
+
+    All rows are converted in a single call to np.loadtxt, which
+    parses in compiled code, instead of splitting each line in Python.
+
+    Parameters
+    ----------
+    buff : bytes or buffer
+        Block of text containing one row per line, for example,
+        a slice of a memory-mapped file.
+    columns : list of ints
+        Columns to be returned.
+    dtypes : list of dtypes
+        Data type for each column.
+    delimiter : optional, string
+        Column separator. If None, any whitespace is used.
+        Default: None.
+    comments : optional, string
+        Lines starting with this are skipped. If None, no lines are
+        treated as comments.
+        Default: "#".
+
+    Returns
+    -------
+    data : list of arrays
+        Array for each requested column.
+    """
+
+    # np.loadtxt does not allow a column to be used twice
+    ucolumns = list(dict.fromkeys(columns))
+    # strings are read as objects and converted afterward
+    udtypes = [dtypes[columns.index(column)] for column in ucolumns]
+    udtypes = [dtype if np.dtype(dtype).kind in "biufc" else object
+               for dtype in udtypes]
+    names = [f"c{column}" for column in ucolumns]
+    rdtype = np.dtype(list(zip(names, udtypes)))
+
+    if len(buff) == 0:
+        rdata = np.empty(0, dtype=rdtype)
+    else:
+        rdata = np.loadtxt(
+            io.BytesIO(buff), dtype=rdtype, usecols=ucolumns,
+            delimiter=delimiter, comments=comments, ndmin=1)
+
+    return [np.ascontiguousarray(rdata[f"c{column}"], dtype=dtype)
+            for column, dtype in zip(columns, dtypes)]
+
 def f_text_block(f, block_size=4096, file_size=None, sep="\n",
                  pbar_string=None):
     """
@@ -139,3 +196,221 @@ def f_text_block(f, block_size=4096, file_size=None, sep="\n",
         pbar.update(loc+len(lbuff)-start+1)
         yield lbuff, loc
     pbar.finish()
+
+
+_index_cache_version = 3
+
+def get_index_cache_filename(filename, kind="index"):
+    """
+    Return the name of the index cache file for a data file.
+
+    The cache is written as a hidden file next to the data file
+    unless the index_cache_dir option is set in the ytree config
+    file. Hidden files will not be picked up by frontends that
+    search for all data files with the same prefix or suffix.
+    Different kinds of cache files for the same data file are
+    given different suffixes.
+    """
+
+    cache_dir = ytreecfg["ytree"].get("index_cache_dir", None)
+    if cache_dir is None:
+        dirname, basename = os.path.split(filename)
+        return os.path.join(dirname, f".{basename}.ytree_{kind}.h5")
+
+    path = os.path.abspath(filename)
+    tag = hashlib.sha1(path.encode()).hexdigest()[:16]
+    return os.path.join(
+        cache_dir, f"{os.path.basename(path)}.{tag}.ytree_{kind}.h5")
+
+def _index_cache_enabled():
+    return ytreecfg["ytree"].getboolean("index_cache", fallback=True)
+
+def _index_cache_key(key_files):
+    """
+    Return an array of the size and modification time of each file.
+    """
+
+    key = []
+    for key_file in key_files:
+        stat = os.stat(key_file)
+        key.append([stat.st_size, stat.st_mtime_ns])
+    return np.array(key, dtype=np.int64)
+
+def load_index_cache(filename, key_files, kind="index"):
+    """
+    Load arrays saved with save_index_cache.
+
+    Arrays are memory-mapped from the cache file. The cache is only
+    used if the size and modification time of all key files are
+    the same as when it was written.
+
+    Parameters
+    ----------
+    filename : string
+        The data file to which the cache belongs.
+    key_files : list of strings
+        Files whose sizes and modification times must match.
+    kind : optional, string
+        The kind of cache file.
+        Default: "index".
+
+    Returns
+    -------
+    arrays : dict
+        Dictionary of arrays, or None if no valid cache exists.
+    attrs : dict
+        Dictionary of additional attributes.
+    """
+
+    if not _index_cache_enabled():
+        return None
+
+    cache_file = get_index_cache_filename(filename, kind=kind)
+    if not os.path.exists(cache_file):
+        return None
+
+    try:
+        key = _index_cache_key(key_files)
+        arrays = {}
+        with h5py.File(cache_file, mode="r") as f:
+            if f.attrs.get("version") != _index_cache_version or \
+              not np.array_equal(f["key"][()], key):
+                return None
+
+            attrs = dict(f["data"].attrs)
+            for name, dset in f["data"].items():
+                offset = dset.id.get_offset()
+                # only plain numeric arrays can be memory-mapped
+                if offset is None or dset.dtype.kind not in "biufc":
+                    arrays[name] = dset[()]
+                    continue
+                # copy-on-write so arrays can still be modified in memory
+                arrays[name] = np.memmap(
+                    cache_file, mode="c", dtype=dset.dtype,
+                    shape=dset.shape, offset=offset).view(np.ndarray)
+    except (OSError, KeyError) as e:
+        mylog.debug(f"Cannot read index cache {cache_file}: {e}.")
+        return None
+
+    return arrays, attrs
+
+def save_index_cache(filename, key_files, arrays, attrs=None,
+                     kind="index"):
+    """
+    Save arrays to an index cache file for fast loading later.
+
+    The file is written to a temporary location and then moved into
+    place so that readers never see a partially written cache. If the
+    cache cannot be written, nothing happens.
+
+    Parameters
+    ----------
+    filename : string
+        The data file to which the cache belongs.
+    key_files : list of strings
+        Files whose sizes and modification times will be checked
+        when loading.
+    arrays : dict
+        Dictionary of arrays to be saved.
+    attrs : optional, dict
+        Dictionary of additional attributes to be saved.
+    kind : optional, string
+        The kind of cache file.
+        Default: "index".
+    """
+
+    if not _index_cache_enabled():
+        return
+
+    if attrs is None:
+        attrs = {}
+
+    cache_file = get_index_cache_filename(filename, kind=kind)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with h5py.File(tmp_file, mode="w") as f:
+            f.attrs["version"] = _index_cache_version
+            f.create_dataset("key", data=_index_cache_key(key_files))
+            _write_index_cache_data(
+                f.create_group("data"), arrays, attrs)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        mylog.debug(f"Cannot write index cache {cache_file}: {e}.")
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def append_index_cache(filename, key_files, arrays, attrs=None,
+                       kind="index"):
+    """
+    Add arrays to an existing index cache file.
+
+    The cache is copied to a temporary file, the arrays are added and
+    the given attributes are updated, and the copy is moved into place.
+    The existing file is never modified, since arrays may be
+    memory-mapped from it by load_index_cache. Arrays already saved
+    under the same names are left as they are. If no valid cache
+    exists, a new one is written with save_index_cache.
+
+    Parameters
+    ----------
+    filename : string
+        The data file to which the cache belongs.
+    key_files : list of strings
+        Files whose sizes and modification times will be checked
+        when loading.
+    arrays : dict
+        Dictionary of arrays to be added.
+    attrs : optional, dict
+        Dictionary of additional attributes to be updated.
+    kind : optional, string
+        The kind of cache file.
+        Default: "index".
+    """
+
+    if not _index_cache_enabled():
+        return
+
+    if attrs is None:
+        attrs = {}
+
+    cache_file = get_index_cache_filename(filename, kind=kind)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    valid = False
+    try:
+        if os.path.exists(cache_file):
+            shutil.copyfile(cache_file, tmp_file)
+            key = _index_cache_key(key_files)
+            with h5py.File(tmp_file, mode="a") as f:
+                valid = f.attrs.get("version") == _index_cache_version and \
+                  np.array_equal(f["key"][()], key)
+                if valid:
+                    g = f["data"]
+                    new_arrays = dict((name, array)
+                                      for name, array in arrays.items()
+                                      if name not in g)
+                    _write_index_cache_data(g, new_arrays, attrs)
+            if valid:
+                os.replace(tmp_file, cache_file)
+    except (OSError, KeyError) as e:
+        mylog.debug(f"Cannot append to index cache {cache_file}: {e}.")
+        valid = False
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    if not valid:
+        save_index_cache(filename, key_files, arrays, attrs=attrs, kind=kind)
+
+def _write_index_cache_data(group, arrays, attrs):
+    """
+    Write arrays and attributes to the data group of a cache file.
+    """
+
+    for name, array in arrays.items():
+        group.create_dataset(name, data=np.asarray(array))
+    for name, val in attrs.items():
+        if isinstance(val, (list, tuple)) and \
+          all(isinstance(v, str) for v in val):
+            val = np.array(val, dtype=h5py.string_dtype())
+        group.attrs[name] = val
@@ -21,3 +21,14 @@ def fround(val, decimals=0):
     """
     fac = 10**decimals
     return np.floor(val * fac + 0.5) / fac
+
+def get_index_dtype(size):
+    """
+    Return the smallest integer type that can index an array.
+
+    This is used to keep arrays of indices compact when they
+    hold an entry for every halo.
+    """
+    if size < np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
@@ -32,9 +32,10 @@ from yt.funcs import \
 
 from numpy.dtypes import StringDType
 
+from ytree.config import ytreecfg
 from ytree.data_structures.load import load
 from ytree.frontends.ytree import YTreeArbor
-from ytree.utilities.io import dirname
+from ytree.utilities.io import dirname, get_index_cache_filename
 from ytree.utilities.loading import check_path, get_path
 from ytree.utilities.logger import ytreeLogger as mylog
 
@@ -329,6 +330,98 @@ class ArborTest:
                         err_msg=(f"{group} vector field {field} does not match "
                                  f"in dimension {i}."))
 
+class IndexCacheTest:
+    """
+    Test that arbors loaded from an index cache match the original.
+
+    This must be used with TempDirTest.
+    """
+
+    test_filename = None
+    load_kwargs = None
+
+    def test_index_cache(self):
+        try:
+            filename = get_path(self.test_filename)
+        except IOError:
+            self.skipTest("test file missing")
+
+        if self.load_kwargs is None:
+            self.load_kwargs = {}
+
+        ytreecfg["ytree"]["index_cache_dir"] = self.tmpdir
+        try:
+            a1 = load(filename, **self.load_kwargs)
+            a1._plant_trees()
+            assert os.path.exists(get_index_cache_filename(a1.filename))
+
+            a2 = load(filename, **self.load_kwargs)
+            a2._plant_trees()
+            assert a1.size == a2.size
+            for attr, values in a1._node_info.items():
+                assert_array_equal(
+                    a2._node_info[attr], values,
+                    err_msg=f"Cached node info mismatch: {attr}.")
+            compare_arbors(a1, a2, skip1=4, skip2=4)
+        finally:
+            ytreecfg.remove_option("ytree", "index_cache_dir")
+
+class RootFieldCacheTest:
+    """
+    Test that root fields loaded from a cache file match the original.
+
+    This must be used with TempDirTest.
+    """
+
+    test_filename = None
+    load_kwargs = None
+
+    def test_root_field_cache(self):
+        try:
+            filename = get_path(self.test_filename)
+        except IOError:
+            self.skipTest("test file missing")
+
+        if self.load_kwargs is None:
+            self.load_kwargs = {}
+
+        # nothing is cached without a cache directory
+        a0 = load(filename, **self.load_kwargs)
+        a0["mass"]
+        assert a0._root_io._field_cache is None
+
+        ytreecfg["ytree"]["index_cache_dir"] = self.tmpdir
+        try:
+            a1 = load(filename, **self.load_kwargs)
+            m1 = a1["mass"]
+            cache_file = get_index_cache_filename(
+                a1._cache_filename, kind="roots")
+            assert os.path.exists(cache_file)
+            with h5py.File(cache_file, mode="r") as f:
+                cached = list(f["data"])
+
+            a2 = load(filename, **self.load_kwargs)
+            assert len(a2._root_io._get_field_cache()) > 0
+            m2 = a2["mass"]
+            assert_array_equal(m1, m2)
+            assert str(m1.units) == str(m2.units)
+            # cached arrays are kept after being used
+            assert set(cached) <= set(a2._root_io._get_field_cache())
+
+            # new fields are added while arrays are memory-mapped
+            field = next(field for field in a1.field_list
+                         if field not in cached and "/" not in field)
+            a2[field]
+            assert_array_equal(m1, m2)
+            with h5py.File(cache_file, mode="r") as f:
+                assert set(cached) < set(f["data"])
+
+            a3 = load(filename, **self.load_kwargs)
+            assert_array_equal(a1[field], a3[field])
+            compare_arbors(a1, a3, skip1=4, skip2=4)
+        finally:
+            ytreecfg.remove_option("ytree", "index_cache_dir")
+
 def get_tree_split(arbor):
     """
     Get a few separate ancestors from a tree.
@@ -19,6 +19,8 @@ import numpy as np
 import json
 import os
 
+from yt.data_objects.index_subobjects.particle_container import \
+    ParticleContainer
 from yt.data_objects.static_output import \
     ParticleFile
 from yt.frontends.ytdata.data_structures import \
@@ -35,12 +37,96 @@ _unit_defaults = \
    "velocity": {"field": "velocity_x", "units": "km/s"},
    "time":     {"field": "time",       "units": "Gyr"}}
 
+# fraction of the domain width by which tree bounding boxes are padded
+_bounds_padding = 1e-6
+
+def get_run_indices(starts, ends):
+    """
+    Return the concatenated indices of a series of ranges.
+    """
+
+    sizes = ends - starts
+    keep = sizes > 0
+    starts, sizes = starts[keep], sizes[keep]
+    offsets = np.cumsum(sizes) - sizes
+    return np.arange(sizes.sum()) + np.repeat(starts - offsets, sizes)
+
+def read_bounds(ds, fh, prefix):
+    """
+    Read bounding boxes written by save_arbor in code units.
+
+    Boxes are padded slightly so halos on their edges are not
+    missed. Return None if there are no bounding boxes.
+    """
+
+    if f"index/{prefix}_left_edge" not in fh:
+        return None
+
+    pad = _bounds_padding * ds.domain_width.to("code_length").d
+    bounds = []
+    for edge, sign in [("left", -1), ("right", 1)]:
+        dset = fh[f"index/{prefix}_{edge}_edge"]
+        units = parse_h5_attr(dset, "units")
+        bounds.append(
+            ds.arr(dset[()], units).to("code_length").d + sign * pad)
+    return tuple(bounds)
+
+class RowSelection:
+    """
+    Sorted rows of a data file to be read.
+
+    Rows are read as contiguous runs, with nearby runs merged
+    so that only a few reads are made from each dataset.
+    """
+
+    # largest gap between rows to read through
+    _max_gap = 4096
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.size = rows.size
+
+        if self.size == 0:
+            self.runs = []
+            self.index = None
+            return
+
+        breaks = np.flatnonzero(np.diff(rows) > self._max_gap) + 1
+        starts = rows[np.concatenate([[0], breaks])]
+        ends = rows[np.concatenate([breaks - 1, [rows.size - 1]])] + 1
+        self.runs = list(zip(starts, ends))
+
+        # position of each row in the concatenated runs
+        offsets = np.cumsum(ends - starts) - (ends - starts)
+        run_id = np.repeat(np.arange(starts.size),
+                           np.diff(np.concatenate([[0], breaks, [rows.size]])))
+        self.index = rows - starts[run_id] + offsets[run_id]
+        if self.index[-1] == self.size - 1:
+            # rows are contiguous and all data read is kept
+            self.index = None
+
+    def read(self, dataset):
+        """
+        Read the selected rows from an hdf5 dataset.
+        """
+
+        if self.size == 0:
+            return dataset[0:0]
+
+        data = np.concatenate([dataset[start:end] for start, end in self.runs])
+        if self.index is not None:
+            data = data[self.index]
+        return data
+
 class YTreeHDF5File(ParticleFile):
     def __init__(self, ds, io, filename, file_id, frange):
         with h5py.File(filename, mode="r") as f:
             self.total_particles_file = \
               {_ptype: f['data'].attrs['num_elements']}
         super().__init__(ds, io, filename, file_id, frange)
+        self._tree_offsets = None
+        self._tree_bounds = None
+        self._selection = None
 
     @property
     def _prefix(self):
@@ -54,12 +140,102 @@ class YTreeHDF5File(ParticleFile):
     def analysis_filename(self):
         return f"{self._prefix}-analysis{self.ds._suffix}"
 
-    def _read_data(self, f, fname, mask):
-        si = self.start
-        ei = self.end
-        return f[fname][si:ei][mask]
+    def _get_file(self, field, files):
+        """
+        Return an open file containing a field.
+
+        Open files are kept in the files dictionary so they
+        can be used for all fields being read.
+        """
+
+        if self.ds._field_dict.get(field, {}).get("source") == "analysis":
+            filename = self.analysis_filename
+        else:
+            filename = self.filename
+
+        if filename not in files:
+            files[filename] = h5py.File(filename, mode="r")
+        return files[filename]
+
+    def _get_rows(self, rows):
+        """
+        Return the rows of this file being read.
+        """
+
+        if rows is None:
+            return RowSelection(np.arange(self.start, self.end))
+        return rows
+
+    def _read_data(self, f, fname, rows):
+        return rows.read(f[fname])
+
+    def _get_tree_offsets(self, f):
+        """
+        Return the start and end rows of all trees in this file.
+        """
+
+        if self._tree_offsets is None:
+            self._tree_offsets = (f["index/tree_start_index"][()],
+                                  f["index/tree_end_index"][()])
+        return self._tree_offsets
+
+    def _get_tree_bounds(self, f):
+        """
+        Return bounding boxes of all trees in this file.
+        """
+
+        if self._tree_bounds is None:
+            bounds = read_bounds(self.ds, f, "tree")
+            self._tree_bounds = False if bounds is None else bounds
+
+        if self._tree_bounds is False:
+            return None
+        return self._tree_bounds
 
-    def _get_file_root_index(self, f, mask):
+    def _select_rows(self, selector, files):
+        """
+        Return the rows of this file with halos inside a selector.
+
+        Only the trees whose bounding boxes overlap the selector
+        are read. The selected rows are kept until this is called
+        with a different selector, so positions are read only once
+        when fields are read in multiple passes.
+        """
+
+        if self._selection is not None and \
+          self._selection[0] is selector:
+            return self._selection[1]
+
+        f = self._get_file("position_x", files)
+        rows = np.arange(self.start, self.end)
+        bounds = self._get_tree_bounds(f)
+        if bounds is not None and \
+          not getattr(selector, "is_all_data", False):
+            tree_start, tree_end = self._get_tree_offsets(f)
+            t0, t1 = np.searchsorted(tree_end, self.start, side="right"), \
+              np.searchsorted(tree_start, self.end, side="left")
+            left, right = bounds[0][t0:t1], bounds[1][t0:t1]
+            levels = np.zeros((left.shape[0], 1), dtype=np.int32)
+            keep = selector.select_grids(left, right, levels).astype(bool)
+            starts = np.clip(tree_start[t0:t1][keep], self.start, self.end)
+            ends = np.clip(tree_end[t0:t1][keep], self.start, self.end)
+            rows = get_run_indices(starts, ends)
+
+        rows = RowSelection(rows)
+        if rows.size > 0:
+            x, y, z = self._get_particle_positions(
+                _ptype, f=f, rows=rows, units="code_length")
+            mask = selector.select_points(x, y, z, 0.0)
+            del x, y, z
+            if mask is None:
+                rows = RowSelection(rows.rows[:0])
+            elif not mask.all():
+                rows = RowSelection(rows.rows[mask])
+
+        self._selection = (selector, rows)
+        return rows
+
+    def _get_file_root_index(self, f, rows):
         """
         Return index locations of the root node in this file.
 
@@ -67,89 +243,140 @@ class YTreeHDF5File(ParticleFile):
         the arbor on the ytree side.
         """
 
-        indices = np.arange(self.start, self.end)[mask]
-        tree_start = f["index/tree_start_index"][()]
-        return np.digitize(indices, tree_start) - 1
+        tree_start = self._get_tree_offsets(f)[0]
+        return np.searchsorted(tree_start, rows.rows, side="right") - 1
 
-    def _get_file_number(self, mask):
+    def _get_file_number(self, rows):
         """
         Return the file number as a field-like array.
 
         We use this to find the index of the root node in the arbor.
         """
 
-        return np.full(self.end-self.start, self._file_number)[mask]
+        return np.full(rows.size, self._file_number)
 
-    def _get_tree_index(self, f, mask):
+    def _get_tree_index(self, f, rows):
         """
         Return the index of a halo in a tree.
 
         We use this to get the right node from a given root node.
         """
 
-        indices = np.arange(self.start, self.end)[mask]
-        tree_start = f["index/tree_start_index"][()]
-        root_index = np.digitize(indices, tree_start) - 1
-        return indices - tree_start[root_index]
+        tree_start = self._get_tree_offsets(f)[0]
+        root_index = np.searchsorted(tree_start, rows.rows, side="right") - 1
+        return rows.rows - tree_start[root_index]
 
-    def _read_field_data(self, field, mask, f=None):
-        if f is None:
+    def _read_field_data(self, field, rows=None, files=None):
+        if files is None:
             close = True
-            f = h5py.File(self.filename, mode="r")
+            files = {}
         else:
             close = False
 
-        if self.ds._field_dict.get(field, {}).get("source") == "analysis":
-            my_f = h5py.File(self.analysis_filename, mode="r")
-            close = True
-        else:
-            my_f = f
-
+        rows = self._get_rows(rows)
+        my_f = self._get_file(field, files)
         if field == "file_root_index":
-            data = self._get_file_root_index(my_f, mask)
+            data = self._get_file_root_index(my_f, rows)
         elif field == "file_number":
-            data = self._get_file_number(mask)
+            data = self._get_file_number(rows)
         elif field == "tree_index":
-            data = self._get_tree_index(my_f, mask)
+            data = self._get_tree_index(my_f, rows)
         else:
-            data = self._read_data(my_f, os.path.join("data", field), mask)
+            data = self._read_data(my_f, os.path.join("data", field), rows)
 
         if close:
-            my_f.close()
+            for fh in files.values():
+                fh.close()
 
         return data
 
-    def _get_particle_positions(self, ptype, f=None, transpose=True):
+    def _get_particle_positions(self, ptype, f=None, transpose=True,
+                                rows=None, units=None):
         if f is None:
             close = True
             f = h5py.File(self.filename, mode="r")
         else:
             close = False
 
-        mask = slice(None)
+        rows = self._get_rows(rows)
         pn = "data/position_%s"
-        with h5py.File(self.filename, mode="r") as f:
-            units = parse_h5_attr(f[pn % "x"], "units")
-            pos = np.vstack(
-                [self._read_data(f, pn % ax, mask).astype("float64") for ax in "xyz"]).T
+        punits = parse_h5_attr(f[pn % "x"], "units")
+        pos = np.empty((3, rows.size), dtype=np.float64)
+        for i, ax in enumerate("xyz"):
+            pos[i] = self._read_data(f, pn % ax, rows)
 
         if close:
             f.close()
 
-        dle = self.ds.domain_left_edge.to(units).v
-        dw = self.ds.domain_width.to(units).v
+        dle = self.ds.domain_left_edge.to(punits).v[:, None]
+        dw = self.ds.domain_width.to(punits).v[:, None]
 
         np.subtract(pos, dle, out=pos)
         np.mod(pos, dw, out=pos)
         np.add(pos, dle, out=pos)
-        if transpose:
+        if not transpose:
             pos = pos.T
-        pos = self.ds.arr(pos, units)
+        pos = self.ds.arr(pos, punits)
+        if units is not None:
+            pos.convert_to_units(units)
 
         return pos
 
+class YTreeParticleIndex(ParticleIndex):
+    """
+    Particle index for ytree arbors.
+
+    Data files are chosen with the bounding boxes of halo positions
+    written by save_arbor, so no positions are read to build the
+    index. Arbors saved without bounding boxes use the particle
+    bitmap index from yt.
+    """
+
+    def _initialize_index(self):
+        with h5py.File(self.ds.parameter_filename, mode="r") as f:
+            self._file_bounds = read_bounds(self.ds, f, "file")
+        if self._file_bounds is None:
+            super()._initialize_index()
+
+    def _select_data_files(self, selector):
+        """
+        Return data files whose bounding boxes overlap a selector.
+        """
+
+        if getattr(selector, "is_all_data", False):
+            return self.data_files
+
+        ifile = np.array([df._file_number for df in self.data_files])
+        left, right = self._file_bounds
+        levels = np.zeros((ifile.size, 1), dtype=np.int32)
+        keep = selector.select_grids(left[ifile], right[ifile], levels)
+        return [df for df, k in zip(self.data_files, keep) if k]
+
+    def _identify_base_chunk(self, dobj):
+        if self.regions is not None:
+            super()._identify_base_chunk(dobj)
+            return
+
+        if getattr(dobj, "_chunk_info", None) is None:
+            if isinstance(dobj, ParticleContainer):
+                dobj._chunk_info = [dobj]
+            else:
+                if hasattr(dobj, "base_selector"):
+                    base_region = dobj.base_region
+                    base_selector = dobj.base_selector
+                else:
+                    base_region = dobj
+                    base_selector = dobj.selector
+
+                data_files = self._select_data_files(dobj.selector)
+                dobj._chunk_info = [
+                    ParticleContainer(base_region, base_selector,
+                                      [data_file], domain_id=i+1)
+                    for i, data_file in enumerate(data_files)]
+        (dobj._current_chunk,) = self._chunk_all(dobj)
+
 class YTreeDataset(SavedDataset):
-    _index_class = ParticleIndex
+    _index_class = YTreeParticleIndex
     _file_class = YTreeHDF5File
     _field_info_class = YTreeFieldInfo
     _suffix = ".h5"
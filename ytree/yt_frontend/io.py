@@ -14,7 +14,6 @@ ytree io
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
-import h5py
 from more_itertools import always_iterable
 import numpy as np
 
@@ -35,18 +34,20 @@ class IOHandlerYTreeHDF5(BaseIOHandler):
 
     def _read_particle_fields(self, chunks, ptf, selector):
         for data_file in self._yield_data_files(chunks):
-            with h5py.File(data_file.filename, "r") as f:
+            # keep files open for all fields
+            files = {}
+            try:
+                rows = data_file._select_rows(selector, files)
+                if rows.size == 0:
+                    continue
                 for ptype, field_list in sorted(ptf.items()):
-                    x, y, z = data_file._get_particle_positions(ptype, f=f)
-                    mask = selector.select_points(x, y, z, 0.0)
-                    del x, y, z
-                    if mask is None:
-                        continue
-                    if mask.all():
-                        mask = slice(None)
                     for field in field_list:
-                        data = data_file._read_field_data(field, mask, f=f)
+                        data = data_file._read_field_data(
+                            field, rows=rows, files=files)
                         yield (ptype, field), data
+            finally:
+                for fh in files.values():
+                    fh.close()
 
     def _yield_data_files(self, chunks):
         chunks = always_iterable(chunks)
@@ -59,8 +60,8 @@ class IOHandlerYTreeHDF5(BaseIOHandler):
             yield data_file
 
     def _yield_coordinates(self, data_file):
-        pos = data_file._get_particle_positions(_ptype, transpose=False)
-        pos.convert_to_units("code_length")
+        pos = data_file._get_particle_positions(
+            _ptype, transpose=False, units="code_length")
         yield _ptype, pos
 
     def _count_particles(self, data_file):